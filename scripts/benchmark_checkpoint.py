@@ -0,0 +1,79 @@
+"""
+ItemState 状态存档 (Checkpoint) 基准测试
+
+生成 N 个模拟检测器状态，调用 save_item_states 写入临时 SQLite 库两次 (首次插入 / 再次更新)，
+统计耗时。每个规模在独立子进程 (独立数据库文件) 中运行。
+
+用法:
+    python scripts/benchmark_checkpoint.py                          # 10万 / 100万
+    python scripts/benchmark_checkpoint.py --counts 10000 100000
+    python scripts/benchmark_checkpoint.py --src /path/to/old       # 测量另一份代码 (如改造前的逐条 merge)
+    DATABASE_URL=postgresql://... python scripts/benchmark_checkpoint.py --counts 100000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+
+def run_worker(src: str, count: int):
+    sys.path.insert(0, src)
+    from src.db.database import init_db
+    from src.utils.persistence import save_item_states
+
+    init_db()
+    now = datetime.datetime(2026, 1, 1)
+    states = [{
+        "item_name": f"product::line::station::ITEM_{i}",
+        "baseline": 3.3, "std": 0.1, "k_value": 0.05, "s_plus": 0.0, "s_minus": 0.0,
+        "last_data_timestamp": now
+    } for i in range(count)]
+
+    timings = {}
+    for phase in ("insert", "update"):
+        started = time.perf_counter()
+        save_item_states(states)
+        timings[phase] = time.perf_counter() - started
+    print(json.dumps({"count": count, **timings}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ItemState checkpoint benchmark")
+    parser.add_argument("--counts", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--src", default=os.getcwd(), help="被测代码的根目录 (包含 src/)")
+    parser.add_argument("--timeout", type=int, default=3600, help="单个规模的超时秒数")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(os.path.abspath(args.src), args.counts[0])
+        return
+
+    print(f"[*] Source: {args.src}")
+    print(f"{'states':>12} | {'insert s':>10} | {'update s':>10} | {'states/s':>10}")
+    for count in args.counts:
+        env = dict(os.environ)
+        if "DATABASE_URL" not in env:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_ckpt_'), 'bench.db')}"
+        try:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", "--src", args.src, "--counts", str(count)],
+                capture_output=True, text=True, env=env, timeout=args.timeout
+            )
+        except subprocess.TimeoutExpired:
+            print(f"{count:>12,} | timeout after {args.timeout}s")
+            continue
+        lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+        if out.returncode != 0 or not lines:
+            print(f"{count:>12,} | failed: {out.returncode} {out.stderr.strip()[-200:]}")
+            continue
+        result = json.loads(lines[-1])
+        print(f"{count:>12,} | {result['insert']:>10.2f} | {result['update']:>10.2f} | {count / result['update']:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+检测器内存基准测试
+
+通过 DetectionEngineManager 创建 N 个检测器，统计每个检测器占用的字节数 (tracemalloc)。
+每个规模在独立子进程中运行，互不影响。
+
+用法:
+    python scripts/benchmark_detector_memory.py                       # 10k / 100k / 1M
+    python scripts/benchmark_detector_memory.py --counts 10000 100000
+    python scripts/benchmark_detector_memory.py --points 50           # 每个检测器先写入 50 个点
+    python scripts/benchmark_detector_memory.py --src /path/to/old    # 测量另一份代码 (如改造前的版本)
+
+对比改造前后: 用 `git worktree add /tmp/before <commit>` 检出旧版本，
+分别以 --src /tmp/before 与默认 (当前目录) 运行。
+"""
+import os
+import sys
+import json
+import argparse
+import datetime
+import subprocess
+import tracemalloc
+
+
+def run_worker(src: str, count: int, points: int, mode: str):
+    sys.path.insert(0, src)
+    from src.core.manager import DetectionEngineManager
+
+    manager = DetectionEngineManager({"engine_mode": mode})
+    base_time = datetime.datetime(2026, 1, 1)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        detector = manager.get_or_create_detector(
+            item_name=f"product::line::station::ITEM_{i}",
+            item_type="yield" if i % 2 else "parameter",
+            mu0=0.001 if i % 2 else 3.3,
+            base_uph=500
+        )
+        for p in range(points):
+            value = 0.001 if i % 2 else 3.3
+            detector.update(value, current_uph=500, timestamp=base_time + datetime.timedelta(hours=p))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(json.dumps({"count": count, "bytes_per_detector": (after - before) / count}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector memory benchmark")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--points", type=int, default=0, help="每个检测器预先写入的数据点数")
+    parser.add_argument("--src", default=os.getcwd(), help="被测代码的根目录 (包含 src/)")
+    parser.add_argument("--mode", default="scalar", choices=["scalar", "vectorized"])
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(os.path.abspath(args.src), args.counts[0], args.points, args.mode)
+        return
+
+    print(f"[*] Source: {os.path.abspath(args.src)}  mode={args.mode}  points/detector={args.points}")
+    print(f"{'detectors':>12} | {'bytes/detector':>15} | {'total MiB':>10}")
+    for count in args.counts:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--counts", str(count), "--points", str(args.points),
+             "--src", args.src, "--mode", args.mode],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{count:>12} | failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        per_detector = result["bytes_per_detector"]
+        print(f"{count:>12,} | {per_detector:>15,.0f} | {per_detector * count / 2**20:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
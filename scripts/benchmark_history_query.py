@@ -0,0 +1,202 @@
+"""
+历史查询 (/api/v1/history 与 /api/v1/options) 的索引基准测试
+
+按看板的实际查询形态 (维度等值筛选 + timestamp 范围 + 按 timestamp 排序) 在大表上对比:
+- before: 只有单列索引 (升级前的索引结构)
+- after:  run_migrations 补建组合索引 (models.RECORD_INDEXES) 之后
+每个查询输出 EXPLAIN 计划 (取时间窗口中间的分区) 与延迟 (中位数 / p95)。
+
+数据库文件保留在 --db (默认 data/storage/benchmark_history.db)，再次运行时跳过数据生成；
+--rebuild 重新生成。5000万行的 SQLite 库约 12 GB (含组合索引)，生成约需 35 分钟 (单核)。
+
+用法:
+    python scripts/benchmark_history_query.py                         # 5000万行，30 天
+    python scripts/benchmark_history_query.py --rows 2000000 --days 10
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import statistics
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from sqlalchemy import create_engine, event, func, inspect, select, text
+from src.db.models import Base, RECORD_INDEXES
+from src.db.migrations import run_migrations
+from src.db.partitions import RecordPartitions
+
+START = datetime.datetime(2026, 1, 1)
+
+
+def item_dims(item: int):
+    """检测项固定属于某个 产品 / 线体 / 工站"""
+    return f"PRODUCT_{'ABCD'[item % 4]}", f"LINE_{item // 4 % 5:02d}", f"STATION_{item // 20 % 20:02d}"
+
+
+def generate(partitions: RecordPartitions, rows: int, days: int, items: int, batch_size: int = 50000):
+    rnd = random.Random(0)
+    step = days * 86400 / rows
+    batch = []
+    started = time.perf_counter()
+    for i in range(rows):
+        item = rnd.randrange(items)
+        product, line, station = item_dims(item)
+        batch.append({
+            "item_name": f"ITEM_{item:05d}", "item_type": "parameter",
+            "product": product, "line": line, "station": station,
+            "timestamp": START + datetime.timedelta(seconds=i * step),
+            "value": rnd.gauss(3.3, 0.1), "uph": 500, "baseline": 3.3, "std": 0.1, "k_value": 0.05,
+            "h_value": 0.5, "s_plus": 0.0, "s_minus": 0.0, "is_alert": False, "alert_side": None,
+        })
+        if len(batch) >= batch_size:
+            partitions.write(batch)
+            batch = []
+            if (i + 1) % (batch_size * 20) == 0:
+                print(f"    {i + 1} rows ({(i + 1) / (time.perf_counter() - started):.0f} rows/s)")
+    if batch:
+        partitions.write(batch)
+
+
+def drop_composite_indexes(engine):
+    """恢复升级前的索引结构: 删除组合索引 (之后由 run_migrations 补建)"""
+    suffixes = tuple(f"_{suffix}" for suffix, _ in RECORD_INDEXES)
+    statements = []
+    for table in inspect(engine).get_table_names():
+        statements += [f"DROP INDEX {ix['name']}" for ix in inspect(engine).get_indexes(table) if ix["name"].endswith(suffixes)]
+    # 升级前分区中 item_name_id 有单列索引
+    for day in RecordPartitions(engine).days():
+        name = f"detection_records_{day:%Y%m%d}"
+        statements.append(f"CREATE INDEX IF NOT EXISTS ix_{name}_item_name_id ON {name} (item_name_id)")
+    # 每条语句一个事务 (大库上一个事务做完全部 DDL 时回滚日志非常大)
+    for statement in statements:
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+
+
+def query_shapes(days: int, items: int):
+    """(名称, 筛选条件, 开始, 结束, limit)，与看板请求一致"""
+    item = items // 3
+    product, line, station = item_dims(item)
+    mid = START + datetime.timedelta(days=days // 2)
+    one_day = (mid, mid + datetime.timedelta(hours=23, minutes=59, seconds=59))
+    return [
+        ("item curve (1 day)", {"item_name": f"ITEM_{item:05d}"}, *one_day, 20000),
+        ("item detail (+-48h)", {"item_name": f"ITEM_{item:05d}"},
+         mid - datetime.timedelta(hours=48), mid + datetime.timedelta(hours=48), 200),
+        ("product+line+station (1 day)", {"product": product, "line": line, "station": station}, *one_day, 20000),
+        ("all dims (1 day)", {"product": product, "line": line, "station": station, "item_name": f"ITEM_{item:05d}"},
+         *one_day, 20000),
+        ("product (all days)", {"product": product}, None, None, 200),
+    ]
+
+
+def build(partitions, conn, day, table, filters, st, et, limit):
+    """与 /api/v1/history 相同的单分区查询"""
+    conds = partitions.conditions(conn, day, table, filters, by_time=True)
+    if conds is None:
+        return None
+    q = select(table).where(*conds)
+    if st is not None:
+        q = q.where(table.c.timestamp >= st)
+    if et is not None:
+        q = q.where(table.c.timestamp <= et)
+    return q.order_by(table.c.timestamp.asc()).limit(limit)
+
+
+def run_query(partitions, conn, filters, st, et, limit) -> int:
+    rows = 0
+    for day, table in partitions.tables_between(st, et):
+        if rows >= limit:
+            break
+        q = build(partitions, conn, day, table, filters, st, et, limit - rows)
+        if q is not None:
+            rows += len(conn.execute(q).fetchall())
+    return rows
+
+
+def explain(partitions, conn, filters, st, et, limit):
+    tables = [(day, table) for day, table in partitions.tables_between(st, et) if day is not None]
+    if not tables:
+        return []
+    day, table = tables[len(tables) // 2]
+    q = build(partitions, conn, day, table, filters, st, et, limit)
+    sql = str(q.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN ANALYZE {sql}")]
+
+
+def measure(engine, shapes, repeat: int):
+    partitions = RecordPartitions(engine)
+    results = {}
+    with engine.connect() as conn:
+        for name, filters, st, et, limit in shapes:
+            rows = run_query(partitions, conn, filters, st, et, limit)  # 预热
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run_query(partitions, conn, filters, st, et, limit)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                "rows": rows,
+                "median_ms": statistics.median(timings),
+                "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+                "plan": explain(partitions, conn, filters, st, et, limit),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History query index benchmark")
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--items", type=int, default=10000, help="检测项个数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的重复次数")
+    parser.add_argument("--db", default=os.path.join("data", "storage", "benchmark_history.db"))
+    parser.add_argument("--rebuild", action="store_true", help="重新生成数据")
+    parser.add_argument("--cache-mb", type=int, default=256, help="SQLite 页缓存大小 (MB)")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.db):
+        os.remove(args.db)
+    engine = create_engine(f"sqlite:///{args.db}")
+    event.listen(engine, "connect", lambda conn, _: conn.execute(f"PRAGMA cache_size=-{args.cache_mb * 1024}"))
+    Base.metadata.create_all(engine)
+    partitions = RecordPartitions(engine)
+    if not partitions.days():
+        print(f"[*] Generating {args.rows} records over {args.days} days -> {args.db}")
+        generate(partitions, args.rows, args.days, args.items)
+    with engine.connect() as conn:
+        total = sum(conn.execute(select(func.count()).select_from(table)).scalar()
+                    for _, table in partitions.tables_between())
+    print(f"[*] {total} records in {len(partitions.days())} partitions")
+
+    shapes = query_shapes(args.days, args.items)
+    drop_composite_indexes(engine)
+    engine.dispose()
+    before = measure(engine, shapes, args.repeat)
+    started = time.perf_counter()
+    applied = run_migrations(engine)
+    print(f"[*] run_migrations: {applied} indexes in {time.perf_counter() - started:.1f} s")
+    engine.dispose()
+    after = measure(engine, shapes, args.repeat)
+
+    for name, *_ in shapes:
+        b, a = before[name], after[name]
+        print(f"\n[{name}] rows={a['rows']}")
+        print(f"    before: median {b['median_ms']:8.2f} ms  p95 {b['p95_ms']:8.2f} ms")
+        for line in b["plan"]:
+            print(f"        {line}")
+        print(f"    after:  median {a['median_ms']:8.2f} ms  p95 {a['p95_ms']:8.2f} ms")
+        for line in a["plan"]:
+            print(f"        {line}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
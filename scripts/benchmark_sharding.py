@@ -0,0 +1,84 @@
+"""
+分片检测引擎吞吐量基准测试
+
+对同一批模拟数据，分别用单进程 DetectionEngineManager 与 N 个分片的 ShardedDetectionEngine
+调用 process_batch，统计每秒处理的数据条数。检测记录写入临时 SQLite 库 (不影响正式数据)。
+
+用法:
+    python scripts/benchmark_sharding.py                          # 分片数 1 / 2 / 4
+    python scripts/benchmark_sharding.py --shards 2 4 8 --keys 20000 --ticks 20
+
+注意: 吞吐量随分片数的提升受限于 CPU 核数 (os.cpu_count())；单核机器上分片只会增加通信开销。
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+
+# 必须在导入 src.db 之前设置 (分片子进程继承该环境变量，重新导入本脚本时不再创建新库)
+if "BENCH_SHARDING_DB" not in os.environ:
+    os.environ["BENCH_SHARDING_DB"] = os.path.join(tempfile.mkdtemp(prefix="bench_sharding_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.environ['BENCH_SHARDING_DB']}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.database import init_db
+from src.core.manager import DetectionEngineManager
+from src.core.sharded_engine import ShardedDetectionEngine
+
+
+def make_batches(keys: int, ticks: int, batch_size: int):
+    base_time = datetime.datetime(2026, 1, 1)
+    readings = []
+    for t in range(ticks):
+        for k in range(keys):
+            readings.append({
+                "item_name": f"ITEM_{k % 50}",
+                "item_type": "parameter",
+                "value": 3.3 + 0.01 * ((k + t) % 7),
+                "uph": 500,
+                "timestamp": base_time + datetime.timedelta(hours=t),
+                "metadata": {"product": "P", "line": f"L{k // 1000}", "station": f"S{k % 1000 // 50}"},
+                "item_config": {"mu0": 3.3, "base_uph": 500}
+            })
+    return [readings[i:i + batch_size] for i in range(0, len(readings), batch_size)]
+
+
+def run(engine, batches) -> float:
+    total = sum(len(b) for b in batches)
+    started = time.perf_counter()
+    for batch in batches:
+        engine.process_batch(batch)
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded engine throughput benchmark")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--keys", type=int, default=5000, help="检测键个数")
+    parser.add_argument("--ticks", type=int, default=10, help="每个检测键的数据条数")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--mode", default="scalar", choices=["scalar", "vectorized"])
+    args = parser.parse_args()
+
+    init_db()
+    batches = make_batches(args.keys, args.ticks, args.batch_size)
+    config = {"engine_mode": args.mode}
+    print(f"[*] cpu_count={os.cpu_count()}  keys={args.keys}  readings={sum(len(b) for b in batches)}  mode={args.mode}")
+    print(f"{'engine':>16} | {'readings/s':>12}")
+
+    rate = run(DetectionEngineManager(dict(config)), batches)
+    print(f"{'in-process':>16} | {rate:>12,.0f}")
+    for shards in args.shards:
+        engine = ShardedDetectionEngine(dict(config), num_shards=shards)
+        engine.start()
+        try:
+            rate = run(engine, batches)
+        finally:
+            engine.stop()
+        print(f"{f'{shards} shard(s)':>16} | {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,101 @@
+"""
+DetectionRecord 存储占用基准测试
+
+把 N 条模拟检测记录分别写入不同的表结构 (独立的临时 SQLite 库)，统计每行占用的字节数 (含索引):
+- legacy:     升级前的 detection_records 单表 (字符串维度列，各自建索引)
+- dictionary: 按天分区 + 维度字典 (维度列保存整数 ID，只对 item_name_id / timestamp 建索引)
+- float32:    dictionary + 单精度算法列 (SQLite 的 REAL 固定 8 字节，结果与 dictionary 相同；PostgreSQL 中每个算法列节省 4 字节)
+
+用法:
+    python scripts/benchmark_storage.py                    # 10万条，1000 个检测项
+    python scripts/benchmark_storage.py --rows 1000000 --items 10000
+"""
 import os
 import sys
-import datetime
 import random
-import uuid
+import argparse
+import datetime
+import tempfile
 
 # Add src to path
 sys.path.append(os.getcwd())
 
-from src.db.database import SessionLocal, engine, Base
-from src.db.models import DetectionRecord
+from sqlalchemy import create_engine, insert
+from src.db.models import Base, DetectionRecord
+from src.db.partitions import RecordPartitions
+
+LAYOUTS = ("legacy", "dictionary", "float32")
+
+
+def make_records(rows: int, items: int, seed: int = 0):
+    rnd = random.Random(seed)
+    base_time = datetime.datetime(2026, 1, 1)
+    for i in range(rows):
+        item = i % items
+        is_alert = rnd.random() < 0.01
+        yield {
+            "item_name": f"VOLTAGE_MEASUREMENT_{item:05d}",
+            "item_type": "parameter",
+            "station": f"STATION_{item % 20:02d}",
+            "product": f"PRODUCT_{'ABCD'[item % 4]}",
+            "line": f"LINE_{item % 5:02d}",
+            "timestamp": base_time + datetime.timedelta(seconds=i * 86400 * 3 // rows),  # 3 天的数据
+            "value": 3.3 + rnd.gauss(0, 0.1),
+            "uph": 500,
+            "baseline": 3.3 + rnd.gauss(0, 0.01),
+            "std": 0.1 + rnd.random() * 0.01,
+            "k_value": 0.05,
+            "h_value": 0.4 + rnd.random() * 0.1,
+            "s_plus": max(0.0, rnd.gauss(0, 0.1)),
+            "s_minus": max(0.0, rnd.gauss(0, 0.1)),
+            "is_alert": is_alert,
+            "alert_side": "upper" if is_alert else None,
+        }
+
+
+def measure(layout: str, rows: int, items: int, batch_size: int = 10000) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, f"{layout}.db")
+        bench_engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bench_engine)
+        empty = os.path.getsize(db_path)
+
+        partitions = RecordPartitions(bench_engine)
+        partitions.float32 = layout == "float32"
+        batch = []
+        for record in make_records(rows, items):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                if layout == "legacy":
+                    with bench_engine.begin() as conn:
+                        conn.execute(insert(DetectionRecord.__table__), batch)
+                else:
+                    partitions.write(batch)
+                batch = []
+        if batch:
+            if layout == "legacy":
+                with bench_engine.begin() as conn:
+                    conn.execute(insert(DetectionRecord.__table__), batch)
+            else:
+                partitions.write(batch)
+        bench_engine.dispose()
+        return (os.path.getsize(db_path) - empty) / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DetectionRecord storage benchmark")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=1000, help="检测项个数")
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=LAYOUTS)
+    args = parser.parse_args()
+
+    print(f"[*] {args.rows} records, {args.items} items")
+    baseline = None
+    for layout in args.layouts:
+        bytes_per_row = measure(layout, args.rows, args.items)
+        baseline = baseline or bytes_per_row
+        print(f"[*] {layout:<10} {bytes_per_row:8.1f} bytes/row  ({bytes_per_row / baseline:.0%})")
 
-def benchmark():
-    # Setup clean DB
-    db_path = "data/storage/benchmark.db"
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        
-    # Use a separate engine for benchmark
-    from sqlalchemy import create_engine
-    bench_engine = create_engine(f"sqlite:///{db_path}")
-    Base.metadata.create_all(bench_engine)
-    Session = sessionmaker(bind=bench_engine)
-    session = Session()
-    
-    # Generate 10,000 records
-    batch_size = 10000
-    print(f"[*] Inserting {batch_size} records...")
-    
-    items = []
-    base_time = datetime.datetime.now()
-    
-    for i in range(batch_size):
-        record = DetectionRecord(
-            item_name=f"ITEM_{i % 1000}", # Simulate 1000 unique items
-            item_type="parameter",
-            station="STATION_01",
-            product="PRODUCT_A",
-            line="LINE_01",
-            timestamp=base_time + datetime.timedelta(seconds=i),
-            value=random.random(),
-            uph=500,
-            baseline=0.5,
-            std=0.1,
-            k_value=0.005,
-            h_value=0.015,
-            s_plus=0.0,
-            s_minus=0.0,
-            is_alert=False,
-            alert_side=None
-        )
-        items.append(record)
-        
-    session.add_all(items)
-    session.commit()
-    session.close()
-    
-    # Check size
-    size_bytes = os.path.getsize(db_path)
-    size_kb = size_bytes / 1024
-    bytes_per_row = size_bytes / batch_size
-    
-    print(f"[*] Total Size: {size_kb:.2f} KB")
-    print(f"[*] Bytes per Row: {bytes_per_row:.2f} bytes")
-    
-    # Cleanup
-    os.remove(db_path)
 
 if __name__ == "__main__":
-    from sqlalchemy.orm import sessionmaker
-    benchmark()
+    main()
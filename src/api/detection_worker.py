@@ -0,0 +1,137 @@
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+
+class WorkerBusyError(Exception):
+    """检测队列已满 (接口层转换为 HTTP 503)"""
+
+
+class DetectionWorker:
+    """
+    检测任务调度器 (把同步的检测 / 写库从事件循环中移出)
+
+    - concurrency 条通道 (lane)，每条通道一个有界 asyncio.Queue 和一个消费协程
+    - 检测键按 crc32 固定映射到一条通道，通道内先进先出，保证同一检测键的处理顺序
+    - 消费协程通过 run_in_executor 在线程池中执行任务，事件循环只负责调度，读接口不受写入阻塞
+    - 目标通道队列已满时 submit 立即抛出 WorkerBusyError (背压)，不在事件循环中等待
+    """
+
+    def __init__(self, concurrency: int = 4, queue_size: int = 1000):
+        self.concurrency = max(1, int(concurrency))
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.total_completed = 0
+        self.total_rejected = 0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """在事件循环中启动各通道的消费协程 (须在 startup 事件中调用)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="detection")
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.concurrency)]
+        self._tasks = [asyncio.create_task(self._consume(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """处理完已排队的任务后停止"""
+        if not self.running:
+            return
+        for queue in self._queues:
+            await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+    def lane_of(self, unique_key: str) -> int:
+        return zlib.crc32(unique_key.encode("utf-8")) % self.concurrency
+
+    async def submit(self, unique_key: str, fn: Callable[[], Any]) -> Any:
+        """把任务放入检测键所属通道，等待其在线程池中执行完毕并返回结果"""
+        return (await self._submit_lanes([(self.lane_of(unique_key), fn)]))[0]
+
+    async def submit_grouped(self, unique_keys: List[str], run: Callable[[List[int]], List[Any]]) -> List[Any]:
+        """
+        批量提交: 按检测键所属通道把下标分组，每个通道一个任务 run(indices)
+        run 返回与 indices 一一对应的结果，最终按原顺序拼接返回
+        """
+        groups: Dict[int, List[int]] = {}
+        for idx, key in enumerate(unique_keys):
+            groups.setdefault(self.lane_of(key), []).append(idx)
+        lanes = list(groups.keys())
+        outputs = await self._submit_lanes([(lane, partial(run, groups[lane])) for lane in lanes])
+        results: List[Any] = [None] * len(unique_keys)
+        for lane, output in zip(lanes, outputs):
+            for idx, value in zip(groups[lane], output):
+                results[idx] = value
+        return results
+
+    async def _submit_lanes(self, jobs: List[tuple]) -> List[Any]:
+        """
+        把 [(lane, fn), ...] 放入对应通道并等待全部完成 (按提交顺序返回结果)
+        所有目标通道都有空位时才入队 (全部接受或全部拒绝)
+        """
+        loop = asyncio.get_running_loop()
+        if not self.running or loop is not self._loop:
+            # 未启动或不在启动时的事件循环中 (如脚本 / 测试直接调用) 时同步执行
+            return [fn() for _, fn in jobs]
+
+        demand: Dict[int, int] = {}
+        for lane, _ in jobs:
+            demand[lane] = demand.get(lane, 0) + 1
+        for lane, count in demand.items():
+            queue = self._queues[lane]
+            if queue.maxsize > 0 and queue.qsize() + count > queue.maxsize:
+                self.total_rejected += 1
+                raise WorkerBusyError(f"Detection queue {lane} is full ({queue.qsize()}/{queue.maxsize})")
+
+        futures = []
+        for lane, fn in jobs:
+            future = loop.create_future()
+            self._queues[lane].put_nowait((fn, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _consume(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, future = await queue.get()
+            try:
+                result = await loop.run_in_executor(self._executor, fn)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+                self.total_completed += 1
+            finally:
+                queue.task_done()
+
+    def get_metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "backlog": [queue.qsize() for queue in self._queues],
+            "total_completed": self.total_completed,
+            "total_rejected": self.total_rejected,
+        }
@@ -6,14 +6,22 @@ import uuid
 import logging
 import os
 import asyncio
+import time
+from functools import partial
 
 from ..core.manager import DetectionEngineManager
+from ..core.sharded_engine import ShardedDetectionEngine
+from ..core.effective_config import ConfigResolver
+from ..core.ingest_log import IngestLog
 from ..utils.persistence import ConfigStore, load_all_item_states, save_item_states, delete_item_states
-from ..db.database import init_db, get_db, SessionLocal
-from ..db.models import DetectionRecord
-from sqlalchemy.orm import Session
-from fastapi import Depends
-from fastapi.responses import HTMLResponse
+from ..db.database import init_db, engine as db_engine
+from ..db.partitions import RecordPartitions
+from ..db.history import RecordHistory, parse_fields
+from ..db.catalog import DimensionCatalog
+from ..db.record_writer import RecordWriter
+from ..db.retention import RecordRetention
+from .detection_worker import DetectionWorker, WorkerBusyError
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 
 # 配置日志
@@ -29,8 +37,12 @@ def on_startup():
 
 # 初始化持久化存储
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-storage_path = os.path.join(BASE_DIR, "data", "storage", "item_configs.json")
-config_store = ConfigStore(storage_path)
+storage_dir = os.path.join(BASE_DIR, "data", "storage")
+# 检测项配置保存在 SQLite (item_configs.db)，首次启动时自动导入旧版 item_configs.json
+config_store = ConfigStore(
+    os.path.join(storage_dir, "item_configs.db"),
+    legacy_json_path=os.path.join(storage_dir, "item_configs.json")
+)
 
 # 全局配置 (默认值)
 global_config = {
@@ -45,11 +57,72 @@ persisted_global = config_store.get_global_config()
 if persisted_global:
     global_config.update(persisted_global)
 
-# 合并存储项到引擎配置中 (简单实现)
+# 引擎配置 = 全局默认值 (检测项配置在接入时按检测键查询，不再整体载入)
 combined_config = global_config.copy()
-combined_config.update(config_store.configs)
-
-engine_manager = DetectionEngineManager(combined_config)
+# 引擎模式: scalar (逐对象) / vectorized (DetectorBank 向量化)
+combined_config["engine_mode"] = os.getenv("DETECTION_ENGINE_MODE", "scalar")
+# 检测器内部历史的保留条数 (有界内存)
+combined_config["history_retention"] = int(os.getenv("DETECTOR_HISTORY_RETENTION", "1000"))
+combined_config["update_history_retention"] = int(os.getenv("DETECTOR_UPDATE_HISTORY_RETENTION", "100"))
+
+# 检测记录延迟批量写入 (RECORD_WRITER_ENABLED=0 时退回同步写入)
+writer_options = {
+    "batch_size": int(os.getenv("RECORD_WRITER_BATCH_SIZE", "1000")),
+    "flush_interval": float(os.getenv("RECORD_WRITER_FLUSH_INTERVAL", "1.0")),
+    "max_queue": int(os.getenv("RECORD_WRITER_MAX_QUEUE", "100000"))
+} if os.getenv("RECORD_WRITER_ENABLED", "1") == "1" else None
+
+# 接入数据预写日志: 两次检查点之间崩溃时，重启后重放日志恢复检测器状态 (INGEST_WAL_DIR 为空时关闭)
+INGEST_WAL_DIR = os.getenv("INGEST_WAL_DIR", os.path.join(storage_dir, "ingest_wal"))
+wal_options = {
+    "directory": INGEST_WAL_DIR,
+    "segment_bytes": int(float(os.getenv("INGEST_WAL_SEGMENT_MB", "64")) * 1024 * 1024),
+    "sync": os.getenv("INGEST_WAL_SYNC", "fsync"),
+} if INGEST_WAL_DIR else None
+
+# 分片数 > 1 时检测键按哈希分配到多个检测子进程 (每个子进程各自写入检测记录与接入日志)
+DETECTION_ENGINE_SHARDS = int(os.getenv("DETECTION_ENGINE_SHARDS", "1"))
+if DETECTION_ENGINE_SHARDS > 1:
+    engine_manager = ShardedDetectionEngine(combined_config, num_shards=DETECTION_ENGINE_SHARDS,
+                                            writer_options=writer_options, wal_options=wal_options)
+else:
+    engine_manager = DetectionEngineManager(combined_config)
+    if writer_options is not None:
+        engine_manager.record_writer = RecordWriter(**writer_options)
+    if wal_options is not None:
+        engine_manager.ingest_log = IngestLog(**wal_options)
+
+# 检测键 -> 生效配置 缓存 (配置接口修改时失效)
+config_resolver = ConfigResolver(config_store.get_item_config, engine_manager.global_config)
+
+# 检测任务调度: 检测与写库在线程池中执行，事件循环只负责调度 (同一检测键固定在同一通道，保证顺序)
+detection_worker = DetectionWorker(
+    concurrency=int(os.getenv("DETECTION_WORKER_CONCURRENCY", "4")),
+    queue_size=int(os.getenv("DETECTION_WORKER_QUEUE_SIZE", "1000"))
+)
+# 检测队列已满时返回 503，建议客户端等待的秒数
+DETECTION_RETRY_AFTER = os.getenv("DETECTION_RETRY_AFTER", "1")
+
+# 增量检查点: 每个周期内持久化所有变化过的检测器状态，周期拆成多个小片均匀写入
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "300"))
+CHECKPOINT_SLICES = max(1, int(os.getenv("CHECKPOINT_SLICES", "30")))
+checkpoint_stats = {"last_saved": 0, "total_saved": 0, "last_run": None, "last_duration_ms": 0.0}
+# 检测记录保留天数；过期记录按主键区间分批删除，每批耗时控制在 RETENTION_BATCH_BUDGET_MS 左右
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "86400"))
+record_retention = RecordRetention(
+    retention_days=float(os.getenv("RETENTION_DAYS", "30")),
+    batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "20000")),
+    time_budget=float(os.getenv("RETENTION_BATCH_BUDGET_MS", "200")) / 1000,
+    pause=float(os.getenv("RETENTION_PAUSE_MS", "50")) / 1000
+)
+# 检测记录按天分区 (写入、查询、过期清理共用)；RECORD_FLOAT32=1 时新建分区的算法列使用单精度
+record_partitions = RecordPartitions.for_engine(db_engine)
+record_partitions.float32 = os.getenv("RECORD_FLOAT32", "0") == "1"
+record_history = RecordHistory(record_partitions)
+# 筛选菜单的维度组合目录 (内存倒排索引)，启动时从数据库加载，接入时增量更新
+dimension_catalog = DimensionCatalog(record_partitions)
+# 检测器状态文件 (启动镜像): 正常退出时写入，启动时 mmap 后按需恢复；为空时只从数据库恢复
+STATE_FILE_PATH = os.getenv("DETECTOR_STATE_FILE", os.path.join(storage_dir, "detector_states.bin"))
 
 # --- 数据模型 ---
 
@@ -61,6 +134,14 @@ class DataIngestRequest(BaseModel):
     timestamp: str = Field(default_factory=lambda: datetime.datetime.now().isoformat())
     meta_data: Dict[str, Any] = {}
 
+# 单次批量接入的最大条数
+MAX_BATCH_SIZE = int(os.getenv("MAX_INGEST_BATCH_SIZE", "10000"))
+# 历史查询单页的最大条数 (更长的时间范围用 max_points 降采样)
+MAX_HISTORY_LIMIT = int(os.getenv("MAX_HISTORY_LIMIT", "20000"))
+
+class BatchDataIngestRequest(BaseModel):
+    items: List[DataIngestRequest]
+
 class ItemRegisterRequest(BaseModel):
     item_name: str
     item_type: str
@@ -105,33 +186,14 @@ async def ingest_data(request: DataIngestRequest, background_tasks: BackgroundTa
     
     sys.stderr.flush()
     
-    # Generate unique key for detection
-    # Ideally should use manager's method, but accessible via engine_manager
-    unique_key = engine_manager._generate_detector_key(request.item_name, request.meta_data)
-
-    # 1. Try Specific Config
-    item_cfg = config_store.get_item_config(unique_key)
-    if not item_cfg:
-        # 2. Try Generic Config (Item Name only)
-        item_cfg = config_store.get_item_config(request.item_name)
-    
-    if not item_cfg:
-        # 3. Use Global Defaults (Implicitly handled by passing None or defaults)
-        # But we want to persist it or use it. Manager handles defaults if config is empty.
-        # But here we might want to auto-register strictly for the ItemName (Generic) or UniqueKey?
-        # Current logic: auto-register Generic Item Name if completely new?
-        # Let's auto-register the Unique Key if it's a new context?
-        # OR simply fallback to defaults without saving to avoid polluting configDB with every transient key.
-        # Decision: Use defaults without saving transient config efficiently.
-        item_cfg = {} 
-    
-    # 动态传递配置
-    mu0 = item_cfg.get("mu0", 0.0005)
-    base_uph = item_cfg.get("base_uph", 500)
+    # 解析检测键与生效配置 (缓存命中时不做任何配置查询)
+    item_cfg = config_resolver.resolve(request.item_name, request.meta_data)
+    unique_key = item_cfg.unique_key
 
     try:
         # 重写 manager.py 使其支持动态传递配置
-        result = engine_manager.process_data(
+        result = await detection_worker.submit(unique_key, partial(
+            engine_manager.process_data,
             item_name=request.item_name,
             item_type=request.item_type,
             value=request.value,
@@ -139,45 +201,109 @@ async def ingest_data(request: DataIngestRequest, background_tasks: BackgroundTa
             timestamp=request.timestamp,
             metadata=request.meta_data,
             item_config=item_cfg  # Pass the loaded config
-        )
+        ))
         
+        dimension_catalog.observe(request.item_name, request.meta_data, request.timestamp)
         if result["should_push"]:
-            # 转出 30 周期历史
-            history_data = result["history"]
-            trajectory = {
-                "timestamps": [s['timestamp'] for s in history_data],
-                "values": [s['value'] for s in history_data],
-                "baselines": [s['baseline'] for s in history_data],
-                "k_values": [s['k_value'] for s in history_data],
-                "cusum_plus": [s['S_plus'] for s in history_data],
-                "cusum_minus": [s['S_minus'] for s in history_data],
-                "threshold_h": [s['h_value'] for s in history_data]
-            }
-            
-            alert_detail = AlertPushDetail(
-                alert_id=str(uuid.uuid4()),
-                item_name=request.item_name,
-                alert_time=request.timestamp,
-                algorithm_config=global_config,
-                current_status={
-                    "value": request.value,
-                    "baseline": result["current_status"]["baseline"],
-                    "k_value": result["current_status"]["k_value"],
-                    "S_plus": result["current_status"]["S_plus"],
-                    "S_minus": result["current_status"]["S_minus"],
-                    "threshold_h": result["current_status"]["h_value"],
-                    "alert_side": result["alert_side"]
-                },
-                history_30_periods=trajectory
-            )
-            background_tasks.add_task(push_alert_to_external, alert_detail)
+            background_tasks.add_task(push_alert_to_external, _build_alert_detail(request, result))
             
         return {"status": "success", "alert": result["alert"], "push": result["should_push"]}
         
+    except WorkerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": DETECTION_RETRY_AFTER})
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/data/ingest/batch")
+async def ingest_data_batch(request: BatchDataIngestRequest, background_tasks: BackgroundTasks):
+    """
+    批量接收实时监测数据 (MES 微批次聚合推送)
+    - 每个不同的检测键只解析一次配置
+    - 按检测通道拆分为子批次，各子批次分别检测并写入检测记录 (一个请求对应多个写入事务，不是整体原子的)
+    - 按输入顺序返回每条数据的报警/推送结果；某个子批次出错时只有其中的数据返回 status=error，
+      其他子批次的数据已正常处理 (检测器状态、接入日志、检测记录)，客户端只应重发出错的数据
+    """
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(request.items)} > {MAX_BATCH_SIZE}")
+
+    readings = []
+    unique_keys = []
+    for item in request.items:
+        item_cfg = config_resolver.resolve(item.item_name, item.meta_data)
+        unique_keys.append(item_cfg.unique_key)
+        readings.append({
+            "item_name": item.item_name,
+            "item_type": item.item_type,
+            "value": item.value,
+            "uph": item.uph,
+            "timestamp": item.timestamp,
+            "metadata": item.meta_data,
+            "item_config": item_cfg
+        })
+
+    def process_lane(indices):
+        """一个通道的子批次；整体失败时其中每条数据返回 error，不影响其他通道"""
+        try:
+            return engine_manager.process_batch([readings[i] for i in indices])
+        except Exception as e:
+            logger.error(f"Batch Error ({len(indices)} items): {str(e)}")
+            return [{"error": str(e)} for _ in indices]
+
+    try:
+        # 按通道拆分为子批次，每个子批次在所属通道中调用 process_batch
+        results = await detection_worker.submit_grouped(unique_keys, process_lane)
+    except WorkerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": DETECTION_RETRY_AFTER})
+
+    response_items = []
+    alert_count = 0
+    error_count = 0
+    for item, result in zip(request.items, results):
+        if "error" in result:
+            error_count += 1
+            response_items.append({"item_name": item.item_name, "status": "error", "detail": result["error"]})
+            continue
+        dimension_catalog.observe(item.item_name, item.meta_data, item.timestamp)
+        if result["alert"]:
+            alert_count += 1
+        if result["should_push"]:
+            background_tasks.add_task(push_alert_to_external, _build_alert_detail(item, result))
+        response_items.append({
+            "item_name": item.item_name,
+            "status": "success",
+            "alert": result["alert"],
+            "push": result["should_push"]
+        })
+
+    return {
+        "status": "success",
+        "total": len(request.items),
+        "alerts": alert_count,
+        "errors": error_count,
+        "results": response_items
+    }
+
+def _build_alert_detail(request: DataIngestRequest, result: Dict) -> AlertPushDetail:
+    """构造报警推送内容 (含 30 周期历史，仅在 should_push 时由 manager 生成)"""
+    status = result["current_status"]
+    return AlertPushDetail(
+        alert_id=str(uuid.uuid4()),
+        item_name=request.item_name,
+        alert_time=request.timestamp,
+        algorithm_config=global_config,
+        current_status={
+            "value": request.value,
+            "baseline": status["baseline"],
+            "k_value": status["k_value"],
+            "S_plus": status["S_plus"],
+            "S_minus": status["S_minus"],
+            "threshold_h": status["h_value"],
+            "alert_side": result["alert_side"]
+        },
+        history_30_periods=result["history_30_periods"]
+    )
+
 @app.post("/api/v1/items/register")
 async def register_item(request: ItemRegisterRequest):
     """运维端：注册/维护检测项目"""
@@ -209,10 +335,14 @@ async def register_item(request: ItemRegisterRequest):
     # Update: register_item usually implies generic unless specified.
     
     if key == request.item_name:
-        engine_manager.global_config[f"mu0_{request.item_name}"] = request.mu0
-        engine_manager.global_config[f"base_uph_{request.item_name}"] = request.base_uph
-        engine_manager.global_config[f"penalty_strength_{request.item_name}"] = request.penalty_strength
-        engine_manager.global_config[f"cooldown_periods_{request.item_name}"] = request.cooldown_periods
+        engine_manager.update_global_config({
+            f"mu0_{request.item_name}": request.mu0,
+            f"base_uph_{request.item_name}": request.base_uph,
+            f"penalty_strength_{request.item_name}": request.penalty_strength,
+            f"cooldown_periods_{request.item_name}": request.cooldown_periods
+        })
+    config_resolver.invalidate(request.item_name)
+    config_resolver.invalidate(key)
     return {"message": f"Item {request.item_name} registered successfully"}
 
 @app.get("/api/v1/options")
@@ -220,79 +350,33 @@ def get_options(
     item_name: Optional[str] = Query(None),
     station: Optional[str] = Query(None),
     product: Optional[str] = Query(None),
-    line: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    line: Optional[str] = Query(None)
 ):
     """
     获取筛选菜单的动态选项 (支持联动过滤)
+    维度目录 (dimension_catalog) 加载完成后直接查询内存中的倒排索引，不扫描检测记录
     """
     try:
-        # Base query for filtering
-        base_query = db.query(DetectionRecord)
-        
-        if item_name:
-            base_query = base_query.filter(DetectionRecord.item_name == item_name)
-        if station:
-            base_query = base_query.filter(DetectionRecord.station == station)
-        if product:
-             base_query = base_query.filter(DetectionRecord.product == product)
-        if line:
-             base_query = base_query.filter(DetectionRecord.line == line)
-             
-        # Extract distinct values from the FILTERED set for each field
-        # Note: optimizing this might require separate queries if dataset is huge, 
-        # but for now iterating distinct on the filtered result is fine.
-        # Actually proper SQL optimization: 
-        # To get available stations GIVEN product=P, we query distinct station where product=P.
-        
-        # Helper to get distinct list based on current filters (excluding self to allow changing selection?)
-        # Logic: Linked dropdowns usually narrow down. If I selected Product A, Station list should only show Stations for Product A.
-        # If I also select Station S1, Line list should only show Lines for (Product A AND Station S1).
-        
-        # However, a common pattern is: 
-        # The options for field X should be filtered by all OTHER Selected fields.
-        # But efficiently:
-        
-        # Let's clone base_query for each dimension, applying all filters EXCEPT the dimension itself?
-        # Or just apply all current filters to everything? 
-        # If I selected Product A, and I want to change Product, I should still see List of All Products.
-        # So Options for X should depend on (All Filters - Filter X).
-        
+        # Options for field X depend on (All Filters - Filter X), so the user can still switch X.
         # Debug logging to see actual params
         print(f"DEBUG OPTIONS REQ: item={item_name}, st={station}, prod={product}, line={line}")
+        filters = {"item_name": item_name, "station": station, "product": product, "line": line}
+        if dimension_catalog.ready:
+            return dimension_catalog.options(filters)
+
+        # 维度目录加载完成之前: 扫描检测记录
+        tables = record_partitions.tables_between()
 
         def get_distinct(target_field_name, current_filter_val):
-            # Map string name to column
-            col_map = {
-                "item_name": DetectionRecord.item_name,
-                "station": DetectionRecord.station,
-                "product": DetectionRecord.product,
-                "line": DetectionRecord.line
-            }
-            target_col = col_map[target_field_name]
-            
-            q = db.query(target_col).distinct()
-            
-            # Apply other filters (Skip if we are querying the field itself)
-            # Logic: If I am querying available 'products', I should NOT restrict by the currently selected 'product' 
-            # (unless I want to force re-selection, but usually we want to see siblings).
-            # But I MUST restrict by selected 'station', 'line', etc.
-            
-            if target_field_name != "item_name" and item_name: 
-                q = q.filter(DetectionRecord.item_name == item_name)
-            
-            if target_field_name != "station" and station: 
-                q = q.filter(DetectionRecord.station == station)
-                
-            if target_field_name != "product" and product: 
-                q = q.filter(DetectionRecord.product == product)
-                
-            if target_field_name != "line" and line: 
-                q = q.filter(DetectionRecord.line == line)
-            
-            result = [r[0] for r in q.all() if r[0]]
+            # 每个分区各查一次 distinct，合并去重 (筛选时排除字段自身)
+            others = {k: v for k, v in filters.items() if k != target_field_name}
+            values = set()
+            with db_engine.connect() as conn:
+                for day, table in tables:
+                    values.update(v for v in record_partitions.distinct(conn, day, table, target_field_name, others) if v)
+            result = sorted(values)
             print(f"DEBUG: Field {target_field_name} -> {len(result)} options")
-            return sorted(result)
+            return result
 
         return {
             "stations": get_distinct("station", station),
@@ -356,10 +440,9 @@ def update_global_config(config: GlobalConfigUpdate):
     config_store.set_global_config(global_config)
     
     # 3. Manager 更新 Default
-    engine_manager.global_config.update(update_data) 
     # Cooldown 仍然是全局生效的 (如果开启 Cooldown)
-    if "enable_cooldown" in update_data:
-        engine_manager.enable_cooldown = update_data["enable_cooldown"]
+    engine_manager.update_global_config(update_data)
+    config_resolver.invalidate_all()
 
     # 注意：不再主动遍历 engine_manager.detectors 进行更新。
     # 现有 Item 保持原样，只有新 Item 会使用新的 Default。
@@ -380,22 +463,10 @@ def update_item_config(item_name: str, config: ItemConfigUpdate):
 
     # 1. 持久化存储
     config_store.set_item_config(item_name, update_data)
+    config_resolver.invalidate(item_name)
     
     # 2. 实时更新运行中的 detector 实例 (如果有)
-    if item_name in engine_manager.detectors:
-        detector = engine_manager.detectors[item_name]
-        if "target_shift_sigma" in update_data:
-            detector.target_shift_sigma = update_data["target_shift_sigma"]
-        if "target_arl0" in update_data:
-            detector.target_arl0 = update_data["target_arl0"]
-        if "mu0" in update_data:
-            detector.mu0 = update_data["mu0"]
-        if "monitoring_side" in update_data:
-            detector.monitoring_side = update_data["monitoring_side"]
-        if "base_uph" in update_data:
-            detector.base_uph = update_data["base_uph"]
-        if "penalty_strength" in update_data:
-            detector.penalty_strength = update_data["penalty_strength"]
+    engine_manager.update_detector_config(item_name, update_data)
             
     return {"message": f"Config for {item_name} updated successfully", "updated": update_data}
 
@@ -404,6 +475,7 @@ def delete_item_config(item_name: str):
     """删除指定项目的配置及运行实例"""
     # 1. 从内存和持久化中删除
     config_store.delete_item_config(item_name)
+    config_resolver.invalidate(item_name)
     
     # 2. 从 Manager 中移除
     engine_manager.remove_detector(item_name)
@@ -425,11 +497,13 @@ def batch_delete_items(request: BatchDeleteRequest):
     # 批量清理状态 (Pre-emptive)
     if request.items:
         delete_item_states(request.items)
+        # 1. 持久化删除 (同一个事务)
+        config_store.delete_item_configs(request.items)
+        for item_name in request.items:
+            config_resolver.invalidate(item_name)
     
     for item_name in request.items:
         try:
-            # 1. 持久化删除
-            config_store.delete_item_config(item_name)
             # 2. 内存移除
             engine_manager.remove_detector(item_name)
             count += 1
@@ -455,6 +529,7 @@ def batch_import_items(request: BatchImportRequest):
     """批量导入项目，支持指定初始配置"""
     count = 0
     overrides = {}
+    new_configs: Dict[str, Dict] = {}
     if request.config:
         overrides = {k: v for k, v in request.config.dict().items() if v is not None}
 
@@ -509,51 +584,66 @@ def batch_import_items(request: BatchImportRequest):
         else:
              print(f"DEBUG: No metadata provided for item: {item_name}")
 
-        config_store.set_item_config(key, new_config)
-        print(f"DEBUG: Saved config for key: {key}")
+        new_configs[key] = new_config
         count += 1
+
+    # 所有配置在同一个事务中写入
+    config_store.set_item_configs(new_configs)
+    for key in new_configs:
+        config_resolver.invalidate(key)
+    logger.info(f"Batch import saved {len(new_configs)} configs")
         
     return {"message": f"Successfully imported {count} items with custom configuration.", "total_requested": len(request.items)}
 
 @app.get("/api/v1/history")
 def get_history(
+    response: Response,
     item_name: Optional[str] = Query(None, description="检测项名称"), # 改为可选，或者支持组合筛选
     station: Optional[str] = Query(None),
     product: Optional[str] = Query(None),
     line: Optional[str] = Query(None),
     start_time: Optional[str] = Query(None, description="例如 2023-01-01T00:00:00"),
     end_time: Optional[str] = Query(None),
-    limit: int = 200,
-    db: Session = Depends(get_db)
+    limit: int = Query(200, ge=1, le=MAX_HISTORY_LIMIT),
+    before: Optional[str] = Query(None, description="游标 (响应头 X-Prev-Cursor)，取其之前最新的 limit 条"),
+    after: Optional[str] = Query(None, description="游标 (响应头 X-Next-Cursor)，取其之后最早的 limit 条"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，例如 timestamp,value,is_alert"),
+    max_points: Optional[int] = Query(None, ge=3, description="每个检测项降采样到约 max_points 个点 (LTTB，报警点总是保留)"),
 ):
-    """查询历史检测数据 (支持多维筛选)"""
-    query = db.query(DetectionRecord)
-    
-    if item_name:
-        query = query.filter(DetectionRecord.item_name == item_name)
-    if station:
-        query = query.filter(DetectionRecord.station == station)
-    if product:
-        query = query.filter(DetectionRecord.product == product)
-    if line:
-        query = query.filter(DetectionRecord.line == line)
-    
+    """
+    查询历史检测数据 (支持多维筛选)，结果按时间升序
+    - 分页: 不带游标时返回时间窗口内最新的 limit 条；响应头 X-Prev-Cursor / X-Next-Cursor 传给 before / after 翻页
+    - max_points: 返回整个时间窗口的降采样结果 (忽略 limit，不能与游标同时使用)，响应头 X-Total-Count 为降采样前的记录数
+    """
+    st = et = None
     if start_time:
         try:
             st = datetime.datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-            query = query.filter(DetectionRecord.timestamp >= st)
         except:
             pass
-            
     if end_time:
         try:
             et = datetime.datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-            query = query.filter(DetectionRecord.timestamp <= et)
         except:
             pass
-            
-    records = query.order_by(DetectionRecord.timestamp.asc()).limit(limit).all()
-    return [r.to_dict() for r in records]
+
+    filters = {"item_name": item_name, "station": station, "product": product, "line": line}
+    try:
+        names = parse_fields(fields)
+        if max_points is not None:
+            if before or after:
+                raise ValueError("max_points cannot be combined with before / after")
+            records, total = record_history.downsampled(filters, st, et, max_points, names)
+            response.headers["X-Total-Count"] = str(total)
+            return records
+        records, prev_cursor, next_cursor = record_history.page(filters, st, et, limit, names, before, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if prev_cursor:
+        response.headers["X-Prev-Cursor"] = prev_cursor
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -567,18 +657,51 @@ async def read_root():
 @app.get("/api/v1/monitor/status")
 def get_system_status():
     """实时监控接口 (供前端看板展示接入状态)"""
-    stats = {}
-    for name, deque in engine_manager.history_cache.items():
-        if deque:
-            last = deque[-1]
-            stats[name] = {
-                "last_val": last["value"],
-                "last_time": last["timestamp"],
-                "alert": last.get("alert", False),
-                "last_baseline": last["baseline"]
-            }
+    stats = engine_manager.get_status()
     return {"active_items_count": len(stats), "items": stats}
 
+@app.get("/api/v1/monitor/memory")
+def get_memory_usage(
+    top: int = Query(0, ge=0, le=1000, description="附带占用最多的 top 个检测键明细 (默认只返回合计)"),
+    offset: int = Query(0, ge=0, description="明细跳过前 offset 个检测键 (翻页)"),
+):
+    """检测器内存占用 (合计及按组成部分汇总的保留字节数, 估算)；top > 0 时附带按占用降序的检测键明细"""
+    return engine_manager.get_memory_usage(top=top, offset=offset)
+
+@app.get("/api/v1/monitor/worker")
+def get_worker_metrics():
+    """检测任务队列的积压与拒绝次数"""
+    return detection_worker.get_metrics()
+
+@app.get("/api/v1/monitor/writer")
+def get_writer_metrics():
+    """检测记录写入队列的积压与写入耗时"""
+    metrics = engine_manager.get_writer_metrics()
+    if metrics is None:
+        return {"enabled": False}
+    return {"enabled": True, **metrics}
+
+@app.get("/api/v1/monitor/checkpoint")
+def get_checkpoint_metrics():
+    """增量检查点: 待持久化的检测器数量与最近一次写入情况"""
+    return {
+        "interval_s": CHECKPOINT_INTERVAL,
+        "slices": CHECKPOINT_SLICES,
+        "dirty": engine_manager.dirty_count(),
+        **checkpoint_stats,
+        "ingest_log": engine_manager.get_ingest_log_metrics()
+    }
+
+@app.get("/api/v1/monitor/retention")
+def get_retention_metrics():
+    """过期检测记录清理的进度 (本次删除条数、批次数、每批耗时)"""
+    return record_retention.get_metrics()
+
+@app.get("/api/v1/monitor/catalog")
+def get_catalog_metrics():
+    """筛选菜单维度目录的组合数、加载耗时与查询缓存命中"""
+    return dimension_catalog.get_metrics()
+
 # --- Background Tasks ---
 
 @app.on_event("startup")
@@ -586,83 +709,118 @@ async def startup_event():
     # 0. 确保数据库表存在
     init_db()
 
-    # 1. 尝试从数据库加载算法状态
+    # 启动检测引擎 (分片模式下启动检测子进程) 与检测记录写入线程
+    engine_manager.start()
+
+    # 1. 尝试从状态文件 + 数据库加载算法状态
     try:
-        count = engine_manager.load_all_states()
-        logger.info(f"Startup: Loaded {count} item states from persistence.")
+        started = time.perf_counter()
+        count = engine_manager.load_all_states(state_file=STATE_FILE_PATH or None)
+        logger.info(f"Startup: Loaded {count} item states from persistence "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+        # 1.1 重放最后一次检查点之后的接入日志 (须在预热之前，按已持久化状态的序号跳过旧数据)
+        replay = engine_manager.replay_ingest_log()
+        if replay:
+            logger.info(f"Startup: Replayed {replay['replayed']} readings for {replay['keys']} keys "
+                        f"from ingest log in {replay['duration_ms']:.0f} ms ({replay['skipped']} already persisted).")
         
-        # 1.1 Pre-warm detectors from ConfigStore to ensure Monitor List is populated
+        # 1.2 Pre-warm detectors from ConfigStore to ensure Monitor List is populated
         loaded_configs = config_store.get_all_items()
         logger.info(f"Startup: Pre-loading {len(loaded_configs)} detectors from config...")
-        for key, cfg in loaded_configs.items():
-             try:
-                 engine_manager.get_or_create_detector(
-                    item_name=key, # unique_key
-                    item_type=cfg.get("item_type", "parameter"),
-                    mu0=cfg.get("mu0", 0.001), 
-                    base_uph=cfg.get("base_uph", 500),
-                    monitoring_side=cfg.get("monitoring_side"),
-                    penalty_strength=cfg.get("penalty_strength", 1.0)
-                )
-             except Exception as inner_e:
-                 logger.error(f"Failed to init detector {key}: {inner_e}")
+        failed = engine_manager.prewarm_detectors(loaded_configs)
+        if failed:
+            logger.error(f"Failed to init {failed} detectors")
                  
-        logger.info(f"Startup: {len(engine_manager.detectors)} detectors active.")
+        logger.info(f"Startup: {engine_manager.detector_count()} detectors active "
+                    f"(ready in {(time.perf_counter() - started) * 1000:.0f} ms).")
         
     except Exception as e:
         logger.error(f"Startup load failed: {e}")
 
     # 2. 启动后台任务
+    detection_worker.start()
+    asyncio.create_task(load_dimension_catalog())
     asyncio.create_task(periodic_cleanup())
-    asyncio.create_task(periodic_save_state())
+    asyncio.create_task(periodic_checkpoint())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info("Shutdown: Saving all algorithm states...")
+    # 正在进行的过期清理在当前批次后退出
+    record_retention.stop()
+    logger.info("Shutdown: Draining detection queue...")
+    await detection_worker.stop()
+    logger.info("Shutdown: Saving changed algorithm states...")
     try:
-        count = engine_manager.save_all_states()
+        # 未变化的状态已由检查点持久化，这里只写入剩余的 dirty 状态
+        count = engine_manager.checkpoint_dirty(1.0)
         logger.info(f"Shutdown: Saved {count} item states.")
+        if STATE_FILE_PATH:
+            count = engine_manager.save_state_file(STATE_FILE_PATH)
+            logger.info(f"Shutdown: Wrote {count} detector snapshots to {STATE_FILE_PATH}.")
     except Exception as e:
         logger.error(f"Shutdown save failed: {e}")
 
+    dimension_catalog.flush()
+
+    # 写完队列中剩余的检测记录 (分片模式下同时停止检测子进程)
+    logger.info("Shutdown: Flushing pending detection records...")
+    engine_manager.stop()
+
 async def periodic_cleanup():
-    """定期清理 30 天前的旧数据"""
+    """
+    定期清理过期的检测记录 (每 RETENTION_INTERVAL 秒一次)
+    按主键区间分批删除，在线程池中执行，不阻塞事件循环 (进度见 /api/v1/monitor/retention)
+    """
+    loop = asyncio.get_running_loop()
     while True:
         try:
-            # 每天执行一次
-            # logger.info("Executing periodic data cleanup...")
-            cutoff_date = datetime.datetime.now() - datetime.timedelta(days=30)
-            
-            db = SessionLocal()
-            try:
-                # 使用原生 SQL 或 ORM 删除
-                num_deleted = db.query(DetectionRecord).filter(DetectionRecord.timestamp < cutoff_date).delete()
-                db.commit()
-                if num_deleted > 0:
-                     logger.info(f"Cleanup complete. Deleted {num_deleted} old records.")
-            except Exception as e:
-                logger.error(f"Cleanup failed: {str(e)}")
-            finally:
-                db.close()
-                
+            num_deleted = await loop.run_in_executor(None, record_retention.run)
+            cutoff = record_retention.last_run.get("cutoff")
+            if cutoff:
+                pruned = await loop.run_in_executor(
+                    None, dimension_catalog.prune, datetime.datetime.fromisoformat(cutoff).date())
+                if pruned:
+                    logger.info(f"Cleanup: Removed {pruned} expired dimension combinations from catalog.")
+            if num_deleted > 0:
+                last = record_retention.last_run
+                logger.info(f"Cleanup complete. Deleted {num_deleted} old records "
+                            f"in {last['batches']} batches ({last.get('duration_ms', 0):.0f} ms).")
         except Exception as e:
-            logger.error(f"Cleanup task wrapper error: {str(e)}")
-            
-        # 等待 24 小时 (86400 seconds)
-        await asyncio.sleep(86400)
+            logger.error(f"Cleanup failed: {str(e)}")
 
-async def periodic_save_state():
-    """定期保存算法状态 (每日)"""
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+async def load_dimension_catalog():
+    """从数据库加载筛选菜单的维度目录 (升级后首次启动需从检测记录回填，在线程池中执行)"""
+    loop = asyncio.get_running_loop()
+    try:
+        count = await loop.run_in_executor(None, dimension_catalog.rebuild)
+        logger.info(f"Startup: Loaded {count} dimension combinations in {dimension_catalog.rebuild_ms:.0f} ms.")
+    except Exception as e:
+        logger.error(f"Dimension catalog load failed: {e}")
+
+async def periodic_checkpoint():
+    """
+    增量检查点 (每 CHECKPOINT_INTERVAL 秒持久化所有变化过的检测器状态)
+    - 周期拆成 CHECKPOINT_SLICES 个小片，每片写入剩余 dirty 状态的 1/剩余片数，周期结束时全部写完
+    - 每片同时写入维度目录中新出现的组合
+    - 写入在线程池中执行，不阻塞事件循环
+    """
+    loop = asyncio.get_running_loop()
+    slice_seconds = CHECKPOINT_INTERVAL / CHECKPOINT_SLICES
+    slice_no = 0
     while True:
+        await asyncio.sleep(slice_seconds)
+        remaining = CHECKPOINT_SLICES - slice_no % CHECKPOINT_SLICES
+        slice_no += 1
         try:
-            # 初始等待 1 小时，防止启动时立刻执行
-            await asyncio.sleep(3600) 
-            
-            count = engine_manager.save_all_states()
-            logger.info(f"Periodic Save: Saved {count} item states.")
-            
-            # 之后每 24 小时保存一次
-            await asyncio.sleep(86400)
+            started = time.perf_counter()
+            count = await loop.run_in_executor(None, engine_manager.checkpoint_dirty, 1.0 / remaining)
+            checkpoint_stats["last_saved"] = count
+            checkpoint_stats["total_saved"] += count
+            checkpoint_stats["last_run"] = datetime.datetime.now().isoformat()
+            checkpoint_stats["last_duration_ms"] = (time.perf_counter() - started) * 1000
         except Exception as e:
-             logger.error(f"Periodic Save failed: {e}")
-             await asyncio.sleep(3600) # retry later
+            logger.error(f"Checkpoint failed: {e}")
+        await loop.run_in_executor(None, dimension_catalog.flush)
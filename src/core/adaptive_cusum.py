@@ -1,14 +1,117 @@
 # adaptive_cusum.py
+import sys
+import math
+import collections
 import numpy as np
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 from .baseline_updater import AdaptiveBaseline
 from .k_updater import AdaptiveKUpdater
+from .observation_window import (
+    ObservationWindow, DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION, EMPTY_HISTORY, container_bytes
+)
+from .detector_profile import DetectorProfile, profile_property
+from .detector_snapshot import (
+    DetectorSnapshot, capture_snapshot, encode_snapshot, unpack_snapshot,
+    restore_calculation, restore_learning, restore_h_history
+)
+
+
+class CalculationResult:
+    """
+    最近一次检测的计算快照 (预分配、可复用的记录)
+
+    update() 直接写入各字段，不再每次构造字典；
+    只有 API 响应 / 报警推送需要时才通过 to_dict() 生成 last_calculation 结构的字典。
+    """
+
+    __slots__ = (
+        "valid", "skipped",
+        "baseline", "k", "threshold", "deviation_plus", "deviation_minus",
+        "S_plus", "S_minus", "std", "uph_ratio", "alert_side",
+    )
+
+    def __init__(self):
+        self.valid = False  # 是否已有计算结果
+        self.skipped = False  # UPH太低，跳过检测
+        self.baseline = 0.0
+        self.k = 0.0
+        self.threshold = 0.0
+        self.deviation_plus = 0.0
+        self.deviation_minus = 0.0
+        self.S_plus = 0.0
+        self.S_minus = 0.0
+        self.std = 0.0
+        self.uph_ratio = 0.0
+        self.alert_side = None
+
+    def set_skipped(self, baseline, k):
+        self.valid = True
+        self.skipped = True
+        self.baseline = baseline
+        self.k = k
+        self.threshold = 0.0
+        self.deviation_plus = 0.0
+        self.deviation_minus = 0.0
+        self.S_plus = 0.0
+        self.S_minus = 0.0
+        self.std = 0.0
+        self.uph_ratio = 0.0
+        self.alert_side = None
+
+    def to_dict(self) -> Optional[Dict]:
+        """生成与原 last_calculation 相同结构的字典"""
+        if not self.valid:
+            return None
+        if self.skipped:
+            return {
+                "baseline": self.baseline,
+                "k": self.k,
+                "threshold": 0.0,
+                "deviation": 0.0,
+                "deviation_standardized": 0.0,
+                "threshold_multiplier": 0.0,
+                "std": 0.0,
+                "skip_reason": "UPH太低"
+            }
+        return {
+            "baseline": self.baseline,
+            "k": self.k,
+            "threshold": self.threshold,
+            "deviation_plus": self.deviation_plus,
+            "deviation_minus": self.deviation_minus,
+            "S_plus": self.S_plus,
+            "S_minus": self.S_minus,
+            "std": self.std,
+            "uph_ratio": self.uph_ratio,
+            "alert_side": self.alert_side
+        }
 
 
 class AdaptiveCUSUMDetector:
     """自适应CUSUM检测器 - 支持FIR和EWMA优化"""
 
+    # 紧凑存储: 只保存每个检测器各自的参数与状态，共享常量保存在 profile 中
+    __slots__ = (
+        "profile",
+        "mu0", "base_uph", "base_h", "penalty_strength",
+        "_target_shift_sigma", "_target_arl0", "item_type", "monitoring_side",
+        "S_plus", "S_minus", "h_history",
+        "samples_since_reset", "total_samples", "fir_active", "ewma_baseline",
+        "window", "baseline_updater", "k_updater", "calc",
+    )
+
+    min_uph_ratio = profile_property("min_uph_ratio")
+    min_detection_ratio = profile_property("min_detection_ratio")
+    min_k = profile_property("min_k")
+    use_standardization = profile_property("use_standardization")
+    use_arl = profile_property("use_arl")
+    use_fir = profile_property("use_fir")
+    fir_ratio = profile_property("fir_ratio")
+    fir_duration = profile_property("fir_duration")
+    use_ewma = profile_property("use_ewma")
+    ewma_lambda = profile_property("ewma_lambda")
+
     def __init__(
             self,
             mu0,
@@ -31,6 +134,11 @@ class AdaptiveCUSUMDetector:
             # ========== EWMA参数更新（P2优化）==========
             use_ewma=False,  # 是否使用EWMA参数更新
             ewma_lambda=0.2,  # EWMA衰减因子（新数据权重20%）
+            # ========== 历史保留 ==========
+            history_retention=DEFAULT_HISTORY_RETENTION,  # h_history / 完整数据保留条数
+            update_history_retention=DEFAULT_UPDATE_HISTORY_RETENTION,  # 参数更新记录保留条数
+            # ========== 共享参数模板 ==========
+            profile: Optional[DetectorProfile] = None,  # 传入时忽略上面的共享常量参数
     ):
         """
         初始化自适应CUSUM检测器
@@ -41,17 +149,32 @@ class AdaptiveCUSUMDetector:
             base_h: 基准阈值
             item_type: 监控项类型 ("yield" 或 "parameter")
             monitoring_side: 监控方向 ("upper", "lower", "both")
+            history_retention: 每类逐点历史最多保留的条数 (超出后淘汰最早的数据)
+            update_history_retention: 基准 / K 值更新记录最多保留的条数
+            profile: 共享参数模板 (DetectionEngineManager 创建的检测器共用同一个)
             ... 其他参数保持一致
         """
+        if profile is None:
+            profile = DetectorProfile.get(
+                min_uph_ratio=min_uph_ratio,
+                min_detection_ratio=min_detection_ratio,
+                min_k=min_k,
+                use_standardization=use_standardization,
+                use_arl=use_arl,
+                use_fir=use_fir,
+                fir_ratio=fir_ratio,
+                fir_duration=fir_duration,
+                use_ewma=use_ewma,
+                ewma_lambda=ewma_lambda,
+                history_retention=history_retention,
+                update_history_retention=update_history_retention
+            )
+        self.profile = profile
+
         self.mu0 = mu0
         self.base_uph = base_uph
         self.base_h = base_h
-        self.min_uph_ratio = min_uph_ratio
-        self.min_detection_ratio = min_detection_ratio
-        self.min_k = min_k
         self.penalty_strength = penalty_strength
-        self.use_standardization = use_standardization
-        self.use_arl = use_arl
         
         # Internal storage for properties
         self._target_shift_sigma = target_shift_sigma
@@ -66,39 +189,25 @@ class AdaptiveCUSUMDetector:
         # 初始化状态
         self.S_plus = 0.0
         self.S_minus = 0.0
-        self.h_history = []
+        self.h_history = EMPTY_HISTORY  # 首次检测时创建 (最多 history_retention 条)
+        self.calc = CalculationResult()  # 最近一次计算快照 (每次 update 复用)
 
         # FIR相关状态
-        self.use_fir = use_fir
-        self.fir_ratio = fir_ratio
-        self.fir_duration = fir_duration
         self.samples_since_reset = 0
         self.total_samples = 0
         self.fir_active = False
 
         # EWMA相关状态
-        self.use_ewma = use_ewma
-        self.ewma_lambda = ewma_lambda
         self.ewma_baseline = mu0
 
-        # 初始化参数更新器
-        self.baseline_updater = AdaptiveBaseline(
-            window_size=700,
-            update_interval=24,
-            max_change_ratio=0.1,
-            invalid_points_around_alert=10,
-            base_uph=base_uph,
-            min_detection_ratio=min_detection_ratio
-        )
-
-        self.k_updater = AdaptiveKUpdater(
-            window_size=700,
-            update_interval=24,
-            max_change_ratio=0.1,
-            invalid_points_around_alert=10,
-            base_uph=base_uph,
-            min_detection_ratio=min_detection_ratio
+        # 初始化参数更新器 (共用同一个观测窗口与参数模板)
+        self.window = ObservationWindow(
+            window_size=profile.window_size,
+            invalid_points_around_alert=profile.invalid_points_around_alert,
+            history_retention=profile.history_retention
         )
+        self.baseline_updater = AdaptiveBaseline(base_uph=base_uph, window=self.window, profile=profile)
+        self.k_updater = AdaptiveKUpdater(base_uph=base_uph, window=self.window, profile=profile)
 
     def _recalculate_h(self):
         if self.use_arl:
@@ -137,6 +246,7 @@ class AdaptiveCUSUMDetector:
             line_state: 产线状态 (optional)
         """
         value = x # 内部使用 value 变量名
+        profile = self.profile  # 共享常量 (热点路径上直接读取，避免属性代理)
         
         # 更新计数器
         self.samples_since_reset += 1
@@ -146,6 +256,13 @@ class AdaptiveCUSUMDetector:
         if current_baseline is None:
             current_baseline = self.mu0
 
+        # 数据点只写入一次共享窗口，两个更新器读取同一份数据
+        self.window.add(
+            timestamp, value, current_uph,
+            is_alert=False,  # 暂时设为False，后面会更新
+            is_low_uph=current_uph < self.baseline_updater.base_uph * self.baseline_updater.profile.min_detection_ratio
+        )
+
         self.baseline_updater.add_data_point(
             timestamp=timestamp,
             defect_rate=value,
@@ -167,28 +284,19 @@ class AdaptiveCUSUMDetector:
         if current_baseline is None:
             current_baseline = self.mu0
 
-        if self.use_ewma:
+        if profile.use_ewma:
             # EWMA更新
-            self.ewma_baseline = self.ewma_lambda * value + (1 - self.ewma_lambda) * self.ewma_baseline
+            self.ewma_baseline = profile.ewma_lambda * value + (1 - profile.ewma_lambda) * self.ewma_baseline
             current_baseline = self.ewma_baseline
 
         current_k = self.k_updater.get_current_k()
         if current_k is None:
-            current_k = self.min_k
+            current_k = profile.min_k
 
         # 检查是否应该检测
         uph_ratio = current_uph / self.base_uph
-        if uph_ratio < self.min_detection_ratio:
-            self.last_calculation = {
-                "baseline": current_baseline,
-                "k": current_k,
-                "threshold": 0.0,
-                "deviation": 0.0,
-                "deviation_standardized": 0.0,
-                "threshold_multiplier": 0.0,
-                "std": 0.0,
-                "skip_reason": "UPH太低"
-            }
+        if uph_ratio < profile.min_detection_ratio:
+            self.calc.set_skipped(current_baseline, current_k)
             return False
 
         # 初始化状态值记录
@@ -206,28 +314,28 @@ class AdaptiveCUSUMDetector:
                 std_base_value = 3.0 # 默认兜底 (从1.0改为3.0，保守策略)
             
             # 根据采样数量 (uph) 缩放标准差: sigma_env = sigma / sqrt(n)
-            std_baseline = std_base_value / np.sqrt(max(1, self.base_uph))
-            std_current = std_base_value / np.sqrt(max(1, current_uph))
+            std_baseline = std_base_value / math.sqrt(max(1, self.base_uph))
+            std_current = std_base_value / math.sqrt(max(1, current_uph))
 
         # 计算偏差和累积和
         # 更新计数器
         self.total_samples += 1
         
-        if self.use_standardization:
+        if profile.use_standardization:
             if std_baseline == 0:
                 threshold_multiplier = 1.0
             else:
                 threshold_multiplier = std_current / std_baseline
 
-            if uph_ratio < self.min_uph_ratio:
-                extra_penalty = (self.min_uph_ratio / uph_ratio - 1) ** 0.5
+            if uph_ratio < profile.min_uph_ratio:
+                extra_penalty = (profile.min_uph_ratio / uph_ratio - 1) ** 0.5
                 threshold_multiplier *= (1 + extra_penalty * self.penalty_strength)
 
             # 标准化 CUSUM 计算
             x_standardized = (value - current_baseline) / std_current
             k_standardized = current_k / std_current
             
-            if self.use_arl:
+            if profile.use_arl:
                 h_standardized = self.base_h * threshold_multiplier
             else:
                 h_standardized = self.base_h * threshold_multiplier / std_current
@@ -244,7 +352,7 @@ class AdaptiveCUSUMDetector:
                 deviation_standardized_minus = (-x_standardized) - k_standardized
                 self.S_minus = max(0, self.S_minus + deviation_standardized_minus)
 
-            self.h_history.append(h_limit)
+            self._record_h(h_limit)
             deviation = deviation_standardized_plus * std_current # 仅用于记录
             h = h_standardized # 修复：在标准化模式下，比较阈值应为标准化阈值
         else:
@@ -252,10 +360,10 @@ class AdaptiveCUSUMDetector:
             if uph_ratio >= 1:
                 threshold_multiplier = 1.0
             else:
-                threshold_multiplier = np.sqrt(self.base_uph / current_uph)
+                threshold_multiplier = math.sqrt(self.base_uph / current_uph)
 
-            if uph_ratio < self.min_uph_ratio:
-                extra_penalty = (self.min_uph_ratio / uph_ratio - 1) ** 0.5
+            if uph_ratio < profile.min_uph_ratio:
+                extra_penalty = (profile.min_uph_ratio / uph_ratio - 1) ** 0.5
                 threshold_multiplier *= (1 + extra_penalty * self.penalty_strength)
 
             deviation = value - current_baseline
@@ -267,10 +375,10 @@ class AdaptiveCUSUMDetector:
             if self.monitoring_side in ["lower", "both"]:
                 self.S_minus = max(0, self.S_minus + ((-deviation) - current_k))
             
-            self.h_history.append(h)
+            self._record_h(h)
 
         # 检查FIR是否应该停用
-        if self.fir_active and self.samples_since_reset > self.fir_duration:
+        if self.fir_active and self.samples_since_reset > profile.fir_duration:
             self.fir_active = False
             # 不重置CUSUM值，让它自然累积
 
@@ -279,19 +387,20 @@ class AdaptiveCUSUMDetector:
         alert_minus = (self.monitoring_side in ["lower", "both"]) and (self.S_minus >= h)
         alert = alert_plus or alert_minus
 
-        # 记录计算过程
-        self.last_calculation = {
-            "baseline": current_baseline,
-            "k": current_k,
-            "threshold": h,
-            "deviation_plus": deviation_standardized_plus * std_current,
-            "deviation_minus": deviation_standardized_minus * std_current,
-            "S_plus": self.S_plus,
-            "S_minus": self.S_minus,
-            "std": std_current,
-            "uph_ratio": uph_ratio,
-            "alert_side": "upper" if alert_plus else ("lower" if alert_minus else None)
-        }
+        # 记录计算过程 (写入复用的快照记录)
+        calc = self.calc
+        calc.valid = True
+        calc.skipped = False
+        calc.baseline = current_baseline
+        calc.k = current_k
+        calc.threshold = h
+        calc.deviation_plus = deviation_standardized_plus * std_current
+        calc.deviation_minus = deviation_standardized_minus * std_current
+        calc.S_plus = self.S_plus
+        calc.S_minus = self.S_minus
+        calc.std = std_current
+        calc.uph_ratio = uph_ratio
+        calc.alert_side = "upper" if alert_plus else ("lower" if alert_minus else None)
 
         # 如果报警，更新参数更新器并重置CUSUM
         if alert:
@@ -303,6 +412,11 @@ class AdaptiveCUSUMDetector:
 
         return bool(alert)
 
+    def _record_h(self, h) -> None:
+        if self.h_history is EMPTY_HISTORY:
+            self.h_history = collections.deque(maxlen=self.profile.history_retention)
+        self.h_history.append(h)
+
     def _reset(self):
         """报警后重置累积和"""
         if self.use_fir:
@@ -321,28 +435,44 @@ class AdaptiveCUSUMDetector:
         """计算标准差"""
         if self.item_type == "yield":
             if value <= 0 or value >= 1: return 0.0
-            return np.sqrt(value * (1 - value) / size)
+            return math.sqrt(value * (1 - value) / size)
         else:
             # 对于参数类，std 由外部 updater 计算并在 update 中处理 uph 缩放
             # 这里仅作为签名兼容
             return 1.0
 
+    def memory_usage(self) -> Dict[str, int]:
+        """检测器保留的内存 (字节, 估算)"""
+        usage = {
+            "detector": sys.getsizeof(self) + container_bytes(self.h_history),
+            "window": self.window.memory_usage(),
+            "baseline_updater": self.baseline_updater.memory_usage(),
+            "k_updater": self.k_updater.memory_usage(),
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    @property
+    def last_calculation(self) -> Optional[Dict]:
+        """最近一次计算过程 (按需生成字典)"""
+        return self.calc.to_dict()
+
     def get_current_status(self):
         """
         获取当前算法内部状态
         
         如果最近一次 update 触发了报警并 reset, 这里返回的是 reset 前的快照。
         """
-        if self.last_calculation:
+        calc = self.calc
+        if calc.valid:
             # 使用快照数据构建状态，确保 manager 拿到的是报警时刻的值
-            lc = self.last_calculation
             return {
-                "baseline": lc.get("baseline", 0.0),
-                "S_plus": lc.get("S_plus", 0.0),
-                "S_minus": lc.get("S_minus", 0.0),
-                "h_value": lc.get("threshold", 0.0),
-                "k_value": lc.get("k", 0.0),
-                "calculation_details": lc, # 关键：必须包含此字段
+                "baseline": calc.baseline,
+                "S_plus": calc.S_plus,
+                "S_minus": calc.S_minus,
+                "h_value": calc.threshold,
+                "k_value": calc.k,
+                "calculation_details": calc.to_dict(), # 关键：必须包含此字段
                 "total_samples": self.total_samples,
                 "fir_active": self.fir_active
             }
@@ -354,25 +484,66 @@ class AdaptiveCUSUMDetector:
             "S_minus": self.S_minus,
             "h_value": self.base_h * (self.h_history[-1] / self.base_h if self.h_history else 1.0), # 估算
             "k_value": self.k_updater.get_current_k() or self.min_k,
-            "calculation_details": self.last_calculation or {},
+            "calculation_details": {},
             "total_samples": self.total_samples,
             "fir_active": self.fir_active
         }
 
+    def get_state(self) -> Dict:
+        """
+        导出需要持久化的状态 (与 set_state 对应)
+        累积量取当前值 (报警 reset 后为 reset 后的值)，而不是 get_current_status 中的报警快照
+        """
+        calc = self.calc
+        if calc.valid:
+            baseline, k_value, std = calc.baseline, calc.k, calc.std
+        else:
+            baseline = self.baseline_updater.get_current_baseline() or self.mu0
+            k_value = self.k_updater.get_current_k() or self.min_k
+            # 优先从最近一次计算取 std, 如果没有则尝试从 updater 获取
+            std = self.k_updater.get_current_std() or 0.0
         return {
-            "baseline": status["baseline"],
-            # 优先从 current status 取 std, 如果没有则尝试从 updater 获取
-            "std": details.get("std", 0.0), 
-            "k_value": status["k_value"],
-            "s_plus": status["S_plus"],
-            "s_minus": status["S_minus"]
+            "baseline": baseline,
+            "std": std,
+            "k_value": k_value,
+            "s_plus": self.S_plus,
+            "s_minus": self.S_minus,
+            "snapshot": self.get_snapshot()
         }
 
+    def capture_snapshot(self) -> DetectorSnapshot:
+        """完整快照 (含观测窗口与更新器状态，见 detector_snapshot)"""
+        last_h = self.h_history[-1] if self.h_history else float("nan")
+        core = (self.S_plus, self.S_minus, self.ewma_baseline, self.samples_since_reset,
+                self.total_samples, self.fir_active, last_h)
+        return capture_snapshot(core, self.calc, self.window, self.baseline_updater, self.k_updater)
+
+    def get_snapshot(self) -> bytes:
+        return encode_snapshot(self.capture_snapshot())
+
+    def restore_snapshot(self, blob: bytes):
+        """从完整快照 BLOB 恢复 (格式或窗口参数不匹配时抛出 ValueError)"""
+        self.apply_snapshot(unpack_snapshot(blob))
+
+    def apply_snapshot(self, snapshot: DetectorSnapshot):
+        restore_learning(snapshot, self.window, self.baseline_updater, self.k_updater)
+        restore_calculation(self.calc, snapshot.calc)
+        (self.S_plus, self.S_minus, self.ewma_baseline, self.samples_since_reset,
+         self.total_samples, self.fir_active, last_h) = snapshot.core
+        self.h_history = restore_h_history(last_h, self.total_samples, self.profile.history_retention)
+
     def set_state(self, state: Dict):
-        """从持久化恢复状态"""
+        """从持久化恢复状态 (有完整快照时逐位恢复，否则只恢复累积和与基准值)"""
         if not state:
             return
-        
+
+        if state.get("snapshot"):
+            try:
+                self.restore_snapshot(state["snapshot"])
+                return
+            except Exception as e:
+                print(f"[WARN] Snapshot restore failed, falling back to summary state: {e}")
+
         self.S_plus = state.get("s_plus", 0.0)
         self.S_minus = state.get("s_minus", 0.0)
         
@@ -1,11 +1,17 @@
 import numpy as np
 from datetime import datetime
 from dataclasses import dataclass
+import sys
 from typing import List, Optional
+from .observation_window import (
+    ObservationWindow, DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION, container_bytes
+)
+from .detector_profile import DetectorProfile, profile_property
 
 @dataclass
 class BaselineUpdate:
     """记录基础不良率更新的数据类"""
+    __slots__ = ("timestamp", "old_value", "new_value", "is_limited", "valid_points", "window_points")
     timestamp: datetime
     old_value: float
     new_value: float
@@ -14,6 +20,19 @@ class BaselineUpdate:
     window_points: int  # 窗口总点数
 
 class AdaptiveBaseline:
+    # 紧凑存储: 窗口参数等共享常量保存在 profile 中
+    __slots__ = (
+        "profile", "base_uph", "current_baseline", "last_update_time",
+        "update_history", "owns_window", "window",
+    )
+
+    window_size = profile_property("window_size")
+    update_interval = profile_property("update_interval")
+    max_change_ratio = profile_property("max_change_ratio")
+    invalid_points_around_alert = profile_property("invalid_points_around_alert")
+    min_detection_ratio = profile_property("min_detection_ratio")
+    update_history_retention = profile_property("update_history_retention")
+
     def __init__(
         self,
         window_size: int = 700,  # 滑动窗口大小
@@ -21,52 +40,62 @@ class AdaptiveBaseline:
         max_change_ratio: float = 0.1,  # 最大变化步长（百分比）
         invalid_points_around_alert: int = 10,  # 异常点前后的无效点数
         base_uph: int = 500,  # 基准UPH
-        min_detection_ratio: float = 0.1  # 最小检测UPH比例
+        min_detection_ratio: float = 0.1,  # 最小检测UPH比例
+        window: Optional[ObservationWindow] = None,  # 共享观测窗口 (由检测器统一写入)
+        history_retention: int = DEFAULT_HISTORY_RETENTION,  # 自有窗口的完整数据保留条数
+        update_history_retention: int = DEFAULT_UPDATE_HISTORY_RETENTION,  # 更新记录保留条数
+        profile: Optional[DetectorProfile] = None  # 共享参数模板 (传入时忽略上面的共享常量参数)
     ):
         """初始化自适应基础不良率计算器"""
-        self.window_size = window_size
-        self.update_interval = update_interval
-        self.max_change_ratio = max_change_ratio
-        self.invalid_points_around_alert = invalid_points_around_alert
+        if profile is None:
+            profile = DetectorProfile.get(
+                window_size=window_size,
+                update_interval=update_interval,
+                max_change_ratio=max_change_ratio,
+                invalid_points_around_alert=invalid_points_around_alert,
+                min_detection_ratio=min_detection_ratio,
+                history_retention=history_retention,
+                update_history_retention=update_history_retention
+            )
+        self.profile = profile
         self.base_uph = base_uph
-        self.min_detection_ratio = min_detection_ratio
         
         # 初始化状态
         self.current_baseline = None  # 当前基础不良率
         self.last_update_time = None  # 上次更新时间
-        self.update_history: List[BaselineUpdate] = []  # 更新历史
-        self.data_buffer = []  # 数据缓冲区（完整数据）
-        self.alert_points = set()  # 异常点集合
-        self.sliding_buffer = []  # 滑动窗口缓冲区（用于计算基础不良率）
-        self.sliding_alerts = set()  # 滑动窗口中的异常点集合
-        self.low_uph_points = set()  # 极低UPH点集合
+        self.update_history: List[BaselineUpdate] = []  # 最近的更新历史 (最多 update_history_retention 条)
+        # 滑动窗口（环形缓冲，用于计算基础不良率）
+        # 传入共享窗口时由检测器统一写入数据，否则由本更新器自行维护
+        self.owns_window = window is None
+        self.window = window if window is not None else ObservationWindow(
+            window_size=profile.window_size,
+            invalid_points_around_alert=profile.invalid_points_around_alert,
+            history_retention=profile.history_retention
+        )
+
+    @property
+    def data_buffer(self):
+        """数据缓冲区（完整数据）"""
+        return self.window.data_buffer
+
+    @property
+    def alert_points(self):
+        """异常点集合"""
+        return self.window.alert_points
+
+    @property
+    def low_uph_points(self):
+        """极低UPH点集合"""
+        return self.window.low_uph_points
     
     def add_data_point(self, timestamp: datetime, defect_rate: float, is_alert: bool, 
                       current_uph: float, current_baseline: float) -> None:
-        """添加新的数据点"""
-        # 记录完整数据
-        self.data_buffer.append((timestamp, defect_rate, current_uph))
-        current_idx = len(self.data_buffer) - 1
-        
-        if is_alert:
-            self.alert_points.add(current_idx)
-        
-        # 检查是否为极低UPH点
-        if current_uph < self.base_uph * self.min_detection_ratio:
-            self.low_uph_points.add(current_idx)
-        
-        # 更新滑动窗口
-        self.sliding_buffer.append((timestamp, defect_rate, current_uph))
-        sliding_idx = len(self.sliding_buffer) - 1
-        
-        if is_alert:
-            self.sliding_alerts.add(sliding_idx)
-        
-        # 如果滑动窗口超过大小，移除最早的数据
-        if len(self.sliding_buffer) > self.window_size:
-            self.sliding_buffer.pop(0)
-            # 更新滑动窗口中的异常点索引
-            self.sliding_alerts = {i-1 for i in self.sliding_alerts if i > 0}
+        """添加新的数据点 (共享窗口时数据已由检测器写入，这里只检查是否需要更新)"""
+        if self.owns_window:
+            self.window.add(
+                timestamp, defect_rate, current_uph, is_alert,
+                is_low_uph=current_uph < self.base_uph * self.min_detection_ratio
+            )
         
         # 检查是否需要更新基础不良率
         if self._should_update(timestamp):
@@ -75,46 +104,28 @@ class AdaptiveBaseline:
     def _should_update(self, current_time: datetime) -> bool:
         """检查是否应该更新基础不良率"""
         if self.last_update_time is None:
-            return len(self.sliding_buffer) >= self.window_size
+            return len(self.window) >= self.profile.window_size
         
         hours_since_last_update = (current_time - self.last_update_time).total_seconds() / 3600
-        return hours_since_last_update >= self.update_interval
+        return hours_since_last_update >= self.profile.update_interval
     
     def _get_invalid_indices(self) -> set:
-        """获取所有无效数据点的索引"""
-        invalid_indices = set()
-        
-        # 获取滑动窗口中的极低UPH点
-        for i, (_, _, uph) in enumerate(self.sliding_buffer):
-            if uph < self.base_uph * self.min_detection_ratio:
-                invalid_indices.add(i)
-        
-        # 添加异常点及其前后的点
-        for alert_idx in self.sliding_alerts:
-            start = max(0, alert_idx - self.invalid_points_around_alert)
-            end = min(len(self.sliding_buffer), 
-                     alert_idx + self.invalid_points_around_alert + 1)
-            invalid_indices.update(range(start, end))
-        
-        return invalid_indices
+        """获取所有无效数据点的索引 (极低UPH点、异常点及其前后的点)"""
+        return set(np.flatnonzero(~self.window.baseline_valid_mask()).tolist())
     
     def _update_baseline(self) -> None:
         """更新基础不良率"""
-        if len(self.sliding_buffer) < self.window_size:
+        if len(self.window) < self.window_size:
             return
         
-        # 获取有效数据点
-        invalid_indices = self._get_invalid_indices()
-        valid_rates = [
-            rate for idx, (_, rate, _) in enumerate(self.sliding_buffer)
-            if idx not in invalid_indices
-        ]
-        
-        if not valid_rates:  # 如果没有有效数据点
+        # 有效数据点均值 (窗口增量维护，O(1))
+        stats = self.window.baseline_stats
+        valid_points = stats.count
+        if not valid_points:  # 如果没有有效数据点
             return
         
         # 计算新的基础不良率
-        new_baseline = np.mean(valid_rates)
+        new_baseline = stats.mean()
         
         # 如果是首次更新
         if self.current_baseline is None:
@@ -133,26 +144,36 @@ class AdaptiveBaseline:
         
         # 记录更新
         update = BaselineUpdate(
-            timestamp=self.sliding_buffer[-1][0],
+            timestamp=self.window.last_timestamp,
             old_value=self.current_baseline if self.current_baseline is not None else new_baseline,
             new_value=new_baseline,
             is_limited=is_limited,
-            valid_points=len(valid_rates),
-            window_points=len(self.sliding_buffer)
+            valid_points=valid_points,
+            window_points=len(self.window)
         )
-        self.update_history.append(update)
+        self._record_update(update)
         
         # 更新状态
         self.current_baseline = new_baseline
-        self.last_update_time = self.sliding_buffer[-1][0]
+        self.last_update_time = self.window.last_timestamp
     
     def get_current_baseline(self) -> Optional[float]:
         """获取当前基础不良率"""
         return self.current_baseline
 
+    def _record_update(self, update) -> None:
+        """记录一次更新 (超出保留条数时丢弃最早的记录; 更新频率很低，用列表比 deque 更省内存)"""
+        self.update_history.append(update)
+        if len(self.update_history) > self.update_history_retention:
+            del self.update_history[0]
+
+    def memory_usage(self) -> int:
+        """更新器保留的内存 (字节, 估算; 共享窗口不计入)"""
+        size = sys.getsizeof(self) + container_bytes(self.update_history)
+        if self.owns_window:
+            size += self.window.memory_usage()
+        return size
+
     def update_alert_status(self, index: int, is_alert: bool) -> None:
-        """更新指定索引的异常状态"""
-        if is_alert:
-            self.alert_points.add(index)
-        else:
-            self.alert_points.discard(index) 
\ No newline at end of file
+        """更新指定索引 (写入序号) 的异常状态"""
+        self.window.set_alert(index, is_alert)
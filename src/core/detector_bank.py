@@ -0,0 +1,600 @@
+# detector_bank.py
+import sys
+import numpy as np
+from typing import Dict, Optional
+from .baseline_updater import AdaptiveBaseline
+from .k_updater import AdaptiveKUpdater
+from .observation_window import ObservationWindow, DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION
+from .detector_profile import DetectorProfile
+from .adaptive_cusum import CalculationResult
+from .detector_snapshot import DetectorSnapshot, capture_snapshot, encode_snapshot, unpack_snapshot, restore_learning
+
+# 监控方向编码 (bitmask)
+SIDE_UPPER = 1
+SIDE_LOWER = 2
+SIDE_BOTH = SIDE_UPPER | SIDE_LOWER
+SIDE_CODES = {"upper": SIDE_UPPER, "lower": SIDE_LOWER, "both": SIDE_BOTH}
+SIDE_NAMES = {v: k for k, v in SIDE_CODES.items()}
+
+
+class DetectorBank:
+    """
+    向量化检测器组 (Struct-of-Arrays)
+
+    与 AdaptiveCUSUMDetector 的算法完全一致，但所有检测器的 CUSUM 状态与参数
+    (S_plus, S_minus, baseline, k, std, base_uph, penalty_strength, monitoring_side, FIR 计数器等)
+    保存在按 slot 索引的 NumPy 数组中，一个 tick 的数据通过数组运算一次完成更新。
+
+    窗口学习 (AdaptiveBaseline / AdaptiveKUpdater) 仍按 slot 保存，
+    它们每 update_interval 才重新计算一次，不在热点路径上。
+    """
+
+    def __init__(
+            self,
+            capacity=1024,
+            min_uph_ratio=0.5,
+            min_detection_ratio=0.15,
+            min_k=0.001,
+            use_standardization=True,
+            use_arl=True,
+            use_fir=False,
+            fir_ratio=0.004,
+            fir_duration=700,
+            use_ewma=False,
+            ewma_lambda=0.2,
+            history_retention=DEFAULT_HISTORY_RETENTION,
+            update_history_retention=DEFAULT_UPDATE_HISTORY_RETENTION,
+    ):
+        # 所有检测器共享的常量
+        self.min_uph_ratio = min_uph_ratio
+        self.min_detection_ratio = min_detection_ratio
+        self.min_k = min_k
+        self.use_standardization = use_standardization
+        self.use_arl = use_arl
+        self.use_fir = use_fir
+        self.fir_ratio = fir_ratio
+        self.fir_duration = fir_duration
+        self.use_ewma = use_ewma
+        self.ewma_lambda = ewma_lambda
+        self.history_retention = history_retention
+        self.update_history_retention = update_history_retention
+        # 所有 slot 的参数更新器共享同一个参数模板
+        self.profile = DetectorProfile.get(
+            min_uph_ratio=min_uph_ratio,
+            min_detection_ratio=min_detection_ratio,
+            min_k=min_k,
+            use_standardization=use_standardization,
+            use_arl=use_arl,
+            use_fir=use_fir,
+            fir_ratio=fir_ratio,
+            fir_duration=fir_duration,
+            use_ewma=use_ewma,
+            ewma_lambda=ewma_lambda,
+            history_retention=history_retention,
+            update_history_retention=update_history_retention
+        )
+
+        self.size = 0
+        self.capacity = 0
+        self.windows = []
+        self.baseline_updaters = []
+        self.k_updaters = []
+        self._free_slots = []
+        self._calc_scratch = CalculationResult()  # read_calculation 的复用记录
+        self._allocate(max(1, capacity))
+
+    # ------------------------------------------------------------------
+    # 存储管理
+    # ------------------------------------------------------------------
+    _FLOAT_FIELDS = (
+        "mu0", "base_uph", "base_h", "penalty_strength", "target_shift_sigma", "target_arl0",
+        "S_plus", "S_minus", "ewma_baseline", "last_h",
+        # 最近一次计算快照 (reset 前)
+        "calc_baseline", "calc_k", "calc_threshold", "calc_dev_plus", "calc_dev_minus",
+        "calc_S_plus", "calc_S_minus", "calc_std", "calc_uph_ratio",
+    )
+    _INT_FIELDS = ("samples_since_reset", "total_samples")
+    _BOOL_FIELDS = ("is_yield", "fir_active", "has_calc", "calc_skipped", "in_use")
+    _INT8_FIELDS = ("side", "calc_alert_side")
+
+    def _allocate(self, capacity):
+        """扩容所有数组 (按 2 倍增长)"""
+        def grow(name, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:len(old)] = old
+            setattr(self, name, new)
+
+        for name in self._FLOAT_FIELDS:
+            grow(name, np.float64)
+        for name in self._INT_FIELDS:
+            grow(name, np.int64)
+        for name in self._BOOL_FIELDS:
+            grow(name, np.bool_)
+        for name in self._INT8_FIELDS:
+            grow(name, np.int8)
+        self.windows.extend([None] * (capacity - self.capacity))
+        self.baseline_updaters.extend([None] * (capacity - self.capacity))
+        self.k_updaters.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def add_detector(
+            self,
+            mu0,
+            base_uph,
+            base_h=0.007,
+            penalty_strength=1.0,
+            target_shift_sigma=1.0,
+            target_arl0=250.0,
+            item_type="yield",
+            monitoring_side="upper",
+    ) -> int:
+        """注册一个检测器并返回其 slot"""
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            if self.size >= self.capacity:
+                self._allocate(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+
+        for name in self._FLOAT_FIELDS:
+            getattr(self, name)[slot] = 0.0
+        for name in self._INT_FIELDS + self._BOOL_FIELDS + self._INT8_FIELDS:
+            getattr(self, name)[slot] = 0
+
+        self.mu0[slot] = mu0
+        self.base_uph[slot] = base_uph
+        self.base_h[slot] = base_h
+        self.penalty_strength[slot] = penalty_strength
+        self.target_shift_sigma[slot] = target_shift_sigma
+        self.target_arl0[slot] = target_arl0
+        self.is_yield[slot] = item_type == "yield"
+        self.side[slot] = SIDE_CODES[monitoring_side]
+        self.ewma_baseline[slot] = mu0
+        self.in_use[slot] = True
+        self.recalculate_h(slot)
+
+        profile = self.profile
+        window = ObservationWindow(
+            window_size=profile.window_size,
+            invalid_points_around_alert=profile.invalid_points_around_alert,
+            history_retention=profile.history_retention
+        )
+        self.windows[slot] = window
+        self.baseline_updaters[slot] = AdaptiveBaseline(base_uph=base_uph, window=window, profile=profile)
+        self.k_updaters[slot] = AdaptiveKUpdater(base_uph=base_uph, window=window, profile=profile)
+        return slot
+
+    def slot_bytes(self) -> int:
+        """每个 slot 在状态数组中占用的字节数"""
+        fields = self._FLOAT_FIELDS + self._INT_FIELDS + self._BOOL_FIELDS + self._INT8_FIELDS
+        return sum(getattr(self, name).itemsize for name in fields)
+
+    def memory_usage(self, slot: int) -> Dict[str, int]:
+        """单个 slot 保留的内存 (字节, 估算; 状态数组按 slot 分摊)"""
+        usage = {
+            "detector": self.slot_bytes(),
+            "window": self.windows[slot].memory_usage(),
+            "baseline_updater": self.baseline_updaters[slot].memory_usage(),
+            "k_updater": self.k_updaters[slot].memory_usage(),
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def remove_detector(self, slot: int):
+        """释放 slot 供后续复用"""
+        if not self.in_use[slot]:
+            return
+        self.in_use[slot] = False
+        self.windows[slot] = None
+        self.baseline_updaters[slot] = None
+        self.k_updaters[slot] = None
+        self._free_slots.append(slot)
+
+    def recalculate_h(self, slot: int):
+        """与 AdaptiveCUSUMDetector._recalculate_h 一致"""
+        if self.use_arl:
+            delta = float(self.target_shift_sigma[slot])
+            if delta > 0:
+                self.base_h[slot] = (2.0 / (delta ** 2)) * np.log(float(self.target_arl0[slot]))
+            else:
+                self.base_h[slot] = 11.04 # 默认标准值
+
+    # ------------------------------------------------------------------
+    # 向量化更新
+    # ------------------------------------------------------------------
+    def update_tick(self, slots, values, uphs, timestamps) -> np.ndarray:
+        """
+        用一个 tick 的数据更新多个检测器
+
+        Args:
+            slots: 检测器 slot 数组 (同一 tick 内不能重复)
+            values: 当前值数组
+            uphs: 当前 UPH 数组
+            timestamps: 时间戳序列 (供参数更新器使用)
+
+        Returns:
+            报警结果 (bool 数组，与 slots 一一对应)
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        uphs = np.asarray(uphs, dtype=np.float64)
+        n = len(slots)
+        if n == 0:
+            return np.zeros(0, dtype=np.bool_)
+
+        self.samples_since_reset[slots] += 1
+
+        # 1. 参数更新器 (按 slot 逐个喂入数据)，收集当前 baseline / k / std
+        baseline = np.empty(n)
+        k = np.empty(n)
+        k_std = np.empty(n)
+        mu0 = self.mu0[slots]
+        for i in range(n):
+            slot = slots[i]
+            bu = self.baseline_updaters[slot]
+            ku = self.k_updaters[slot]
+            current_baseline = bu.get_current_baseline()
+            if current_baseline is None:
+                current_baseline = mu0[i]
+            self.windows[slot].add(
+                timestamps[i], values[i], uphs[i],
+                is_alert=False,
+                is_low_uph=uphs[i] < bu.base_uph * bu.min_detection_ratio
+            )
+            bu.add_data_point(
+                timestamp=timestamps[i],
+                defect_rate=values[i],
+                is_alert=False,
+                current_uph=uphs[i],
+                current_baseline=current_baseline
+            )
+            ku.add_data_point(
+                timestamp=timestamps[i],
+                defect_rate=values[i],
+                is_alert=False,
+                current_uph=uphs[i],
+                current_baseline=current_baseline
+            )
+            b = bu.get_current_baseline()
+            baseline[i] = mu0[i] if b is None else b
+            kv = ku.get_current_k()
+            k[i] = self.min_k if kv is None else kv
+            sv = ku.get_current_std()
+            k_std[i] = 0.0 if sv is None else sv
+
+        if self.use_ewma:
+            ewma = self.ewma_lambda * values + (1 - self.ewma_lambda) * self.ewma_baseline[slots]
+            self.ewma_baseline[slots] = ewma
+            baseline = ewma
+
+        # 2. UPH 太低的点跳过检测
+        base_uph = self.base_uph[slots]
+        uph_ratio = uphs / base_uph
+        skip = uph_ratio < self.min_detection_ratio
+        active = ~skip
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # 3. 标准差
+            is_yield = self.is_yield[slots]
+            yield_ok = (baseline > 0) & (baseline < 1)
+            p_var = baseline * (1 - baseline)
+            std_baseline_y = np.where(yield_ok, np.sqrt(p_var / base_uph), 0.0)
+            std_current_y = np.where(yield_ok, np.sqrt(p_var / uphs), 0.0)
+
+            sigma = np.where(k_std > 0, k_std, 3.0) # 默认兜底 (保守策略)
+            std_baseline_p = sigma / np.sqrt(np.maximum(1, base_uph))
+            std_current_p = sigma / np.sqrt(np.maximum(1, uphs))
+
+            std_baseline = np.where(is_yield, std_baseline_y, std_baseline_p)
+            std_current = np.where(is_yield, std_current_y, std_current_p)
+
+            # 4. 阈值倍数与惩罚
+            penalty_mask = uph_ratio < self.min_uph_ratio
+            extra_penalty = np.where(penalty_mask, (self.min_uph_ratio / uph_ratio - 1) ** 0.5, 0.0)
+            penalty = np.where(penalty_mask, 1 + extra_penalty * self.penalty_strength[slots], 1.0)
+
+            side = self.side[slots]
+            upper = (side & SIDE_UPPER) != 0
+            lower = (side & SIDE_LOWER) != 0
+            S_plus = self.S_plus[slots]
+            S_minus = self.S_minus[slots]
+            base_h = self.base_h[slots]
+
+            if self.use_standardization:
+                threshold_multiplier = np.where(std_baseline == 0, 1.0, std_current / std_baseline) * penalty
+                x_standardized = (values - baseline) / std_current
+                k_standardized = k / std_current
+                if self.use_arl:
+                    h = base_h * threshold_multiplier
+                else:
+                    h = base_h * threshold_multiplier / std_current
+                h_limit = h * std_current
+
+                dev_plus = np.where(upper, x_standardized - k_standardized, 0.0)
+                dev_minus = np.where(lower, (-x_standardized) - k_standardized, 0.0)
+                new_plus = S_plus + dev_plus
+                new_minus = S_minus + dev_minus
+            else:
+                threshold_multiplier = np.where(uph_ratio >= 1, 1.0, np.sqrt(base_uph / uphs)) * penalty
+                deviation = values - baseline
+                h = base_h * threshold_multiplier
+                h_limit = h
+
+                dev_plus = np.zeros(n)
+                dev_minus = np.zeros(n)
+                new_plus = S_plus + (deviation - k)
+                new_minus = S_minus + ((-deviation) - k)
+
+            # max(0, S) —— 与标量实现一致 (NaN 归零)
+            S_plus = np.where(active & upper, np.where(new_plus > 0, new_plus, 0.0), S_plus)
+            S_minus = np.where(active & lower, np.where(new_minus > 0, new_minus, 0.0), S_minus)
+
+            alert_plus = active & upper & (S_plus >= h)
+            alert_minus = active & lower & (S_minus >= h)
+            alerts = alert_plus | alert_minus
+
+            dev_plus_record = dev_plus * std_current
+            dev_minus_record = dev_minus * std_current
+
+        # 5. 写回状态
+        active_slots = slots[active]
+        self.total_samples[active_slots] += 1
+        self.S_plus[slots] = S_plus
+        self.S_minus[slots] = S_minus
+        self.last_h[active_slots] = h_limit[active]
+
+        # FIR 停用
+        fir_expired = self.fir_active[slots] & (self.samples_since_reset[slots] > self.fir_duration)
+        self.fir_active[slots[fir_expired & active]] = False
+
+        # 计算快照 (reset 前)
+        self.has_calc[slots] = True
+        self.calc_skipped[slots] = skip
+        self.calc_baseline[slots] = baseline
+        self.calc_k[slots] = k
+        self.calc_threshold[slots] = np.where(active, h, 0.0)
+        self.calc_dev_plus[slots] = np.where(active, dev_plus_record, 0.0)
+        self.calc_dev_minus[slots] = np.where(active, dev_minus_record, 0.0)
+        self.calc_S_plus[slots] = S_plus
+        self.calc_S_minus[slots] = S_minus
+        self.calc_std[slots] = np.where(active, std_current, 0.0)
+        self.calc_uph_ratio[slots] = uph_ratio
+        self.calc_alert_side[slots] = np.where(alert_plus, SIDE_UPPER, np.where(alert_minus, SIDE_LOWER, 0))
+
+        # 6. 报警后重置累积和
+        alert_slots = slots[alerts]
+        if len(alert_slots):
+            if self.use_fir:
+                alert_side = self.side[alert_slots]
+                start_val = self.base_h[alert_slots] * self.fir_ratio
+                self.S_plus[alert_slots] = np.where(alert_side & SIDE_UPPER, start_val, 0.0)
+                self.S_minus[alert_slots] = np.where(alert_side & SIDE_LOWER, start_val, 0.0)
+                self.fir_active[alert_slots] = True
+            else:
+                self.S_plus[alert_slots] = 0.0
+                self.S_minus[alert_slots] = 0.0
+                self.fir_active[alert_slots] = False
+            self.samples_since_reset[alert_slots] = 0
+
+        return alerts
+
+    # ------------------------------------------------------------------
+    # 状态查询
+    # ------------------------------------------------------------------
+    def read_calculation(self, slot: int, out: Optional[CalculationResult] = None) -> CalculationResult:
+        """把 slot 的最近一次计算快照写入 out (默认写入 bank 共享的临时记录，避免每次分配)"""
+        if out is None:
+            out = self._calc_scratch
+        if not self.has_calc[slot]:
+            out.valid = False
+            return out
+        if self.calc_skipped[slot]:
+            out.set_skipped(float(self.calc_baseline[slot]), float(self.calc_k[slot]))
+            return out
+        out.valid = True
+        out.skipped = False
+        out.baseline = float(self.calc_baseline[slot])
+        out.k = float(self.calc_k[slot])
+        out.threshold = float(self.calc_threshold[slot])
+        out.deviation_plus = float(self.calc_dev_plus[slot])
+        out.deviation_minus = float(self.calc_dev_minus[slot])
+        out.S_plus = float(self.calc_S_plus[slot])
+        out.S_minus = float(self.calc_S_minus[slot])
+        out.std = float(self.calc_std[slot])
+        out.uph_ratio = float(self.calc_uph_ratio[slot])
+        out.alert_side = SIDE_NAMES.get(int(self.calc_alert_side[slot]))
+        return out
+
+    def last_calculation(self, slot: int) -> Optional[Dict]:
+        """与 AdaptiveCUSUMDetector.last_calculation 结构一致"""
+        return self.read_calculation(slot).to_dict()
+
+    def get_current_status(self, slot: int) -> Dict:
+        """与 AdaptiveCUSUMDetector.get_current_status 结构一致"""
+        calc = self.read_calculation(slot)
+        if calc.valid:
+            return {
+                "baseline": calc.baseline,
+                "S_plus": calc.S_plus,
+                "S_minus": calc.S_minus,
+                "h_value": calc.threshold,
+                "k_value": calc.k,
+                "calculation_details": calc.to_dict(),
+                "total_samples": int(self.total_samples[slot]),
+                "fir_active": bool(self.fir_active[slot])
+            }
+        return {
+            "baseline": self.baseline_updaters[slot].get_current_baseline() or float(self.mu0[slot]),
+            "S_plus": float(self.S_plus[slot]),
+            "S_minus": float(self.S_minus[slot]),
+            "h_value": float(self.last_h[slot]) if self.total_samples[slot] else float(self.base_h[slot]),
+            "k_value": self.k_updaters[slot].get_current_k() or self.min_k,
+            "calculation_details": {},
+            "total_samples": int(self.total_samples[slot]),
+            "fir_active": bool(self.fir_active[slot])
+        }
+
+    def get_state(self, slot: int) -> Dict:
+        calc = self.read_calculation(slot)
+        if calc.valid:
+            baseline, k_value, std = calc.baseline, calc.k, calc.std
+        else:
+            baseline = self.baseline_updaters[slot].get_current_baseline() or float(self.mu0[slot])
+            k_value = self.k_updaters[slot].get_current_k() or self.min_k
+            std = self.k_updaters[slot].get_current_std() or 0.0
+        return {
+            "baseline": baseline,
+            "std": std,
+            "k_value": k_value,
+            "s_plus": float(self.S_plus[slot]),
+            "s_minus": float(self.S_minus[slot]),
+            "snapshot": self.get_snapshot(slot)
+        }
+
+    def capture_snapshot(self, slot: int) -> DetectorSnapshot:
+        """与 AdaptiveCUSUMDetector.capture_snapshot 格式一致 (两种引擎模式的快照可互相恢复)"""
+        total_samples = int(self.total_samples[slot])
+        core = (float(self.S_plus[slot]), float(self.S_minus[slot]), float(self.ewma_baseline[slot]),
+                int(self.samples_since_reset[slot]), total_samples, bool(self.fir_active[slot]),
+                float(self.last_h[slot]) if total_samples else float("nan"))
+        return capture_snapshot(core, self.read_calculation(slot), self.windows[slot],
+                                self.baseline_updaters[slot], self.k_updaters[slot])
+
+    def get_snapshot(self, slot: int) -> bytes:
+        return encode_snapshot(self.capture_snapshot(slot))
+
+    def restore_snapshot(self, slot: int, blob: bytes):
+        self.apply_snapshot(slot, unpack_snapshot(blob))
+
+    def apply_snapshot(self, slot: int, snapshot: DetectorSnapshot):
+        restore_learning(snapshot, self.windows[slot], self.baseline_updaters[slot], self.k_updaters[slot])
+        (self.S_plus[slot], self.S_minus[slot], self.ewma_baseline[slot], self.samples_since_reset[slot],
+         self.total_samples[slot], self.fir_active[slot], last_h) = snapshot.core
+        self.last_h[slot] = last_h if last_h == last_h else 0.0
+        (self.has_calc[slot], self.calc_skipped[slot], self.calc_baseline[slot], self.calc_k[slot],
+         self.calc_threshold[slot], self.calc_dev_plus[slot], self.calc_dev_minus[slot], self.calc_S_plus[slot],
+         self.calc_S_minus[slot], self.calc_std[slot], self.calc_uph_ratio[slot], self.calc_alert_side[slot]) = snapshot.calc
+
+
+def _slot_property(field, cast=float):
+    def getter(self):
+        return cast(getattr(self.bank, field)[self.slot])
+
+    def setter(self, value):
+        getattr(self.bank, field)[self.slot] = value
+
+    return property(getter, setter)
+
+
+class BankDetector:
+    """
+    DetectorBank 中单个 slot 的视图
+    提供与 AdaptiveCUSUMDetector 相同的接口，供 manager / API 透明使用
+    """
+
+    __slots__ = ("bank", "slot")
+
+    def __init__(self, bank: DetectorBank, slot: int):
+        self.bank = bank
+        self.slot = slot
+
+    mu0 = _slot_property("mu0")
+    base_uph = _slot_property("base_uph")
+    base_h = _slot_property("base_h")
+    penalty_strength = _slot_property("penalty_strength")
+    S_plus = _slot_property("S_plus")
+    S_minus = _slot_property("S_minus")
+    ewma_baseline = _slot_property("ewma_baseline")
+    samples_since_reset = _slot_property("samples_since_reset", int)
+    total_samples = _slot_property("total_samples", int)
+    fir_active = _slot_property("fir_active", bool)
+
+    @property
+    def target_shift_sigma(self):
+        return float(self.bank.target_shift_sigma[self.slot])
+
+    @target_shift_sigma.setter
+    def target_shift_sigma(self, value):
+        self.bank.target_shift_sigma[self.slot] = value
+        self.bank.recalculate_h(self.slot)
+
+    @property
+    def target_arl0(self):
+        return float(self.bank.target_arl0[self.slot])
+
+    @target_arl0.setter
+    def target_arl0(self, value):
+        self.bank.target_arl0[self.slot] = value
+        self.bank.recalculate_h(self.slot)
+
+    @property
+    def item_type(self):
+        return "yield" if self.bank.is_yield[self.slot] else "parameter"
+
+    @property
+    def monitoring_side(self):
+        return SIDE_NAMES[int(self.bank.side[self.slot])]
+
+    @monitoring_side.setter
+    def monitoring_side(self, value):
+        self.bank.side[self.slot] = SIDE_CODES[value]
+
+    @property
+    def baseline_updater(self):
+        return self.bank.baseline_updaters[self.slot]
+
+    @property
+    def k_updater(self):
+        return self.bank.k_updaters[self.slot]
+
+    @property
+    def calc(self):
+        """最近一次计算快照 (bank 共享的复用记录，读取后应立即使用)"""
+        return self.bank.read_calculation(self.slot)
+
+    @property
+    def last_calculation(self):
+        return self.bank.last_calculation(self.slot)
+
+    def update(self, x, current_uph=None, timestamp=None, line_state=None):
+        """单条更新 (等价于只含一个 slot 的 tick)"""
+        alerts = self.bank.update_tick([self.slot], [x], [current_uph], [timestamp])
+        return bool(alerts[0])
+
+    def get_current_status(self):
+        return self.bank.get_current_status(self.slot)
+
+    def get_state(self) -> Dict:
+        """导出需要持久化的状态 (与 AdaptiveCUSUMDetector.get_state 一致)"""
+        return self.bank.get_state(self.slot)
+
+    def capture_snapshot(self) -> DetectorSnapshot:
+        return self.bank.capture_snapshot(self.slot)
+
+    def apply_snapshot(self, snapshot: DetectorSnapshot):
+        self.bank.apply_snapshot(self.slot, snapshot)
+
+    def memory_usage(self) -> Dict[str, int]:
+        usage = self.bank.memory_usage(self.slot)
+        usage["detector"] += sys.getsizeof(self)
+        usage["total"] = sum(v for k, v in usage.items() if k != "total")
+        return usage
+
+    def set_state(self, state: Dict):
+        """从持久化恢复状态 (有完整快照时逐位恢复，否则只恢复累积和与基准值)"""
+        if not state:
+            return
+        if state.get("snapshot"):
+            try:
+                self.bank.restore_snapshot(self.slot, state["snapshot"])
+                return
+            except Exception as e:
+                print(f"[WARN] Snapshot restore failed, falling back to summary state: {e}")
+        self.S_plus = state.get("s_plus", 0.0)
+        self.S_minus = state.get("s_minus", 0.0)
+        if "baseline" in state:
+            self.mu0 = state["baseline"]
+            self.ewma_baseline = state["baseline"]
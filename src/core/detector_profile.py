@@ -0,0 +1,101 @@
+# detector_profile.py
+from .observation_window import DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION
+
+
+class DetectorProfile:
+    """
+    检测器参数模板 (Profile)
+
+    同一套配置下所有检测器都相同的构造常量 (算法开关、窗口参数、历史保留条数等)
+    只保存一份，检测器与参数更新器通过 profile 引用读取，不再每个实例各存一份。
+
+    相同参数的 profile 通过 DetectorProfile.get() 复用同一个对象；
+    单个检测器修改其中某个参数时会换成新的 profile (copy-on-write)，不影响其他检测器。
+    """
+
+    __slots__ = (
+        # 检测器
+        "min_uph_ratio", "min_detection_ratio", "min_k",
+        "use_standardization", "use_arl",
+        "use_fir", "fir_ratio", "fir_duration",
+        "use_ewma", "ewma_lambda",
+        # 参数更新器 / 观测窗口
+        "window_size", "update_interval", "max_change_ratio", "invalid_points_around_alert",
+        "history_retention", "update_history_retention",
+    )
+
+    _registry = {}
+
+    def __init__(
+            self,
+            min_uph_ratio=0.5,
+            min_detection_ratio=0.15,
+            min_k=0.001,
+            use_standardization=True,
+            use_arl=True,
+            use_fir=False,
+            fir_ratio=0.004,
+            fir_duration=700,
+            use_ewma=False,
+            ewma_lambda=0.2,
+            window_size=700,
+            update_interval=24,
+            max_change_ratio=0.1,
+            invalid_points_around_alert=10,
+            history_retention=DEFAULT_HISTORY_RETENTION,
+            update_history_retention=DEFAULT_UPDATE_HISTORY_RETENTION,
+    ):
+        self.min_uph_ratio = min_uph_ratio
+        self.min_detection_ratio = min_detection_ratio
+        self.min_k = min_k
+        self.use_standardization = use_standardization
+        self.use_arl = use_arl
+        self.use_fir = use_fir
+        self.fir_ratio = fir_ratio
+        self.fir_duration = fir_duration
+        self.use_ewma = use_ewma
+        self.ewma_lambda = ewma_lambda
+        self.window_size = window_size
+        self.update_interval = update_interval
+        self.max_change_ratio = max_change_ratio
+        self.invalid_points_around_alert = invalid_points_around_alert
+        self.history_retention = history_retention
+        self.update_history_retention = update_history_retention
+
+    @classmethod
+    def get(cls, **params) -> "DetectorProfile":
+        """获取 (或创建) 指定参数的共享 profile"""
+        profile = cls(**params)
+        key = profile.as_tuple()
+        shared = cls._registry.get(key)
+        if shared is None:
+            shared = cls._registry[key] = profile
+        return shared
+
+    def as_tuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes) -> "DetectorProfile":
+        """返回修改了部分参数的共享 profile (自身不变)"""
+        params = self.as_dict()
+        params.update(changes)
+        return self.get(**params)
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items())
+        return f"DetectorProfile({params})"
+
+
+def profile_property(name):
+    """把实例属性代理到 self.profile (写入时 copy-on-write，只影响当前实例)"""
+    def getter(self):
+        return getattr(self.profile, name)
+
+    def setter(self, value):
+        if getattr(self.profile, name) != value:
+            self.profile = self.profile.replace(**{name: value})
+
+    return property(getter, setter)
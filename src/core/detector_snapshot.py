@@ -0,0 +1,257 @@
+# detector_snapshot.py
+"""
+检测器完整快照
+
+ItemState 的 baseline / std / k / S 只够冷启动；快照额外保存学习状态，恢复后检测结果与未重启的检测器逐位一致:
+- 观测窗口: 按时间顺序的数据数组、异常 / 极低UPH标志、两类无效邻域覆盖计数、两份增量统计量、写入计数
+- 基准 / K 值更新器: 当前值、上次更新时间、最近一次 K 值更新记录 (提供 std)
+- CUSUM: S_plus / S_minus、EWMA 基准、FIR 计数器、最近一次阈值与计算快照
+
+不保存的只用于诊断展示的历史: 完整数据缓冲 (data_buffer)、异常 / 低UPH写入序号集合、更早的更新记录与 h 历史。
+
+标量部分是一条定长记录 (HEAD_DTYPE)，窗口数组按时间顺序导出，两种存储形式共用:
+- 二进制 BLOB (ItemState.snapshot): 头部 | 定长记录 | 窗口数据 (float64) | zlib(标志与覆盖计数)
+- 状态文件 (state_file): 定长记录数组 + 每个窗口数组一个二维定长数组，可直接 mmap
+时间戳编码为 (是否存在, 本地时间微秒数, UTC 偏移秒数 / 无时区标记)，保留时区信息。
+"""
+import zlib
+import struct
+import collections
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional, Tuple
+from .observation_window import EMPTY_HISTORY
+from .k_updater import KValueUpdate
+
+SNAPSHOT_MAGIC = b"DS"
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct("<2sBII")  # magic, version, window_size, invalid_points_around_alert
+
+
+def _ts_fields(prefix):
+    return [(f"{prefix}_present", "?"), (f"{prefix}_micros", "<i8"), (f"{prefix}_offset", "<i4")]
+
+
+# 快照的标量部分 (小端、无对齐填充)
+HEAD_DTYPE = np.dtype(
+    # CUSUM 状态
+    [("S_plus", "<f8"), ("S_minus", "<f8"), ("ewma_baseline", "<f8"), ("samples_since_reset", "<i8"),
+     ("total_samples", "<i8"), ("fir_active", "?"), ("last_h", "<f8")]
+    # 计算快照 (CalculationResult)
+    + [("calc_valid", "?"), ("calc_skipped", "?")]
+    + [(f"calc_{name}", "<f8") for name in (
+        "baseline", "k", "threshold", "deviation_plus", "deviation_minus", "S_plus", "S_minus", "std", "uph_ratio")]
+    + [("calc_alert_side", "i1")]
+    # 基准 / K 值更新器
+    + [("has_baseline", "?"), ("current_baseline", "<f8"), ("current_k", "<f8")]
+    + _ts_fields("baseline_update_time") + _ts_fields("k_update_time")
+    + [("has_k_update", "?")] + _ts_fields("k_update_timestamp")
+    + [("k_update_old", "<f8"), ("k_update_new", "<f8"), ("k_update_limited", "?"),
+       ("k_update_valid_points", "<i8"), ("k_update_window_points", "<i8"), ("k_update_std", "<f8")]
+    # 观测窗口
+    + [("count", "<i8"), ("total_pushed", "<i8"), ("last_source_seq", "<i8"), ("data_seq", "<i8")]
+    + [(f"{stats}_{name}", dtype) for stats in ("baseline_stats", "k_stats")
+       for name, dtype in (("shift", "<f8"), ("count", "<i8"), ("sum", "<f8"), ("sumsq", "<f8"))]
+    + _ts_fields("last_timestamp")
+)
+# 窗口数组 (values / flags / alert_coverage / low_uph_coverage) 的存储类型，与 ObservationWindow._allocate 一致
+ARRAY_DTYPES = (np.dtype("<f8"), np.dtype("u1"), np.dtype("<i2"), np.dtype("<i2"))
+
+_NAIVE = -(2 ** 31)
+_EPOCH = datetime(1970, 1, 1)
+_SIDES = {None: 0, "upper": 1, "lower": 2}
+_SIDE_NAMES = {v: k for k, v in _SIDES.items()}
+
+
+class DetectorSnapshot(NamedTuple):
+    """
+    快照的内存形式
+    core: (S_plus, S_minus, ewma_baseline, samples_since_reset, total_samples, fir_active, last_h)，无阈值时 last_h 为 NaN
+    calc: CalculationResult 各字段 (alert_side 为编码值)
+    window_scalars: (count, total_pushed, last_source_seq, data_seq, 两份 WindowStats 的 shift / count / sum / sumsq)
+    arrays: 按时间顺序的 values / flags / alert_coverage / low_uph_coverage (至少 count 个)
+    """
+    window_params: Tuple[int, int]
+    core: Tuple
+    calc: Tuple
+    current_baseline: Optional[float]
+    baseline_update_time: Optional[datetime]
+    current_k: float
+    k_update_time: Optional[datetime]
+    k_update: Optional[KValueUpdate]
+    window_scalars: Tuple
+    last_timestamp: Optional[datetime]
+    arrays: Tuple
+
+
+def _encode_ts(ts) -> Tuple:
+    if ts is None:
+        return (False, 0, 0)
+    offset = ts.utcoffset()
+    local = ts.replace(tzinfo=None) - _EPOCH
+    micros = (local.days * 86400 + local.seconds) * 1_000_000 + local.microseconds
+    return (True, micros, _NAIVE if offset is None else int(offset.total_seconds()))
+
+
+def _decode_ts(present: bool, micros: int, offset: int) -> Optional[datetime]:
+    if not present:
+        return None
+    ts = _EPOCH + timedelta(microseconds=micros)
+    if offset != _NAIVE:
+        ts = ts.replace(tzinfo=timezone(timedelta(seconds=offset)))
+    return ts
+
+
+def _ordered(window, array) -> np.ndarray:
+    """按时间顺序导出窗口数组 (环形缓冲最多两段，直接切片)"""
+    start, count = window.start, window.count
+    end = start + count
+    if end <= window.window_size:
+        return array[start:end]
+    return np.concatenate((array[start:], array[:end - window.window_size]))
+
+
+def capture_snapshot(core: Tuple, calc, window, baseline_updater, k_updater) -> DetectorSnapshot:
+    """采集检测器快照 (calc: CalculationResult；窗口数组可能是视图，调用方应在检测器再次更新前编码)"""
+    arrays = ()
+    if window.count:
+        arrays = tuple(
+            _ordered(window, array)
+            for array in (window.values, window.flags, window.alert_coverage, window.low_uph_coverage)
+        )
+    bs, ks = window.baseline_stats, window.k_stats
+    return DetectorSnapshot(
+        (window.window_size, window.invalid_points_around_alert),
+        core,
+        (calc.valid, calc.skipped, calc.baseline, calc.k, calc.threshold, calc.deviation_plus,
+         calc.deviation_minus, calc.S_plus, calc.S_minus, calc.std, calc.uph_ratio, _SIDES[calc.alert_side]),
+        baseline_updater.current_baseline,
+        baseline_updater.last_update_time,
+        k_updater.current_k,
+        k_updater.last_update_time,
+        k_updater.update_history[-1] if k_updater.update_history else None,
+        (window.count, window.total_pushed, window._last_source_seq, window.data_seq,
+         bs.shift, bs.count, bs.sum, bs.sumsq, ks.shift, ks.count, ks.sum, ks.sumsq),
+        window.last_timestamp,
+        arrays
+    )
+
+
+def snapshot_head(snapshot: DetectorSnapshot) -> Tuple:
+    """快照标量部分 (与 HEAD_DTYPE 字段顺序一致)"""
+    k_update = snapshot.k_update
+    if k_update is None:
+        k_fields = (False, False, 0, 0, 0.0, 0.0, False, 0, 0, 0.0)
+    else:
+        k_fields = (True,) + _encode_ts(k_update.timestamp) + (
+            k_update.old_value, k_update.new_value, k_update.is_limited,
+            k_update.valid_points, k_update.window_points, k_update.std
+        )
+    return (
+        snapshot.core + snapshot.calc
+        + (snapshot.current_baseline is not None, snapshot.current_baseline or 0.0, snapshot.current_k)
+        + _encode_ts(snapshot.baseline_update_time) + _encode_ts(snapshot.k_update_time)
+        + k_fields + snapshot.window_scalars + _encode_ts(snapshot.last_timestamp)
+    )
+
+
+def snapshot_from_head(head: Tuple, arrays: Tuple, window_params: Tuple[int, int]) -> DetectorSnapshot:
+    """由标量部分 (Python 值元组，如 np.void.item()) 与窗口数组还原快照"""
+    has_baseline, current_baseline, current_k = head[19:22]
+    k_update = None
+    if head[28]:
+        k_update = KValueUpdate(_decode_ts(*head[29:32]), *head[32:38])
+    return DetectorSnapshot(
+        tuple(window_params), head[:7], head[7:19], current_baseline if has_baseline else None,
+        _decode_ts(*head[22:25]), current_k, _decode_ts(*head[25:28]), k_update,
+        head[38:50], _decode_ts(*head[50:53]), arrays
+    )
+
+
+def encode_snapshot(snapshot: DetectorSnapshot) -> bytes:
+    """编码为 BLOB (数据原样保存，浮点数几乎不可压缩；标志 / 覆盖计数绝大部分为 0，压缩后只占几十字节)"""
+    parts = [
+        _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, *snapshot.window_params),
+        np.array([snapshot_head(snapshot)], dtype=HEAD_DTYPE).tobytes(),
+    ]
+    if snapshot.arrays:
+        parts.append(snapshot.arrays[0].tobytes())
+        parts.append(zlib.compress(b"".join(array.tobytes() for array in snapshot.arrays[1:]), 1))
+    return b"".join(parts)
+
+
+def pack_snapshot(core: Tuple, calc, window, baseline_updater, k_updater) -> bytes:
+    return encode_snapshot(capture_snapshot(core, calc, window, baseline_updater, k_updater))
+
+
+def unpack_snapshot(blob: bytes) -> DetectorSnapshot:
+    """解码 BLOB (格式版本不一致时抛出 ValueError，调用方回退为旧版状态恢复)"""
+    buf = memoryview(blob)
+    magic, version, window_size, radius = _HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {bytes(magic)!r} v{version}")
+    pos = _HEADER.size
+    head = np.frombuffer(buf, dtype=HEAD_DTYPE, count=1, offset=pos)[0].item()
+    pos += HEAD_DTYPE.itemsize
+
+    count = head[38]
+    arrays = ()
+    if count:
+        decoded = [np.frombuffer(buf, dtype=ARRAY_DTYPES[0], count=count, offset=pos)]
+        masks = zlib.decompress(buf[pos + count * ARRAY_DTYPES[0].itemsize:])
+        offset = 0
+        for dtype in ARRAY_DTYPES[1:]:
+            decoded.append(np.frombuffer(masks, dtype=dtype, count=count, offset=offset))
+            offset += count * dtype.itemsize
+        arrays = tuple(decoded)
+    return snapshot_from_head(head, arrays, (window_size, radius))
+
+
+def restore_calculation(calc, fields: Tuple):
+    """把快照中的计算字段写回 CalculationResult"""
+    (calc.valid, calc.skipped, calc.baseline, calc.k, calc.threshold, calc.deviation_plus,
+     calc.deviation_minus, calc.S_plus, calc.S_minus, calc.std, calc.uph_ratio, side) = fields
+    calc.alert_side = _SIDE_NAMES[side]
+
+
+def restore_learning(snapshot: DetectorSnapshot, window, baseline_updater, k_updater):
+    """
+    把快照中的窗口与更新器状态写回 (窗口按时间顺序重排到物理位置 0 开始，逻辑状态不变)
+    窗口参数与检测器不一致时抛出 ValueError (此时检测器尚未被修改)
+    """
+    if snapshot.window_params != (window.window_size, window.invalid_points_around_alert):
+        raise ValueError(f"Snapshot window {snapshot.window_params} does not match detector profile")
+    (count, total_pushed, last_source_seq, data_seq,
+     b_shift, b_count, b_sum, b_sumsq, k_shift, k_count, k_sum, k_sumsq) = snapshot.window_scalars
+
+    if total_pushed:
+        window._allocate()
+        for target, source in zip(
+            (window.values, window.flags, window.alert_coverage, window.low_uph_coverage), snapshot.arrays
+        ):
+            target[:count] = source[:count]
+    window.start = 0
+    window.count = count
+    window.total_pushed = total_pushed
+    window._last_source_seq = last_source_seq
+    window.data_seq = data_seq
+    window.last_timestamp = snapshot.last_timestamp
+    bs, ks = window.baseline_stats, window.k_stats
+    bs.shift, bs.count, bs.sum, bs.sumsq = b_shift, b_count, b_sum, b_sumsq
+    ks.shift, ks.count, ks.sum, ks.sumsq = k_shift, k_count, k_sum, k_sumsq
+
+    baseline_updater.current_baseline = snapshot.current_baseline
+    baseline_updater.last_update_time = snapshot.baseline_update_time
+    k_updater.current_k = snapshot.current_k
+    k_updater.last_update_time = snapshot.k_update_time
+    k_updater.update_history = [snapshot.k_update] if snapshot.k_update is not None else []
+
+
+def restore_h_history(last_h: float, total_samples: int, retention: int):
+    """标量检测器的 h 历史只恢复最近一个阈值 (get_current_status 使用)"""
+    if not total_samples or last_h != last_h:
+        return EMPTY_HISTORY
+    history = collections.deque(maxlen=retention)
+    history.append(last_h)
+    return history
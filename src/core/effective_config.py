@@ -0,0 +1,120 @@
+import threading
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+def generate_detector_key(item_name: str, metadata: Dict) -> str:
+    """
+    生成唯一检测键值
+    Format: Product::Line::Station::ItemName
+    如果 Metadata 缺失，则降级为只使用 ItemName (兼容旧行为，但建议都带上)
+    """
+    if not metadata:
+        return item_name
+
+    product = str(metadata.get("product", "UnknownProduct")).lower()
+    line = str(metadata.get("line", "UnknownLine")).lower()
+    station = str(metadata.get("station", "UnknownStation")).lower()
+
+    # 使用双冒号作为分隔符，避免与常规名称冲突
+    return f"{product}::{line}::{station}::{item_name}"
+
+
+class EffectiveConfig(NamedTuple):
+    """
+    检测键解析后的生效配置 (不可变)
+    由检测项配置 / 全局默认值合并而来，检测器创建与报警抑制直接读取字段，不再逐条拼接配置键
+    """
+    unique_key: str
+    mu0: float
+    base_uph: float
+    penalty_strength: float
+    monitoring_side: Optional[str]
+    cooldown_periods: int
+
+
+def effective_config(unique_key: str, item_name: str, item_config: Optional[Dict], global_config: Dict[str, Any]) -> EffectiveConfig:
+    """
+    合并规则:
+    - 有检测项配置时使用其 mu0 / base_uph / penalty_strength / monitoring_side
+    - 否则回退到全局配置中的 mu0_{item} / base_uph_{item} / penalty_strength_{item} (注册接口写入)
+    - 报警抑制周期取全局配置中的 cooldown_periods_{item} (默认 6)
+    """
+    if item_config:
+        mu0 = item_config.get("mu0", 0.0005)
+        base_uph = item_config.get("base_uph", 500)
+        penalty_strength = item_config.get("penalty_strength", 1.0)
+        monitoring_side = item_config.get("monitoring_side")
+    else:
+        # Fallback (Legacy) - 注意：这里仍然使用原始 item_name 查找配置，
+        # 因为配置通常是针对"检测项"本身的，而不是针对"特定产线的检测项"。
+        mu0 = global_config.get(f"mu0_{item_name}", 0.0005)
+        base_uph = global_config.get(f"base_uph_{item_name}", 500)
+        penalty_strength = global_config.get(f"penalty_strength_{item_name}", 1.0)
+        monitoring_side = None
+    cooldown_periods = global_config.get(f"cooldown_periods_{item_name}", 6)
+    return EffectiveConfig(unique_key, mu0, base_uph, penalty_strength, monitoring_side, cooldown_periods)
+
+
+class ConfigResolver:
+    """
+    检测键 -> 生效配置 的解析缓存
+
+    - 按 (item_name, 检测键) 缓存，检测键与 generate_detector_key 相同 (元数据先经过同样的 str().lower() 归一化，
+      1 / 1.0 / True、None / 缺失对应不同的检测键，不会共用缓存)；命中时不做配置查询
+    - 未配置的检测键同样缓存 (负缓存，结果为默认值)
+    - 配置被修改 / 删除 / 导入时由接口层调用 invalidate(config_key)；全局配置变化时调用 invalidate_all()
+    - lookup: 按配置键查询检测项配置 (如 ConfigStore.get_item_config)，查不到时返回空字典
+    """
+
+    def __init__(self, lookup: Callable[[str], Dict], global_config: Dict[str, Any], max_entries: int = 2_000_000):
+        self.lookup = lookup
+        self.global_config = global_config
+        self.max_entries = max_entries
+        self._cache: Dict[Tuple, EffectiveConfig] = {}
+        # item_name -> 该检测项的缓存键集合 (按检测项失效)
+        self._by_item: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, item_name: str, metadata: Optional[Dict]) -> EffectiveConfig:
+        unique_key = generate_detector_key(item_name, metadata)
+        key = (item_name, unique_key)
+        config = self._cache.get(key)
+        if config is not None:
+            self.hits += 1
+            return config
+
+        self.misses += 1
+        generation = self._generation
+        # 1. 复合键配置 2. 检测项名配置 3. 全局默认值
+        item_config = self.lookup(unique_key) or self.lookup(item_name)
+        config = effective_config(unique_key, item_name, item_config, self.global_config)
+        with self._lock:
+            # 解析期间发生过失效则不写入缓存，避免保存过期配置
+            if generation == self._generation:
+                if len(self._cache) >= self.max_entries:
+                    self._cache.clear()
+                    self._by_item.clear()
+                self._cache[key] = config
+                self._by_item.setdefault(item_name, set()).add(key)
+        return config
+
+    def invalidate(self, config_key: str):
+        """配置键 (复合键或检测项名) 变化时，清除该检测项的全部缓存"""
+        names = {config_key, config_key.split("::", 3)[-1]}
+        with self._lock:
+            self._generation += 1
+            for name in names:
+                for key in self._by_item.pop(name, ()):
+                    self._cache.pop(key, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._by_item.clear()
+
+    def get_metrics(self) -> Dict:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,290 @@
+# ingest_log.py
+"""
+接入数据预写日志 (Write-Ahead Log)
+
+两次检查点之间检测器的状态只在内存中，进程崩溃会丢失这段时间的学习结果。
+每批接入数据在检测之前先追加到本地日志，重启时把最后一次检查点之后的日志重放给检测器。
+
+- 每条数据分配一个单调递增的序号 (LSN)，同一批数据作为一帧写入:
+      [payload 长度 u32][crc32 u32][首条 LSN u64][条数 u32] + JSON payload
+- 日志按段轮转 (文件名为该段首条 LSN)，检查点推进后删除已完全持久化的旧段
+- 组提交 (group commit): 追加只写入 OS 缓冲区，sync(lsn) 等待落盘；
+  同时等待的多个批次由一次 fsync 一起完成
+- 打开时校验最后一个段，截掉崩溃时写了一半的帧
+"""
+import os
+import json
+import zlib
+import struct
+import threading
+import time
+import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+from .effective_config import EffectiveConfig
+
+_FRAME = struct.Struct("<IIQI")
+SEGMENT_SUFFIX = ".wal"
+# 单个段的大小上限 (字节)，超过后在下一次追加时轮转
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+SYNC_MODES = ("fsync", "write")
+
+
+def _json_default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if hasattr(obj, "item"):  # numpy 标量
+        return obj.item()
+    return str(obj)
+
+
+def encode_reading(reading: Dict) -> List:
+    """接入数据 -> 日志记录 (生效配置按字段顺序保存，重放时不依赖当时的配置存储)"""
+    timestamp = reading.get("timestamp")
+    config = reading.get("item_config")
+    return [
+        reading["item_name"], reading["item_type"], reading["value"], reading["uph"],
+        timestamp, isinstance(timestamp, datetime.datetime),
+        reading.get("metadata") or {},
+        list(config) if isinstance(config, EffectiveConfig) else config,
+    ]
+
+
+def decode_reading(record: List) -> Dict:
+    item_name, item_type, value, uph, timestamp, is_datetime, metadata, config = record
+    if is_datetime:
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    return {
+        "item_name": item_name,
+        "item_type": item_type,
+        "value": value,
+        "uph": uph,
+        "timestamp": timestamp,
+        "metadata": metadata,
+        "item_config": EffectiveConfig(*config) if isinstance(config, list) else config,
+    }
+
+
+class IngestLog:
+    """
+    分段轮转的接入数据预写日志
+
+    - directory: 日志目录 (每个检测引擎实例独占一个目录)
+    - segment_bytes: 单个段的大小上限
+    - sync: "fsync" (默认，sync() 返回时数据已落盘) / "write" (只写入 OS 缓冲区，进程崩溃不丢数据，断电可能丢失)
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES, sync: str = "fsync"):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"Unknown sync mode {sync!r}, expected one of {SYNC_MODES}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync_mode = sync
+        self._lock = threading.Lock()       # 追加 / 轮转 / 截断
+        self._sync_lock = threading.Lock()  # 同一时间只有一个 fsync，等待者由它一起完成
+        os.makedirs(directory, exist_ok=True)
+
+        # 指标
+        self.total_frames = 0
+        self.total_records = 0
+        self.total_bytes = 0
+        self.total_syncs = 0
+        self.grouped_commits = 0
+        self.removed_segments = 0
+        self.max_sync_latency = 0.0
+        self._sync_latency_sum = 0.0
+
+        self._segments: List[Tuple[int, str]] = self._scan_segments()
+        if not self._segments:
+            self._segments = [(1, self._segment_path(1))]
+            open(self._segments[0][1], "ab").close()
+        self._last_lsn = self._recover_tail()
+        self._synced_lsn = self._last_lsn
+        self._file = open(self._segments[-1][1], "ab")
+
+    # ------------------------------------------------------------------
+    # 段管理
+    # ------------------------------------------------------------------
+    def _segment_path(self, first_lsn: int) -> str:
+        return os.path.join(self.directory, f"{first_lsn:020d}{SEGMENT_SUFFIX}")
+
+    def _scan_segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit():
+                segments.append((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _recover_tail(self) -> int:
+        """校验最后一个段，截掉不完整或校验失败的帧，返回最后一条 LSN"""
+        first_lsn, path = self._segments[-1]
+        last_lsn = first_lsn - 1
+        good = 0
+        for offset, frame_first, count, _ in self._frames(path):
+            last_lsn = frame_first + count - 1
+            good = offset
+        if good != os.path.getsize(path):
+            print(f"[WARN] Truncating torn tail of {path} at {good} bytes")
+            with open(path, "r+b") as f:
+                f.truncate(good)
+        return last_lsn
+
+    @staticmethod
+    def _frames(path: str) -> Iterator[Tuple[int, int, int, bytes]]:
+        """逐帧读取 (帧结束偏移, 首条 LSN, 条数, payload)，遇到不完整 / 校验失败的帧时停止"""
+        with open(path, "rb") as f:
+            offset = 0
+            while True:
+                header = f.read(_FRAME.size)
+                if len(header) < _FRAME.size:
+                    return
+                length, crc, first_lsn, count = _FRAME.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                offset += _FRAME.size + length
+                yield offset, first_lsn, count, payload
+
+    def _rotate(self):
+        """开始新段 (调用方持有 _lock)"""
+        self._file.flush()
+        if self.sync_mode == "fsync":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        first_lsn = self._last_lsn + 1
+        self._segments.append((first_lsn, self._segment_path(first_lsn)))
+        self._file = open(self._segments[-1][1], "ab")
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    @property
+    def last_lsn(self) -> int:
+        return self._last_lsn
+
+    def append(self, readings: List[Dict]) -> int:
+        """把一批接入数据作为一帧追加到日志，返回首条数据的 LSN (尚未落盘，需调用 sync)"""
+        payload = json.dumps([encode_reading(r) for r in readings], ensure_ascii=False,
+                             separators=(",", ":"), default=_json_default).encode("utf-8")
+        with self._lock:
+            if self._file.tell() >= self.segment_bytes:
+                self._rotate()
+            first_lsn = self._last_lsn + 1
+            self._file.write(_FRAME.pack(len(payload), zlib.crc32(payload), first_lsn, len(readings)))
+            self._file.write(payload)
+            self._file.flush()
+            self._last_lsn += len(readings)
+            self.total_frames += 1
+            self.total_records += len(readings)
+            self.total_bytes += _FRAME.size + len(payload)
+        return first_lsn
+
+    def sync(self, lsn: int):
+        """
+        等待 LSN 及之前的数据落盘 (组提交)
+        正在 fsync 时到达的调用在其完成后检查: 已被覆盖则直接返回，否则由其中一个调用再 fsync 一次
+        """
+        if self.sync_mode != "fsync":
+            return
+        if lsn <= self._synced_lsn:
+            self.grouped_commits += 1
+            return
+        with self._sync_lock:
+            if lsn <= self._synced_lsn:
+                self.grouped_commits += 1
+                return
+            with self._lock:
+                target = self._last_lsn
+                # 复制文件描述符: 在锁外 fsync 时当前段被轮转关闭也不受影响 (轮转时旧段已 fsync)
+                fd = os.dup(self._file.fileno())
+            started = time.perf_counter()
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            latency = time.perf_counter() - started
+            self._synced_lsn = target
+            self.total_syncs += 1
+            self.max_sync_latency = max(self.max_sync_latency, latency)
+            self._sync_latency_sum += latency
+
+    def advance_to(self, lsn: int):
+        """保证之后分配的 LSN 大于 lsn (日志目录被清空、而数据库 / 状态文件中记录了更大的 LSN 时)"""
+        with self._lock:
+            if lsn <= self._last_lsn:
+                return
+            self._last_lsn = lsn
+            self._synced_lsn = max(self._synced_lsn, lsn)
+            self._rotate()
+
+    def truncate(self, low_lsn: int) -> int:
+        """
+        删除只包含 LSN < low_lsn 的旧段 (low_lsn: 尚未持久化的最小 LSN)，返回删除的段数
+        全部数据都已持久化时轮转到新的空段，旧段全部删除 (新段文件名保留 LSN 的连续性)
+        """
+        with self._lock:
+            if low_lsn > self._last_lsn and self._file.tell() > 0:
+                self._rotate()
+            removable = [path for (_, path), (next_first, _) in zip(self._segments, self._segments[1:])
+                         if next_first <= low_lsn]
+            for path in removable:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"[WARN] Failed to remove WAL segment {path}: {e}")
+            self._segments = self._segments[len(removable):]
+            self.removed_segments += len(removable)
+        return len(removable)
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            if self.sync_mode == "fsync":
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+    # ------------------------------------------------------------------
+    # 重放
+    # ------------------------------------------------------------------
+    def read(self, after_lsn: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """按顺序读取 LSN > after_lsn 的帧: (首条 LSN, 接入数据列表)。帧内可能包含 LSN <= after_lsn 的数据"""
+        with self._lock:
+            self._file.flush()
+            segments = list(self._segments)
+        for i, (first_lsn, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= after_lsn + 1:
+                continue
+            end_lsn = segments[i + 1][0] - 1 if i + 1 < len(segments) else None
+            last = first_lsn - 1
+            for _, frame_first, count, payload in self._frames(path):
+                last = frame_first + count - 1
+                if last <= after_lsn:
+                    continue
+                yield frame_first, [decode_reading(record) for record in json.loads(payload)]
+            if end_lsn is not None and last < end_lsn:
+                print(f"[WARN] WAL segment {path} ends at LSN {last}, expected {end_lsn}; replay skips the gap")
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = list(self._segments)
+            size = self._file.tell()
+        sizes = [os.path.getsize(path) for _, path in segments[:-1] if os.path.exists(path)]
+        return {
+            "directory": self.directory,
+            "sync": self.sync_mode,
+            "segments": len(segments),
+            "bytes": sum(sizes) + size,
+            "first_lsn": segments[0][0],
+            "last_lsn": self._last_lsn,
+            "synced_lsn": self._synced_lsn,
+            "total_frames": self.total_frames,
+            "total_records": self.total_records,
+            "total_bytes": self.total_bytes,
+            "total_syncs": self.total_syncs,
+            "grouped_commits": self.grouped_commits,
+            "removed_segments": self.removed_segments,
+            "avg_sync_latency_ms": round(self._sync_latency_sum / self.total_syncs * 1000, 3) if self.total_syncs else 0.0,
+            "max_sync_latency_ms": round(self.max_sync_latency * 1000, 3),
+        }
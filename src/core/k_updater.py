@@ -6,10 +6,15 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from src.utils.arl_calculator import ARLCalculator
+from .observation_window import (
+    ObservationWindow, DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION, container_bytes
+)
+from .detector_profile import DetectorProfile, profile_property
 
 @dataclass
 class KValueUpdate:
     """记录K值更新的数据类"""
+    __slots__ = ("timestamp", "old_value", "new_value", "is_limited", "valid_points", "window_points", "std")
     timestamp: datetime
     old_value: float
     new_value: float
@@ -19,6 +24,20 @@ class KValueUpdate:
     std: float  # 标准差
 
 class AdaptiveKUpdater:
+    # 紧凑存储: 窗口参数等共享常量保存在 profile 中
+    __slots__ = (
+        "profile", "base_uph", "min_k", "use_arl", "target_shift_sigma", "target_arl0",
+        "current_k", "arl_k_in_sigma_units", "last_update_time",
+        "update_history", "owns_window", "window",
+    )
+
+    window_size = profile_property("window_size")
+    update_interval = profile_property("update_interval")
+    max_change_ratio = profile_property("max_change_ratio")
+    invalid_points_around_alert = profile_property("invalid_points_around_alert")
+    min_detection_ratio = profile_property("min_detection_ratio")
+    update_history_retention = profile_property("update_history_retention")
+
     def __init__(
         self,
         window_size: int = 700,  # 与基础不良率更新器共用相同的窗口大小
@@ -30,15 +49,25 @@ class AdaptiveKUpdater:
         min_k: float = 0.001,  # 最小K值
         use_arl: bool = True,  # 是否使用ARL理论
         target_shift_sigma: float = 1.0,  # 要检测的最小偏移（单位：σ）
-        target_arl0: float = 370.0  # 目标ARL₀
+        target_arl0: float = 370.0,  # 目标ARL₀
+        window: Optional[ObservationWindow] = None,  # 共享观测窗口 (由检测器统一写入)
+        history_retention: int = DEFAULT_HISTORY_RETENTION,  # 自有窗口的完整数据保留条数
+        update_history_retention: int = DEFAULT_UPDATE_HISTORY_RETENTION,  # 更新记录保留条数
+        profile: Optional[DetectorProfile] = None  # 共享参数模板 (传入时忽略上面的窗口 / 保留参数)
     ):
-        # 继承基础不良率更新器的参数
-        self.window_size = window_size
-        self.update_interval = update_interval
-        self.max_change_ratio = max_change_ratio
-        self.invalid_points_around_alert = invalid_points_around_alert
+        # 继承基础不良率更新器的参数 (共享常量保存在 profile 中)
+        if profile is None:
+            profile = DetectorProfile.get(
+                window_size=window_size,
+                update_interval=update_interval,
+                max_change_ratio=max_change_ratio,
+                invalid_points_around_alert=invalid_points_around_alert,
+                min_detection_ratio=min_detection_ratio,
+                history_retention=history_retention,
+                update_history_retention=update_history_retention
+            )
+        self.profile = profile
         self.base_uph = base_uph
-        self.min_detection_ratio = min_detection_ratio
         self.min_k = min_k
         self.use_arl = use_arl
         self.target_shift_sigma = target_shift_sigma
@@ -46,31 +75,37 @@ class AdaptiveKUpdater:
 
         # 基于ARL理论设计初始参数
         if self.use_arl:
-            self.target_shift_sigma = target_shift_sigma
-            self.target_arl0 = target_arl0
-
             # ARL参数需要后续用数据的标准差来转换
             # 初始化使用传统方法
             self.current_k = 0.005
             self.arl_k_in_sigma_units = None  # 将在第一次更新时计算
         else:
             self.current_k = 0.005
+            self.arl_k_in_sigma_units = None
 
         # 初始化状态
         self.last_update_time = None
-        self.update_history = []
-        self.data_buffer = []
-        self.alert_points = set()
-        self.sliding_buffer = []
-        self.sliding_alerts = set()
-        self.low_uph_points = set()
-        self.last_update_time = None
-        self.update_history = []
-        self.data_buffer = []
-        self.alert_points = set()
-        self.sliding_buffer = []
-        self.sliding_alerts = set()
-        self.low_uph_points = set()
+        self.update_history: List[KValueUpdate] = []  # 最近的更新历史 (最多 update_history_retention 条)
+        # 滑动窗口（环形缓冲，增量维护有效点的和与平方和）
+        # 传入共享窗口时由检测器统一写入数据，否则由本更新器自行维护
+        self.owns_window = window is None
+        self.window = window if window is not None else ObservationWindow(
+            window_size=profile.window_size,
+            invalid_points_around_alert=profile.invalid_points_around_alert,
+            history_retention=profile.history_retention
+        )
+
+    @property
+    def data_buffer(self):
+        return self.window.data_buffer
+
+    @property
+    def alert_points(self):
+        return self.window.alert_points
+
+    @property
+    def low_uph_points(self):
+        return self.window.low_uph_points
 
     def add_data_point(self, 
                       timestamp: datetime, 
@@ -78,49 +113,26 @@ class AdaptiveKUpdater:
                       is_alert: bool, 
                       current_uph: float,
                       current_baseline: float) -> None:
-        """添加新的数据点"""
-        # 记录完整数据
-        self.data_buffer.append((timestamp, defect_rate, current_uph))
-        current_idx = len(self.data_buffer) - 1
-        
-        if is_alert:
-            self.alert_points.add(current_idx)
-        
-        # 检查是否为极低UPH点
-        if current_uph < self.base_uph * self.min_detection_ratio:
-            self.low_uph_points.add(current_idx)
-        
-        # 更新滑动窗口
-        self.sliding_buffer.append((timestamp, defect_rate, current_uph))
-        sliding_idx = len(self.sliding_buffer) - 1
-        
-        if is_alert:
-            self.sliding_alerts.add(sliding_idx)
-        
-        # 如果滑动窗口超过大小，移除最早的数据
-        while len(self.sliding_buffer) > self.window_size:
-            self.sliding_buffer.pop(0)
-            # 更新滑动窗口中的异常点索引
-            self.sliding_alerts = {i-1 for i in self.sliding_alerts if i > 0}
-            # 移除已经超出窗口的异常点
-            self.sliding_alerts = {i for i in self.sliding_alerts if i >= 0}
+        """添加新的数据点 (共享窗口时数据已由检测器写入，这里只检查是否需要更新)"""
+        if self.owns_window:
+            self.window.add(
+                timestamp, defect_rate, current_uph, is_alert,
+                is_low_uph=current_uph < self.base_uph * self.min_detection_ratio
+            )
         
         # 检查是否需要更新K值
         if self._should_update(timestamp):
             self._update_k_value(current_baseline)
 
-    def _calculate_k(self, valid_rates: List[float], current_baseline: float) -> float:
-        """计算新的K值
+    def _calculate_k(self, std: Optional[float], current_baseline: float) -> float:
+        """计算新的K值 (基于有效点的标准差)
         支持两种方法：
         1. ARL理论方法（推荐）
         2. 传统方法（4倍标准差）
         """
-        if not valid_rates:
+        if std is None:
             return self.current_k if self.current_k is not None else 0.005
 
-        rates = np.array(valid_rates)
-        std = float(np.std(rates))
-
         if self.use_arl:
             std_current = std
             k_sigma = self.target_shift_sigma / 2.0
@@ -161,21 +173,18 @@ class AdaptiveKUpdater:
 
     def _update_k_value(self, current_baseline: float) -> None:
         """更新K值"""
-        if len(self.sliding_buffer) < self.window_size:
+        if len(self.window) < self.window_size:
             return
             
-        # 获取有效数据点
-        invalid_indices = self._get_invalid_indices()
-        valid_rates = [
-            rate for idx, (_, rate, _) in enumerate(self.sliding_buffer)
-            if idx not in invalid_indices
-        ]
-        
-        if not valid_rates:
+        # 有效数据点的标准差 (窗口增量维护，O(1))
+        stats = self.window.k_stats
+        valid_points = stats.count
+        if not valid_points:
             return
+        std = stats.std()
             
         # 计算新的K值
-        new_k = self._calculate_k(valid_rates, current_baseline)
+        new_k = self._calculate_k(std, current_baseline)
         
         # 如果是首次更新
         if self.current_k is None:
@@ -197,49 +206,31 @@ class AdaptiveKUpdater:
         
         # 记录更新
         update = KValueUpdate(
-            timestamp=self.sliding_buffer[-1][0],
+            timestamp=self.window.last_timestamp,
             old_value=self.current_k if self.current_k is not None else float(new_k),
             new_value=float(new_k),
             is_limited=is_limited,
-            valid_points=len(valid_rates),
-            window_points=len(self.sliding_buffer),
-            std=float(np.std(np.array(valid_rates)))
+            valid_points=valid_points,
+            window_points=len(self.window),
+            std=std
         )
-        self.update_history.append(update)
+        self._record_update(update)
         
         # 更新状态
         self.current_k = new_k
-        self.last_update_time = self.sliding_buffer[-1][0]
+        self.last_update_time = self.window.last_timestamp
 
     def _should_update(self, current_time: datetime) -> bool:
         """检查是否应该更新K值"""
         if self.last_update_time is None:
-            return len(self.sliding_buffer) >= self.window_size
+            return len(self.window) >= self.profile.window_size
         
         hours_since_last_update = (current_time - self.last_update_time).total_seconds() / 3600
-        return hours_since_last_update >= self.update_interval
+        return hours_since_last_update >= self.profile.update_interval
 
     def _get_invalid_indices(self) -> set:
-        """获取所有无效数据点的索引"""
-        invalid_indices = set()
-        
-        # 获取滑动窗口中的极低UPH点
-        for i, (_, _, uph) in enumerate(self.sliding_buffer):
-            if uph < self.base_uph * self.min_detection_ratio:
-                invalid_indices.add(i)
-                # 同时标记前后的点
-                for j in range(max(0, i - self.invalid_points_around_alert),
-                             min(len(self.sliding_buffer), i + self.invalid_points_around_alert + 1)):
-                    invalid_indices.add(j)
-        
-        # 添加异常点及其前后的点
-        for alert_idx in self.sliding_alerts:
-            # 标记异常点前后的点
-            for i in range(max(0, alert_idx - self.invalid_points_around_alert),
-                         min(len(self.sliding_buffer), alert_idx + self.invalid_points_around_alert + 1)):
-                invalid_indices.add(i)
-        
-        return invalid_indices
+        """获取所有无效数据点的索引 (极低UPH点、异常点及其前后的点)"""
+        return set(np.flatnonzero(~self.window.k_valid_mask()).tolist())
 
     def get_current_k(self) -> Optional[float]:
         """获取当前K值"""
@@ -251,6 +242,19 @@ class AdaptiveKUpdater:
             return self.update_history[-1].std
         return None
 
+    def _record_update(self, update) -> None:
+        """记录一次更新 (超出保留条数时丢弃最早的记录; 更新频率很低，用列表比 deque 更省内存)"""
+        self.update_history.append(update)
+        if len(self.update_history) > self.update_history_retention:
+            del self.update_history[0]
+
+    def memory_usage(self) -> int:
+        """更新器保留的内存 (字节, 估算; 共享窗口不计入)"""
+        size = sys.getsizeof(self) + container_bytes(self.update_history)
+        if self.owns_window:
+            size += self.window.memory_usage()
+        return size
+
     def get_state(self) -> Dict:
         """获取当前状态"""
         return {
@@ -276,4 +280,4 @@ class AdaptiveKUpdater:
                 window_points=0,
                 std=state["std"]
              )
-             self.update_history.append(dummy_update)
+             self._record_update(dummy_update)
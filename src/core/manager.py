@@ -1,37 +1,115 @@
-import collections
+import sys
+import math
+import heapq
+import itertools
 import time
+import threading
 import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from .adaptive_cusum import AdaptiveCUSUMDetector
-from ..db.database import SessionLocal
-from ..db.models import DetectionRecord
+from .detector_bank import DetectorBank, BankDetector
+from .observation_window import DEFAULT_HISTORY_RETENTION, DEFAULT_UPDATE_HISTORY_RETENTION
+from .trajectory_store import TrajectoryStore
+from .detector_profile import DetectorProfile
+from .effective_config import EffectiveConfig, effective_config, generate_detector_key
+from .state_file import StateFile, StateFileWriter
+from .detector_snapshot import unpack_snapshot
+from .ingest_log import IngestLog
+from ..db.database import engine
+from ..db.partitions import RecordPartitions
 from ..utils.persistence import load_all_item_states, save_item_states
 
+# 增量检查点每次持有检测锁时采集的状态条数 (每条需编码完整快照)
+CHECKPOINT_COLLECT_BATCH = 256
+# 重放接入日志时每次检测的条数
+REPLAY_BATCH = 10000
+# 可在线修改的检测器参数 (PUT /api/v1/configs/{item_name})
+DETECTOR_CONFIG_FIELDS = ("target_shift_sigma", "target_arl0", "mu0", "monitoring_side", "base_uph", "penalty_strength")
+
+
+def _prewarm_params(cfg: Dict) -> Dict[str, Any]:
+    """预热配置 -> get_or_create_detector 参数"""
+    return {
+        "item_type": cfg.get("item_type", "parameter"),
+        "mu0": cfg.get("mu0", 0.001),
+        "base_uph": cfg.get("base_uph", 500),
+        "monitoring_side": cfg.get("monitoring_side"),
+        "penalty_strength": cfg.get("penalty_strength", 1.0),
+    }
+
+
 class DetectionEngineManager:
     """
     管理多个检测项目的引擎管理器
     - 负责维护检测项实例
-    - 负责维护最近30次历史轨迹 (History Trajectory)
+    - 负责维护最近30次历史轨迹 (History Trajectory, 见 TrajectoryStore)
     - 负责报警抑制 (Cooldown Policy) 逻辑
+
+    engine_mode:
+    - "scalar" (默认): 每个检测键一个 AdaptiveCUSUMDetector 对象
+    - "vectorized": 所有检测器状态保存在 DetectorBank 数组中，批量数据按 tick 向量化更新
     """
     def __init__(self, global_config: Dict[str, Any]):
         self.global_config = global_config
+        self.engine_mode = global_config.get("engine_mode", "scalar")
+        # 检测器内部逐点历史 / 更新记录的保留条数 (有界内存)
+        self.history_retention = int(global_config.get("history_retention", DEFAULT_HISTORY_RETENTION))
+        self.update_history_retention = int(
+            global_config.get("update_history_retention", DEFAULT_UPDATE_HISTORY_RETENTION)
+        )
+        # 本管理器创建的所有检测器共享的参数模板 (算法开关、窗口参数、保留条数)
+        self.profile = DetectorProfile.get(
+            history_retention=self.history_retention,
+            update_history_retention=self.update_history_retention
+        )
+        self.bank = DetectorBank(
+            history_retention=self.history_retention,
+            update_history_retention=self.update_history_retention
+        ) if self.engine_mode == "vectorized" else None
         self.detectors: Dict[str, AdaptiveCUSUMDetector] = {}
-        # 缓存最近30周期的历史数据
-        # 结构: {item_name: deque([status1, status2, ...], maxlen=30)}
-        self.history_cache: Dict[str, collections.deque] = {}
-        # 缓存最近的报警推送记录，用于抑制重复报警 (实际上在 history_cache 中记录了 push_executed)
+        # 缓存最近30周期的历史数据 (按字段存储的二维环形数组，每个检测键一行)
+        self.trajectories = TrajectoryStore(periods=30)
+        # 缓存最近的报警推送记录，用于抑制重复报警 (实际上在 trajectories 中记录了 push_executed)
         self.alert_history: Dict[str, float] = {}
         
         # 缓存的初始状态 (用于延迟加载)
         self.initial_states = {}
+        # 启动镜像 (mmap 状态文件)，检测器首次访问时从中恢复；initial_states 中更新的状态优先
+        self.state_file: Optional[StateFile] = None
+        # 已注册但尚未创建的检测器 (启动预热只登记检测键，首次访问时创建)
+        self.deferred_configs: Dict[str, Dict] = {}
         
         # 报警抑制规则：将从项目配置中读取
         # self.cooldown_periods = global_config.get("cooldown_periods", 6)
         self.enable_cooldown = global_config.get("enable_cooldown", True)
 
+        # 检测记录的延迟批量写入器 (RecordWriter)，未设置时同步写入
+        self.record_writer = None
+        # 接入数据预写日志 (IngestLog)，未设置时两次检查点之间的状态只在内存中
+        self.ingest_log: Optional[IngestLog] = None
+        # 已检测的最后一条接入数据的日志序号 (检查点保存的状态包含该序号及之前的所有数据)
+        self._applied_lsn = 0
+        # 当前批次首条数据的日志序号 (检测键首次变为 dirty 时记录)
+        self._batch_lsn = 0
+        self.replay_stats: Dict[str, Any] = {}
+        # 检测状态 (检测器、轨迹缓存) 的互斥锁: 多个检测 worker 线程并发调用时串行执行检测，数据库写入不在锁内
+        self._detect_lock = threading.Lock()
+        # 自上次检查点以来状态发生变化的检测键 -> 首次变化时的日志序号 (按变化先后排列)
+        # 增量检查点只持久化这些键；最早的序号之前的接入日志可以删除
+        self._dirty: Dict[str, int] = {}
+        # 检查点与状态文件写入互斥: 状态文件写入时间之后保存的 ItemState 一定比文件中的状态新
+        self._checkpoint_lock = threading.Lock()
+
     def get_or_create_detector(self, item_name: str, item_type: str, mu0: float, base_uph: float, monitoring_side: Optional[str] = None, **kwargs) -> AdaptiveCUSUMDetector:
         if item_name not in self.detectors:
+            deferred = self.deferred_configs.pop(item_name, None)
+            if deferred is not None:
+                # 启动时登记的检测键: 按登记的配置创建 (与预先创建时的参数一致)
+                params = _prewarm_params(deferred)
+                item_type, mu0, base_uph = params["item_type"], params["mu0"], params["base_uph"]
+                monitoring_side = params["monitoring_side"]
+                kwargs["penalty_strength"] = params["penalty_strength"]
+
             # 优先级: item_config > global_config > default rule
             if monitoring_side is None:
                 monitoring_side = self.global_config.get("monitoring_side")
@@ -40,116 +118,429 @@ class DetectionEngineManager:
             if not monitoring_side:
                 monitoring_side = "both" if item_type == "parameter" else "upper"
             
-            detector = AdaptiveCUSUMDetector(
-                mu0=mu0,
-                base_uph=base_uph,
-                target_shift_sigma=self.global_config.get("target_shift_sigma", 1.0),
-                target_arl0=self.global_config.get("target_arl0", 250.0),
-                item_type=item_type,
-                monitoring_side=monitoring_side,
-                use_standardization=True,
-                use_arl=True,
-                penalty_strength=kwargs.get("penalty_strength", 1.0)
-            )
+            if self.bank is not None:
+                slot = self.bank.add_detector(
+                    mu0=mu0,
+                    base_uph=base_uph,
+                    target_shift_sigma=self.global_config.get("target_shift_sigma", 1.0),
+                    target_arl0=self.global_config.get("target_arl0", 250.0),
+                    item_type=item_type,
+                    monitoring_side=monitoring_side,
+                    penalty_strength=kwargs.get("penalty_strength", 1.0)
+                )
+                detector = BankDetector(self.bank, slot)
+            else:
+                detector = AdaptiveCUSUMDetector(
+                    mu0=mu0,
+                    base_uph=base_uph,
+                    target_shift_sigma=self.global_config.get("target_shift_sigma", 1.0),
+                    target_arl0=self.global_config.get("target_arl0", 250.0),
+                    item_type=item_type,
+                    monitoring_side=monitoring_side,
+                    penalty_strength=kwargs.get("penalty_strength", 1.0),
+                    profile=self.profile  # use_standardization / use_arl 等共享常量由 profile 提供
+                )
             
-            # 尝试恢复状态
-            if item_name in self.initial_states:
-                detector.set_state(self.initial_states[item_name])
-                del self.initial_states[item_name]
+            # 尝试恢复状态 (数据库中比状态文件新的状态优先)
+            state = self.initial_states.pop(item_name, None)
+            if state is not None:
+                detector.set_state(state)
+            elif self.state_file is not None and item_name in self.state_file:
+                try:
+                    detector.apply_snapshot(self.state_file.read(item_name))
+                except Exception as e:
+                    print(f"[WARN] Failed to restore {item_name} from state file: {e}")
 
             self.detectors[item_name] = detector
-            self.history_cache[item_name] = collections.deque(maxlen=30)
+            self.trajectories.add_key(item_name)
         return self.detectors[item_name]
 
     def remove_detector(self, item_name: str):
-        if item_name in self.detectors:
-            del self.detectors[item_name]
-        if item_name in self.history_cache:
-            del self.history_cache[item_name]
+        with self._detect_lock:
+            if item_name in self.detectors:
+                detector = self.detectors.pop(item_name)
+                if isinstance(detector, BankDetector):
+                    detector.bank.remove_detector(detector.slot)
+            self.trajectories.remove_key(item_name)
+            self._dirty.pop(item_name, None)
+            self.deferred_configs.pop(item_name, None)
+            self.initial_states.pop(item_name, None)
+            if self.state_file is not None:
+                self.state_file.discard(item_name)
+
+    def prewarm_detectors(self, configs: Dict[str, Dict], lazy: bool = True) -> int:
+        """
+        按配置预热检测器 (服务启动时填充监控列表)，返回创建失败的个数
+        - lazy=True (默认): 只登记检测键与配置，检测器在首次访问时创建并恢复状态
+          (百万级检测键时启动不需要逐个构造检测器)
+        - lazy=False: 立即创建所有检测器
+        """
+        failed = 0
+        with self._detect_lock:
+            for key, cfg in configs.items():
+                if key in self.detectors:
+                    continue
+                if lazy:
+                    self.deferred_configs[key] = cfg
+                    continue
+                try:
+                    self.get_or_create_detector(item_name=key, **_prewarm_params(cfg))  # key 即 unique_key
+                except Exception as e:
+                    failed += 1
+                    print(f"[ERROR] Failed to init detector {key}: {e}")
+        return failed
+
+    def update_detector_config(self, item_name: str, update_data: Dict[str, Any]) -> bool:
+        """实时更新运行中的检测器参数 (检测器不存在时返回 False)"""
+        with self._detect_lock:
+            detector = self.detectors.get(item_name)
+            if detector is None and item_name in self.deferred_configs:
+                detector = self.get_or_create_detector(item_name, **_prewarm_params(self.deferred_configs[item_name]))
+            if detector is None:
+                return False
+            for field in DETECTOR_CONFIG_FIELDS:
+                if field in update_data:
+                    setattr(detector, field, update_data[field])
+            self._dirty.setdefault(item_name, self._applied_lsn + 1)
+        return True
 
-    def load_all_states(self):
-        """服务启动时加载所有状态"""
+    def update_global_config(self, update_data: Dict[str, Any]):
+        """更新默认配置 (只影响之后新建的检测器; 报警抑制开关立即生效)"""
+        self.global_config.update(update_data)
+        if "enable_cooldown" in update_data:
+            self.enable_cooldown = update_data["enable_cooldown"]
+
+    def detector_count(self) -> int:
+        """检测器个数 (包括已登记、尚未创建的检测键)"""
+        return len(self.detectors) + len(self.deferred_configs)
+
+    def get_status(self) -> Dict[str, Dict]:
+        """每个检测键最近一个周期的状态 (实时监控看板)"""
+        stats = {}
+        trajectories = self.trajectories
+        for name in list(trajectories.keys()):
+            last = trajectories.latest(name)
+            if last:
+                stats[name] = {
+                    "last_val": last["value"],
+                    "last_time": last["timestamp"],
+                    "alert": last["alert"],
+                    "last_baseline": last["baseline"]
+                }
+        return stats
+
+    def get_writer_metrics(self) -> Optional[Dict]:
+        """检测记录写入器的指标 (同步写入时返回 None)"""
+        if self.record_writer is None:
+            return None
+        return self.record_writer.get_metrics()
+
+    def start(self):
+        """启动后台组件 (检测记录写入线程)"""
+        if self.record_writer is not None:
+            self.record_writer.start()
+
+    def stop(self):
+        """停止后台组件，写完队列中剩余的检测记录"""
+        if self.record_writer is not None:
+            self.record_writer.stop()
+        if self.ingest_log is not None:
+            self.ingest_log.close()
+
+    def get_ingest_log_metrics(self) -> Optional[Dict]:
+        """接入日志的段数、大小与组提交情况 (未启用时返回 None)"""
+        if self.ingest_log is None:
+            return None
+        return {**self.ingest_log.get_metrics(), "replay": self.replay_stats}
+
+    def get_memory_usage(self, top: int = 0, offset: int = 0) -> Dict[str, Any]:
+        """
+        统计检测器保留的内存 (字节, 估算)
+        - 默认只返回合计值及按组成部分 (检测器 / 观测窗口 / 两个更新器 / 历史轨迹缓存) 汇总的字节数，
+          用于确认长期运行时内存保持平稳；响应大小与检测键个数无关
+        - top > 0 时附带占用最多的检测键明细 (按 total 降序，跳过前 offset 个)
+        """
+        components: Dict[str, int] = {}
+        largest = []
+        slot = self.trajectories.slot_bytes()
+        for name, detector in self.detectors.items():
+            usage = detector.memory_usage()
+            usage["trajectory"] = slot
+            usage["total"] += slot
+            for part, size in usage.items():
+                components[part] = components.get(part, 0) + size
+            if top > 0:
+                largest.append((usage["total"], name, usage))
+        total = components.pop("total", 0)
+
+        # 轨迹缓存中已分配但未使用的行
+        shared = self.trajectories.memory_usage() - len(self.detectors) * self.trajectories.slot_bytes()
+        if self.bank is not None:
+            # 已分配但未使用的 slot 也占用状态数组
+            shared += (self.bank.capacity - len(self.detectors)) * self.bank.slot_bytes()
+            shared += sum(sys.getsizeof(lst) for lst in (self.bank.windows, self.bank.baseline_updaters, self.bank.k_updaters))
+            total += shared
+
+        return {
+            "engine_mode": self.engine_mode,
+            "history_retention": self.history_retention,
+            "update_history_retention": self.update_history_retention,
+            "detector_count": len(self.detectors),
+            "shared_bytes": shared,
+            "total_bytes": total,
+            "components": components,
+            "detectors": [
+                {"key": name, **usage}
+                for _, name, usage in heapq.nlargest(offset + top, largest, key=lambda e: (e[0], e[1]))[offset:]
+            ],
+        }
+
+    def load_all_states(self, key_filter: Optional[Callable[[str], bool]] = None, state_file: Optional[str] = None):
+        """
+        服务启动时加载所有状态
+        - key_filter: 只保留本实例负责的检测键，分片模式使用
+        - state_file: 状态文件路径；文件有效时直接 mmap，数据库只读取文件写入之后更新的状态 (优先于文件)
+        返回可恢复的检测键个数
+        """
         count = 0
         try:
-            self.initial_states = load_all_item_states()
+            self.state_file = StateFile.open(state_file)
+            if self.state_file is not None and self.state_file.window_params != self._window_params():
+                print(f"[WARN] State file window {self.state_file.window_params} does not match profile, ignored")
+                self.state_file = None
+            since = self.state_file.written_at if self.state_file is not None else None
+            states = load_all_item_states(updated_after=since)
+            if key_filter is not None:
+                states = {key: state for key, state in states.items() if key_filter(key)}
+            self.initial_states = states
             count = len(self.initial_states)
+            if self.state_file is not None:
+                count += sum(1 for key in self.state_file.keys() if key not in states)
         except Exception as e:
             print(f"Failed to load states: {e}")
         return count
 
     def save_all_states(self):
         """保存当前内存中所有检测器的状态"""
-        states_to_save = []
-        for name, detector in self.detectors.items():
-            state = detector.get_state()
-            state["item_name"] = name
-            state["last_data_timestamp"] = datetime.datetime.now()
-            states_to_save.append(state)
-        
-        if states_to_save:
-            save_item_states(states_to_save)
-            return len(states_to_save)
-        return 0
+        with self._checkpoint_lock:
+            with self._detect_lock:
+                states_to_save = self._collect_states(list(self.detectors))
+                self._dirty.clear()
+            saved = save_item_states(states_to_save)
+            if saved == len(states_to_save):
+                self._truncate_log()
+            return saved
 
-    def _generate_detector_key(self, item_name: str, metadata: Dict) -> str:
+    def save_state_file(self, path: str) -> int:
         """
-        生成唯一检测键值
-        Format: Product::Line::Station::ItemName
-        如果 Metadata 缺失，则降级为只使用 ItemName (兼容旧行为，但建议都带上)
+        写入状态文件 (服务正常退出时，在最后一次检查点之后调用)，返回写入的检测器个数
+        - 已创建的检测器: 在检测锁内分批采集快照
+        - 尚未访问的检测键: 数据库中的快照解码后写入，状态文件中的记录原样复制
+        - 写入时间记录在文件头，之后保存到数据库的状态在下次启动时优先于文件
         """
-        if not metadata:
-            return item_name
-            
-        product = str(metadata.get("product", "UnknownProduct")).lower()
-        line = str(metadata.get("line", "UnknownLine")).lower()
-        station = str(metadata.get("station", "UnknownStation")).lower()
-        
-        # 使用双冒号作为分隔符，避免与常规名称冲突
-        return f"{product}::{line}::{station}::{item_name}"
+        with self._checkpoint_lock:
+            written_at = datetime.datetime.utcnow()
+            with self._detect_lock:
+                keys = list(self.detectors)
+                pending = {key: state for key, state in self.initial_states.items() if state.get("snapshot")}
+                old_file = self.state_file
+                copied = [key for key in old_file.keys() if key not in self.detectors and key not in self.initial_states] \
+                    if old_file is not None else []
+            writer = StateFileWriter(path, len(keys) + len(pending) + len(copied), self._window_params(), written_at)
+            try:
+                for start in range(0, len(keys), CHECKPOINT_COLLECT_BATCH):
+                    with self._detect_lock:
+                        for key in keys[start:start + CHECKPOINT_COLLECT_BATCH]:
+                            detector = self.detectors.get(key)
+                            if detector is not None:
+                                writer.append(key, detector.capture_snapshot(), self._applied_lsn)
+                for key, state in pending.items():
+                    try:
+                        writer.append(key, unpack_snapshot(state["snapshot"]), state.get("lsn") or 0)
+                    except Exception as e:
+                        print(f"[WARN] Skipping snapshot of {key} in state file: {e}")
+                for key in copied:
+                    writer.copy_from(key, old_file)
+                return writer.commit()
+            except Exception:
+                writer.abort()
+                raise
 
-    def process_data(self, item_name: str, item_type: str, value: float, uph: int, timestamp: Any, metadata: Dict, item_config: Dict = None):
+    def _window_params(self):
+        """观测窗口参数 (状态文件与快照按此校验)"""
+        return (self.profile.window_size, self.profile.invalid_points_around_alert)
+
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def checkpoint_dirty(self, fraction: float = 1.0) -> int:
         """
-        处理单条接入数据
+        增量检查点: 只持久化自上次检查点以来发生变化的检测键
+        - fraction: 本次写入的比例 (向上取整)，调度方把一个检查点周期拆成多个小片，避免一次性写入造成接入延迟尖峰
+        - 状态在检测锁内分批采集 (与检测串行，保证单个检测器状态一致)，数据库写入在锁外
+        - 写入失败时检测键重新标记为 dirty，下次重试
+        - 写入成功后删除已完全持久化的接入日志段
+        返回写入的状态条数
         """
-        # 统一转换时间戳为 datetime 对象
+        with self._checkpoint_lock:
+            return self._checkpoint_dirty(fraction)
+
+    def _checkpoint_dirty(self, fraction: float) -> int:
+        with self._detect_lock:
+            count = min(len(self._dirty), math.ceil(len(self._dirty) * fraction))
+            # 最早变化的检测键先写入 (日志按序号从旧到新删除)
+            keys = list(itertools.islice(self._dirty, count))
+        taken: Dict[str, int] = {}
+        states = []
+        # 分批采集 (每批之间释放检测锁)，单次持锁时间有界
+        for start in range(0, len(keys), CHECKPOINT_COLLECT_BATCH):
+            with self._detect_lock:
+                batch = [key for key in keys[start:start + CHECKPOINT_COLLECT_BATCH] if key in self._dirty]
+                for key in batch:
+                    taken[key] = self._dirty.pop(key)
+                states.extend(self._collect_states(batch))
+        if not states:
+            return 0
+        try:
+            saved = save_item_states(states)
+        except Exception as e:
+            print(f"[ERROR] Checkpoint failed for {len(taken)} states: {e}")
+            saved = 0
+        if saved < len(states):
+            # 未写入的检测键重新标记为 dirty (保留原来的序号与先后顺序)，下次重试
+            with self._detect_lock:
+                dirty = {key: lsn for key, lsn in taken.items() if key in self.detectors}
+                for key, lsn in self._dirty.items():
+                    dirty.setdefault(key, lsn)
+                self._dirty = dirty
+            return saved
+        self._truncate_log()
+        return saved
+
+    def _truncate_log(self):
+        """删除已完全持久化的接入日志段 (调用方持有检查点锁)"""
+        if self.ingest_log is None:
+            return
+        with self._detect_lock:
+            low = next(iter(self._dirty.values()), self._applied_lsn + 1)
+        try:
+            self.ingest_log.truncate(low)
+        except Exception as e:
+            print(f"[WARN] Failed to truncate ingest log: {e}")
+
+    def _collect_states(self, keys: List[str]) -> List[Dict]:
+        """采集指定检测键的持久化状态 (调用方持有检测锁)"""
+        now = datetime.datetime.now()
+        states = []
+        for name in keys:
+            detector = self.detectors.get(name)
+            if detector is None:
+                continue
+            state = detector.get_state()
+            state["item_name"] = name
+            state["lsn"] = self._applied_lsn
+            state["last_data_timestamp"] = now
+            states.append(state)
+        return states
+
+    def _generate_detector_key(self, item_name: str, metadata: Dict) -> str:
+        """生成唯一检测键值 (见 generate_detector_key)"""
+        return generate_detector_key(item_name, metadata)
+
+    def _parse_timestamp(self, timestamp: Any) -> datetime.datetime:
+        """统一转换时间戳为 datetime 对象"""
         if isinstance(timestamp, str):
             try:
                 # 尝试解析 ISO 格式
                 # 处理 Z 后缀 (python 3.9 fromisoformat 不完全支持 Z，需替换为 +00:00)
                 ts_str = timestamp.replace('Z', '+00:00')
-                current_time = datetime.datetime.fromisoformat(ts_str)
+                return datetime.datetime.fromisoformat(ts_str)
             except ValueError:
                 # 尝试常见格式
                 try:
-                    current_time = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
+                    return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
                 except:
-                    current_time = datetime.datetime.now()
+                    return datetime.datetime.now()
         elif isinstance(timestamp, datetime.datetime):
-            current_time = timestamp
-        else:
-            current_time = datetime.datetime.now()
+            return timestamp
+        return datetime.datetime.now()
 
-        # 生成唯一键值 (Composite Key)
-        unique_key = self._generate_detector_key(item_name, metadata)
+    def _prepare(self, item_name: str, item_type: str, timestamp: Any, metadata: Dict, item_config: Dict = None):
+        """解析时间戳、生成检测键并获取/创建检测器"""
+        current_time = self._parse_timestamp(timestamp)
 
-        # 优先使用传入的 item_config
-        if item_config:
-            mu0 = item_config.get("mu0", 0.0005)
-            base_uph = item_config.get("base_uph", 500)
-            penalty_strength = item_config.get("penalty_strength", 1.0)
-            monitoring_side = item_config.get("monitoring_side")
+        # 接口层已解析的生效配置直接使用；否则按 item_config / 全局配置合并 (脚本直接调用时)
+        if isinstance(item_config, EffectiveConfig):
+            config = item_config
         else:
-            # Fallback (Legacy) - 注意：这里仍然使用原始 item_name 查找配置，
-            # 因为配置通常是针对"检测项"本身的，而不是针对"特定产线的检测项"。
-            # 如果未来需要针对特定产线配置不同参数，这里也需要修改。
-            # 目前假设同一 item 在不同产线配置相同。
-            mu0 = self.global_config.get(f"mu0_{item_name}", 0.0005)
-            base_uph = self.global_config.get(f"base_uph_{item_name}", 500)
-            penalty_strength = self.global_config.get(f"penalty_strength_{item_name}", 1.0)
-            monitoring_side = None
+            config = effective_config(
+                self._generate_detector_key(item_name, metadata), item_name, item_config, self.global_config
+            )
+        unique_key = config.unique_key
 
         # 使用 unique_key 获取/创建检测器
-        detector = self.get_or_create_detector(unique_key, item_type, mu0=mu0, base_uph=base_uph, monitoring_side=monitoring_side, penalty_strength=penalty_strength)
+        detector = self.get_or_create_detector(
+            unique_key, item_type, mu0=config.mu0, base_uph=config.base_uph,
+            monitoring_side=config.monitoring_side, penalty_strength=config.penalty_strength
+        )
+        return config, detector, current_time
+
+    def _finalize(self, config: EffectiveConfig, detector, is_alert: bool, item_name: str, item_type: str, value: float, uph: int, timestamp: Any, current_time: datetime.datetime, metadata: Dict):
+        """
+        检测后处理: 报警抑制、轨迹缓存
+        返回 (结果, 待写入的 DetectionRecord 字段)
+        """
+        # 检测是否需要推送 (报警抑制逻辑) - 使用 unique_key
+        unique_key = config.unique_key
+        if unique_key not in self._dirty:
+            self._dirty[unique_key] = self._batch_lsn
+        should_push = self._check_should_push(unique_key, config.cooldown_periods) if is_alert else False
+
+        # 直接读取检测器复用的计算快照，写入轨迹缓存的各列 (不构造状态字典)
+        calc = detector.calc
+        self.trajectories.append(
+            unique_key, timestamp, value, uph,
+            calc.baseline, calc.k, calc.threshold, calc.S_plus, calc.S_minus, calc.std,
+            alert=is_alert, push_executed=should_push, metadata=metadata
+        )
+
+        record = dict(
+            item_name=item_name,       # 数据库中保持原始 Item Name 方便查询
+            item_type=item_type,
+            station=metadata.get("station"),
+            product=metadata.get("product"),
+            line=metadata.get("line"),
+            timestamp=current_time,
+            value=value,
+            uph=uph,
+            baseline=calc.baseline,
+            std=calc.std,
+            k_value=calc.k,
+            h_value=calc.threshold,
+            s_plus=calc.S_plus,
+            s_minus=calc.S_minus,
+            is_alert=is_alert,
+            alert_side=calc.alert_side
+        )
+
+        result = {
+            "item_name": item_name,
+            "unique_key": unique_key, # 返回唯一键值供调试
+            "alert": is_alert,
+            "should_push": should_push,
+            "alert_side": calc.alert_side,
+            # 只有需要推送时才生成当前状态与 30 周期轨迹
+            "current_status": self.trajectories.latest(unique_key) if should_push else None,
+            "history_30_periods": self.trajectories.trajectory(unique_key) if should_push else None
+        }
+        return result, record
+
+    def _detect(self, item_name: str, item_type: str, value: float, uph: int, timestamp: Any, metadata: Dict, item_config: Dict = None):
+        """
+        执行单条数据的检测逻辑 (不含持久化)
+        返回 (结果, 待写入的 DetectionRecord 字段)
+        """
+        config, detector, current_time = self._prepare(item_name, item_type, timestamp, metadata, item_config)
         
         # 调用算法更新
         is_alert = detector.update(
@@ -158,85 +549,216 @@ class DetectionEngineManager:
             timestamp=current_time,
             line_state="normal"
         )
-        
-        # 获取当前计算详情
-        status = detector.get_current_status()
-        status['timestamp'] = timestamp
-        status['value'] = value
-        status['uph'] = uph
-        status['metadata'] = metadata
-        
-        # 检测是否需要推送 (报警抑制逻辑) - 使用 unique_key
-        should_push = False
-        if is_alert:
-            should_push = self._check_should_push(unique_key)
-            status['push_executed'] = should_push
-        else:
-            status['push_executed'] = False
+        return self._finalize(config, detector, is_alert, item_name, item_type, value, uph, timestamp, current_time, metadata)
 
-        # 存入轨迹缓存 - 使用 unique_key
-        self.history_cache[unique_key].append(status)
-        
-        # --- 数据持久化 (SQLite) ---
+    def _save_records(self, records: List[Dict]):
+        """
+        批量写入 DetectionRecord
+        - 设置了 record_writer 时放入写入队列，由后台线程按批量 / 时间间隔写入
+        - 否则在同一个事务中同步写入 (按记录日期写入对应分区)
+        """
+        if not records:
+            return
+        if self.record_writer is not None:
+            self.record_writer.submit(records)
+            return
         try:
-            db = SessionLocal()
-            record = DetectionRecord(
-                item_name=item_name,       # 数据库中保持原始 Item Name 方便查询
-                item_type=item_type,
-                station=metadata.get("station"),
-                product=metadata.get("product"),
-                line=metadata.get("line"),
-                timestamp=current_time,
-                value=value,
-                uph=uph,
-                baseline=status['baseline'],
-                std=status['calculation_details'].get('std', 0.0),
-                k_value=status['k_value'],
-                h_value=status['h_value'],
-                s_plus=status['S_plus'],
-                s_minus=status['S_minus'],
-                is_alert=is_alert,
-                alert_side=status['calculation_details'].get('alert_side')
-            )
-            db.add(record)
-            db.commit()
-            db.close()
+            RecordPartitions.for_engine(engine).write(records)
         except Exception as e:
-            print(f"[ERROR] Failed to save record: {e}")
-                
-        return {
-            "item_name": item_name,
-            "unique_key": unique_key, # 返回唯一键值供调试
-            "alert": is_alert,
-            "should_push": should_push,
-            "alert_side": status['calculation_details'].get('alert_side'),
-            "current_status": status,
-            "history": list(self.history_cache[unique_key])
+            print(f"[ERROR] Failed to save {len(records)} records: {e}")
+
+    def process_data(self, item_name: str, item_type: str, value: float, uph: int, timestamp: Any, metadata: Dict, item_config: Dict = None):
+        """
+        处理单条接入数据
+        """
+        with self._detect_lock:
+            lsn = self._log_readings([{
+                "item_name": item_name, "item_type": item_type, "value": value, "uph": uph,
+                "timestamp": timestamp, "metadata": metadata, "item_config": item_config
+            }])
+            result, record = self._detect(item_name, item_type, value, uph, timestamp, metadata, item_config)
+            self._applied_lsn = max(self._applied_lsn, lsn)
+        self._sync_log(lsn)
+
+        # --- 数据持久化 (SQLite) ---
+        self._save_records([record])
+        return result
+
+    def process_batch(self, readings: List[Dict]) -> List[Dict]:
+        """
+        批量处理接入数据
+        - readings: 每项包含 process_data 的参数 (item_name, item_type, value, uph, timestamp, metadata, item_config)
+        - 按顺序逐条检测 (同一 key 的多条数据保持先后顺序)
+        - 本次调用的 DetectionRecord 一起交给写入器 (未启用写入器时在同一个事务中写入)；
+          API 的批量接口按检测通道多次调用本方法，一个 HTTP 批次会分成多次写入
+        """
+        with self._detect_lock:
+            lsn = self._log_readings(readings)
+            if self.bank is not None:
+                results, records = self._detect_batch_vectorized(readings)
+            else:
+                results, records = self._detect_batch(readings)
+            self._applied_lsn = max(self._applied_lsn, lsn)
+        self._sync_log(lsn)
+        self._save_records(records)
+        return results
+
+    def _log_readings(self, readings: List[Dict]) -> int:
+        """检测前把接入数据追加到接入日志 (调用方持有检测锁，日志顺序即检测顺序)，返回最后一条的序号"""
+        if self.ingest_log is None or not readings:
+            return self._applied_lsn
+        self._batch_lsn = self.ingest_log.append(readings)
+        return self._batch_lsn + len(readings) - 1
+
+    def _sync_log(self, lsn: int):
+        """等待接入日志落盘后再返回结果 (在检测锁外，多个批次由一次 fsync 组提交)"""
+        if self.ingest_log is not None:
+            self.ingest_log.sync(lsn)
+
+    def replay_ingest_log(self, batch_size: int = REPLAY_BATCH) -> Dict[str, Any]:
+        """
+        启动时重放接入日志 (在 load_all_states 之后、预热与开始接入之前调用)
+        - 每个检测键只重放其已持久化状态 (数据库 / 状态文件中记录的序号) 之后的数据
+        - 只恢复检测器、轨迹缓存与报警抑制状态: 不重复写入检测记录，不推送报警
+        - 重放过的检测键标记为 dirty，由之后的检查点持久化
+        """
+        if self.ingest_log is None:
+            return {}
+        started = time.perf_counter()
+        # 日志目录被清空时，新序号必须大于已持久化的序号
+        persisted = max((state.get("lsn") or 0 for state in self.initial_states.values()), default=0)
+        if self.state_file is not None and len(self.state_file):
+            persisted = max(persisted, int(self.state_file.lsn.max()))
+        self.ingest_log.advance_to(persisted)
+
+        watermarks: Dict[str, int] = {}
+        pending: List[Dict] = []
+        pending_lsn = [0, 0]
+        replayed = skipped = 0
+
+        def flush():
+            with self._detect_lock:
+                self._batch_lsn = pending_lsn[0]
+                if self.bank is not None:
+                    self._detect_batch_vectorized(pending)
+                else:
+                    self._detect_batch(pending)
+                self._applied_lsn = max(self._applied_lsn, pending_lsn[1])
+            pending.clear()
+
+        for first_lsn, readings in self.ingest_log.read():
+            for lsn, reading in enumerate(readings, first_lsn):
+                config = reading["item_config"]
+                key = config.unique_key if isinstance(config, EffectiveConfig) else \
+                    self._generate_detector_key(reading["item_name"], reading["metadata"])
+                watermark = watermarks.get(key)
+                if watermark is None:
+                    watermark = watermarks[key] = self._persisted_lsn(key)
+                if lsn <= watermark:
+                    skipped += 1
+                    continue
+                if not pending:
+                    pending_lsn[0] = lsn
+                pending_lsn[1] = lsn
+                pending.append(reading)
+                replayed += 1
+                if len(pending) >= batch_size:
+                    flush()
+        if pending:
+            flush()
+        with self._detect_lock:
+            self._applied_lsn = max(self._applied_lsn, self.ingest_log.last_lsn)
+
+        self.replay_stats = {
+            "replayed": replayed,
+            "skipped": skipped,
+            "keys": len(watermarks),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
         }
+        return self.replay_stats
+
+    def _persisted_lsn(self, item_name: str) -> int:
+        """检测键已持久化状态包含的日志序号 (没有持久化状态时为 0)"""
+        state = self.initial_states.get(item_name)
+        if state is not None:
+            return state.get("lsn") or 0
+        if self.state_file is not None and item_name in self.state_file:
+            return self.state_file.lsn_of(item_name)
+        return 0
+
+    def _detect_batch(self, readings: List[Dict]):
+        """逐条检测一批数据，返回 (results, records)"""
+        results = []
+        records = []
+        for reading in readings:
+            try:
+                result, record = self._detect(
+                    item_name=reading["item_name"],
+                    item_type=reading["item_type"],
+                    value=reading["value"],
+                    uph=reading["uph"],
+                    timestamp=reading.get("timestamp"),
+                    metadata=reading.get("metadata") or {},
+                    item_config=reading.get("item_config")
+                )
+            except Exception as e:
+                results.append({"item_name": reading.get("item_name"), "error": str(e)})
+                continue
+            results.append(result)
+            records.append(record)
+        return results, records
+
+    def _detect_batch_vectorized(self, readings: List[Dict]):
+        """
+        向量化批处理
+        同一检测键在一批中出现多次时拆分为多个 tick (wave)，保证同一 key 的先后顺序；
+        每个 tick 内所有检测器通过 DetectorBank.update_tick 一次完成更新。
+        """
+        results: List[Optional[Dict]] = [None] * len(readings)
+        records: List[Optional[Dict]] = [None] * len(readings)
+        waves: List[List[tuple]] = []
+        occurrences: Dict[str, int] = {}
+
+        for idx, reading in enumerate(readings):
+            try:
+                metadata = reading.get("metadata") or {}
+                value = float(reading["value"])
+                uph = reading["uph"]
+                float(uph)
+                config, detector, current_time = self._prepare(
+                    reading["item_name"], reading["item_type"], reading.get("timestamp"), metadata, reading.get("item_config")
+                )
+            except Exception as e:
+                results[idx] = {"item_name": reading.get("item_name"), "error": str(e)}
+                continue
+            wave_no = occurrences.get(config.unique_key, 0)
+            occurrences[config.unique_key] = wave_no + 1
+            if wave_no == len(waves):
+                waves.append([])
+            waves[wave_no].append((idx, config, detector, value, uph, current_time, metadata))
 
-    def _check_should_push(self, item_key: str) -> bool:
+        for wave in waves:
+            alerts = self.bank.update_tick(
+                [entry[2].slot for entry in wave],
+                [entry[3] for entry in wave],
+                [entry[4] for entry in wave],
+                [entry[5] for entry in wave]
+            )
+            for (idx, config, detector, value, uph, current_time, metadata), is_alert in zip(wave, alerts):
+                reading = readings[idx]
+                results[idx], records[idx] = self._finalize(
+                    config, detector, bool(is_alert), reading["item_name"], reading["item_type"],
+                    reading["value"], uph, reading.get("timestamp"), current_time, metadata
+                )
+
+        return results, [r for r in records if r is not None]
+
+    def _check_should_push(self, item_key: str, cooldown_periods: int) -> bool:
         """
         报警抑制逻辑：如果在最近 N 个周期内已经执行过推送，则不再重复推送。
-        注意：item_key 现在的含义是 Unique Key
+        注意：item_key 现在的含义是 Unique Key，N 取自该检测键的生效配置 (EffectiveConfig.cooldown_periods)
         """
         if not self.enable_cooldown:
             return True
             
-        history_list = list(self.history_cache[item_key])
-        if not history_list:
-            return True
-            
-        # 查找最近 N 个周期 (动态配置)
-        # 配置仍然是基于原始 Item Name 的 (假定配置共享)
-        # 从 key 中提取原始 Item Name
-        original_item_name = item_key.split("::")[-1] if "::" in item_key else item_key
-        
-        cooldown_periods = self.global_config.get(f"cooldown_periods_{original_item_name}", 6)
-        check_range = min(len(history_list), cooldown_periods)
-        
-        for i in range(1, check_range + 1):
-            past_status = history_list[-i]
-            if past_status.get('push_executed'):
-                return False 
-                
-        return True
+        return not self.trajectories.recent_push(item_key, cooldown_periods)
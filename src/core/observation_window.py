@@ -0,0 +1,342 @@
+# observation_window.py
+import sys
+import collections
+import numpy as np
+from datetime import datetime
+from typing import Optional
+
+# 数据点标志位
+FLAG_ALERT = 1  # 异常点
+FLAG_LOW_UPH = 2  # 极低UPH点
+
+# 历史数据默认保留条数 (data_buffer / alert_points / low_uph_points / h_history)
+DEFAULT_HISTORY_RETENTION = 1000
+# 参数更新记录默认保留条数 (update_history)
+DEFAULT_UPDATE_HISTORY_RETENTION = 100
+
+# 尚未写入数据时的共享空容器 (写入第一条数据时才创建真正的容器，节省空闲检测器的内存)
+EMPTY_HISTORY = ()
+EMPTY_POINTS = frozenset()
+
+
+def _entry_bytes(entry) -> int:
+    """单条记录占用的字节数 (含元组 / 字典 / dataclass 的成员)"""
+    if isinstance(entry, tuple):
+        return sys.getsizeof(entry) + sum(sys.getsizeof(v) for v in entry)
+    if isinstance(entry, dict):
+        return sys.getsizeof(entry) + sum(sys.getsizeof(v) for v in entry.values())
+    slots = getattr(type(entry), "__slots__", None)
+    if slots:
+        return sys.getsizeof(entry) + sum(sys.getsizeof(getattr(entry, name, None)) for name in slots)
+    fields = getattr(entry, "__dict__", None)
+    if fields is not None:
+        return sys.getsizeof(entry) + sys.getsizeof(fields) + sum(sys.getsizeof(v) for v in fields.values())
+    return sys.getsizeof(entry)
+
+
+def container_bytes(container) -> int:
+    """
+    估算容器的保留内存 (字节)
+    以最新一条记录的大小乘以条数估算，避免逐条遍历
+    """
+    size = sys.getsizeof(container)
+    if container:
+        latest = container[-1] if isinstance(container, (list, collections.deque)) else next(iter(container))
+        size += len(container) * _entry_bytes(latest)
+    return size
+
+
+class WindowStats:
+    """
+    有效点的增量统计量 (个数 / 和 / 平方和)
+
+    采用平移数据 (shifted data) 方式保存以减少浮点误差。
+    """
+
+    __slots__ = ("shift", "count", "sum", "sumsq")
+
+    def __init__(self):
+        self.shift = 0.0
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    def add(self, value: float):
+        d = value - self.shift
+        self.count += 1
+        self.sum += d
+        self.sumsq += d * d
+
+    def remove(self, value: float):
+        d = value - self.shift
+        self.count -= 1
+        self.sum -= d
+        self.sumsq -= d * d
+
+    def reset(self, values: np.ndarray):
+        """用数组运算精确重算 (以当前均值作为新的平移量，使平方和的相消误差最小)"""
+        if len(values) == 0:
+            self.count = 0
+            self.sum = 0.0
+            self.sumsq = 0.0
+            return
+        self.shift = float(np.mean(values))
+        d = values - self.shift
+        self.count = int(len(values))
+        self.sum = float(np.sum(d))
+        self.sumsq = float(np.dot(d, d))
+
+    def mean(self) -> Optional[float]:
+        """有效点均值 (O(1))"""
+        if self.count == 0:
+            return None
+        return self.shift + self.sum / self.count
+
+    def std(self) -> Optional[float]:
+        """有效点总体标准差 (与 np.std 一致, ddof=0, O(1))"""
+        if self.count == 0:
+            return None
+        mean_d = self.sum / self.count
+        variance = self.sumsq / self.count - mean_d * mean_d
+        return float(np.sqrt(variance)) if variance > 0 else 0.0
+
+
+class ObservationWindow:
+    """
+    检测器的共享观测窗口 (Ring Buffer)
+
+    同一个检测器的 AdaptiveBaseline 与 AdaptiveKUpdater 读取同一份窗口数据：
+    - 数据点按时间顺序写入预分配的 NumPy 数组，超出窗口大小时覆盖最早的数据 (O(1))
+    - 异常点使其前后 radius 个点无效；极低UPH点对基准只剔除自身，对 K 值同时剔除其前后 radius 个点。
+      两类邻域通过覆盖计数 (coverage) 增量维护
+    - 两种剔除口径各维护一份增量统计量 (baseline_stats / k_stats)，均值 / 标准差可在 O(1) 内取得
+
+    每写入 window_size 个点会用数组运算重新精确计算一次统计量。
+    窗口数组在写入第一个点时才分配，未接收数据的检测器不占用窗口内存。
+    """
+
+    __slots__ = (
+        "window_size", "invalid_points_around_alert", "history_retention",
+        "values", "flags", "alert_coverage", "low_uph_coverage", "start", "count",
+        "baseline_stats", "k_stats", "last_timestamp", "total_pushed", "_last_source_seq",
+        "data_buffer", "data_seq", "alert_points", "low_uph_points",
+    )
+
+    def __init__(
+        self,
+        window_size: int = 700,
+        invalid_points_around_alert: int = 10,  # 异常点 (以及 K 值口径下极低UPH点) 前后的无效点数
+        history_retention: int = DEFAULT_HISTORY_RETENTION,  # 完整数据保留条数
+    ):
+        self.window_size = window_size
+        self.invalid_points_around_alert = invalid_points_around_alert
+        self.history_retention = history_retention
+
+        # 窗口数组 (首次写入时分配，见 _allocate)
+        self.values = None
+        self.flags = None
+        self.alert_coverage = None  # 被多少个异常点的邻域覆盖
+        self.low_uph_coverage = None  # 被多少个极低UPH点的邻域覆盖
+        self.start = 0  # 最早数据点的物理位置
+        self.count = 0  # 当前窗口中的数据点数
+
+        self.baseline_stats = WindowStats()  # 剔除: 异常点邻域 + 极低UPH点自身
+        self.k_stats = WindowStats()  # 剔除: 异常点邻域 + 极低UPH点邻域
+
+        self.last_timestamp = None  # 窗口中最新数据点的时间
+        self.total_pushed = 0
+        self._last_source_seq = -1  # 最近一个异常/低UPH点的写入序号
+
+        # 最近 history_retention 条完整数据 (两个更新器共用一份)
+        # alert_points / low_uph_points 保存的是写入序号 (data_seq)，超出保留范围的序号随之淘汰
+        self.data_buffer = EMPTY_HISTORY
+        self.data_seq = 0  # 下一条完整数据的写入序号
+        self.alert_points = EMPTY_POINTS
+        self.low_uph_points = EMPTY_POINTS
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _allocate(self) -> None:
+        self.values = np.zeros(self.window_size, dtype=np.float64)
+        self.flags = np.zeros(self.window_size, dtype=np.uint8)
+        self.alert_coverage = np.zeros(self.window_size, dtype=np.int16)
+        self.low_uph_coverage = np.zeros(self.window_size, dtype=np.int16)
+
+    def _pos(self, i: int) -> int:
+        """窗口中第 i 个 (按时间顺序) 数据点的物理位置"""
+        return (self.start + i) % self.window_size
+
+    # ------------------------------------------------------------------
+    # 有效性维护
+    # ------------------------------------------------------------------
+    def _validity(self, pos: int):
+        """(基准口径是否有效, K 值口径是否有效)"""
+        base_valid = not self.flags[pos] and self.alert_coverage[pos] == 0
+        return base_valid, base_valid and self.low_uph_coverage[pos] == 0
+
+    def _apply(self, pos: int, before, after):
+        value = self.values[pos]
+        if before[0] != after[0]:
+            if after[0]:
+                self.baseline_stats.add(value)
+            else:
+                self.baseline_stats.remove(value)
+        if before[1] != after[1]:
+            if after[1]:
+                self.k_stats.add(value)
+            else:
+                self.k_stats.remove(value)
+
+    def _cover(self, pos: int, coverage: np.ndarray, delta: int):
+        before = self._validity(pos)
+        coverage[pos] += delta
+        self._apply(pos, before, self._validity(pos))
+
+    # ------------------------------------------------------------------
+    # 写入 / 淘汰
+    # ------------------------------------------------------------------
+    def add(self, timestamp: datetime, defect_rate: float, current_uph: float,
+            is_alert: bool, is_low_uph: bool) -> None:
+        """写入一个新数据点 (每个检测器每个数据点只写入一次)"""
+        # 记录完整数据 (有界，超出保留条数时淘汰最早的数据及其标记)
+        current_idx = self.data_seq
+        expired_idx = current_idx - self.history_retention
+        if expired_idx >= 0:
+            if self.alert_points:
+                self.alert_points.discard(expired_idx)
+            if self.low_uph_points:
+                self.low_uph_points.discard(expired_idx)
+        if self.data_buffer is EMPTY_HISTORY:
+            self.data_buffer = collections.deque(maxlen=self.history_retention)
+        self.data_buffer.append((timestamp, defect_rate, current_uph))
+        self.data_seq += 1
+        if is_alert:
+            self.set_alert(current_idx, True)
+        if is_low_uph:
+            if self.low_uph_points is EMPTY_POINTS:
+                self.low_uph_points = set()
+            self.low_uph_points.add(current_idx)
+
+        self.push(defect_rate, is_alert=is_alert, is_low_uph=is_low_uph)
+        self.last_timestamp = timestamp
+
+    def set_alert(self, index: int, is_alert: bool) -> None:
+        """标记 / 取消标记指定写入序号的异常状态"""
+        if is_alert:
+            if self.alert_points is EMPTY_POINTS:
+                self.alert_points = set()
+            self.alert_points.add(index)
+        elif self.alert_points:
+            self.alert_points.discard(index)
+
+    def push(self, value: float, is_alert: bool = False, is_low_uph: bool = False) -> None:
+        """写入窗口 (超出窗口大小时自动覆盖最早的数据，无效区间增量标记)"""
+        if self.count == self.window_size:
+            self._evict_oldest()
+
+        if self.total_pushed == 0:
+            if self.values is None:
+                self._allocate()
+            self.baseline_stats.shift = float(value)
+            self.k_stats.shift = float(value)
+
+        radius = self.invalid_points_around_alert
+        idx = self.count
+        pos = self._pos(idx)
+        flag = (FLAG_ALERT if is_alert else 0) | (FLAG_LOW_UPH if is_low_uph else 0)
+        self.values[pos] = value
+        self.flags[pos] = flag
+        self.count += 1
+
+        # 之前的异常/低UPH点对新点的覆盖 (只需回看最近 radius 个点)
+        alert_coverage = 0
+        low_uph_coverage = 0
+        if self.total_pushed - self._last_source_seq <= radius:
+            for back in range(1, min(radius, idx) + 1):
+                prev_flag = self.flags[self._pos(idx - back)]
+                if prev_flag & FLAG_ALERT:
+                    alert_coverage += 1
+                if prev_flag & FLAG_LOW_UPH:
+                    low_uph_coverage += 1
+        self.alert_coverage[pos] = alert_coverage
+        self.low_uph_coverage[pos] = low_uph_coverage
+        if not flag and not alert_coverage:
+            # 常见情况: 正常点直接计入统计量
+            self.baseline_stats.add(value)
+            if not low_uph_coverage:
+                self.k_stats.add(value)
+
+        # 新的异常/低UPH点覆盖其之前的点
+        if flag:
+            for back in range(1, min(radius, idx) + 1):
+                prev = self._pos(idx - back)
+                if flag & FLAG_ALERT:
+                    self._cover(prev, self.alert_coverage, 1)
+                if flag & FLAG_LOW_UPH:
+                    self._cover(prev, self.low_uph_coverage, 1)
+            self._last_source_seq = self.total_pushed
+
+        self.total_pushed += 1
+        if self.total_pushed % self.window_size == 0:
+            self.resync()
+
+    def _evict_oldest(self) -> None:
+        pos = self.start
+        flag = self.flags[pos]
+        if not flag and not self.alert_coverage[pos]:
+            value = self.values[pos]
+            self.baseline_stats.remove(value)
+            if not self.low_uph_coverage[pos]:
+                self.k_stats.remove(value)
+        # 被淘汰的异常/低UPH点不再覆盖其之后的点
+        if flag:
+            for fwd in range(1, min(self.invalid_points_around_alert, self.count - 1) + 1):
+                nxt = self._pos(fwd)
+                if flag & FLAG_ALERT:
+                    self._cover(nxt, self.alert_coverage, -1)
+                if flag & FLAG_LOW_UPH:
+                    self._cover(nxt, self.low_uph_coverage, -1)
+        self.flags[pos] = 0
+        self.alert_coverage[pos] = 0
+        self.low_uph_coverage[pos] = 0
+        self.start = (self.start + 1) % self.window_size
+        self.count -= 1
+
+    def resync(self) -> None:
+        """用数组运算重新计算统计量 (消除增量误差累积)"""
+        values = self.ordered_values()
+        self.baseline_stats.reset(values[self.baseline_valid_mask()])
+        self.k_stats.reset(values[self.k_valid_mask()])
+
+    def memory_usage(self) -> int:
+        """窗口保留的内存 (字节, 估算)"""
+        arrays = 0
+        if self.values is not None:
+            arrays = self.values.nbytes + self.flags.nbytes + self.alert_coverage.nbytes + self.low_uph_coverage.nbytes
+        return (
+            sys.getsizeof(self) + arrays
+            + container_bytes(self.data_buffer)
+            + container_bytes(self.alert_points)
+            + container_bytes(self.low_uph_points)
+        )
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _ordered(self, array: Optional[np.ndarray]) -> np.ndarray:
+        if array is None:
+            return np.zeros(0)
+        return np.roll(array, -self.start)[:self.count]
+
+    def ordered_values(self) -> np.ndarray:
+        """按时间顺序返回窗口中的数据"""
+        return self._ordered(self.values)
+
+    def baseline_valid_mask(self) -> np.ndarray:
+        """按时间顺序返回基准口径的有效点掩码"""
+        return (self._ordered(self.flags) == 0) & (self._ordered(self.alert_coverage) == 0)
+
+    def k_valid_mask(self) -> np.ndarray:
+        """按时间顺序返回 K 值口径的有效点掩码"""
+        return self.baseline_valid_mask() & (self._ordered(self.low_uph_coverage) == 0)
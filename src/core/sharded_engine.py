@@ -0,0 +1,315 @@
+import os
+import zlib
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Optional
+from .manager import DetectionEngineManager
+from .ingest_log import IngestLog
+from .effective_config import EffectiveConfig, generate_detector_key
+
+# 分片进程可被调用的管理器方法
+SHARD_METHODS = {
+    "process_data", "process_batch", "prewarm_detectors", "remove_detector",
+    "update_detector_config", "update_global_config", "load_all_states", "save_all_states",
+    "checkpoint_dirty", "dirty_count", "save_state_file", "replay_ingest_log", "get_ingest_log_metrics", "detector_count", "get_status", "get_memory_usage", "get_writer_metrics",
+}
+
+
+def shard_of(unique_key: str, num_shards: int) -> int:
+    """检测键所属的分片 (crc32 取模，跨进程稳定)"""
+    return zlib.crc32(unique_key.encode("utf-8")) % num_shards
+
+
+def shard_state_file(path: Optional[str], index: int, num_shards: int) -> Optional[str]:
+    """每个分片独立的状态文件 (分片数变化后文件名不同，回退为从数据库恢复)"""
+    return f"{path}.{index}-of-{num_shards}" if path else path
+
+
+class _ShardKeyFilter:
+    """load_all_states 的键过滤器 (只保留本分片负责的检测键)"""
+    __slots__ = ("index", "num_shards")
+
+    def __init__(self, index: int, num_shards: int):
+        self.index = index
+        self.num_shards = num_shards
+
+    def __call__(self, key: str) -> bool:
+        return shard_of(key, self.num_shards) == self.index
+
+
+def _shard_main(conn, index: int, num_shards: int, global_config: Dict[str, Any], writer_options: Optional[Dict],
+                wal_options: Optional[Dict] = None):
+    """分片进程入口: 独立的 DetectionEngineManager，按管道收到的顺序逐个执行请求"""
+    manager = DetectionEngineManager(global_config)
+    if writer_options is not None:
+        from ..db.record_writer import RecordWriter
+        manager.record_writer = RecordWriter(**writer_options)
+    if wal_options is not None:
+        # 每个分片独立的日志目录
+        options = dict(wal_options, directory=os.path.join(wal_options["directory"], f"shard-{index}-of-{num_shards}"))
+        manager.ingest_log = IngestLog(**options)
+    manager.start()
+    conn.send((True, "ready"))
+
+    while True:
+        try:
+            method, args, kwargs = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if method == "stop":
+            manager.stop()
+            conn.send((True, None))
+            break
+        try:
+            if method not in SHARD_METHODS:
+                raise AttributeError(f"Unsupported shard method: {method}")
+            if method == "load_all_states":
+                kwargs = {"key_filter": _ShardKeyFilter(index, num_shards),
+                          "state_file": shard_state_file(kwargs.get("state_file"), index, num_shards)}
+            elif method == "save_state_file":
+                args = (shard_state_file(args[0], index, num_shards),)
+            result = getattr(manager, method)(*args, **kwargs)
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+class ShardedDetectionEngine:
+    """
+    分片多进程检测引擎
+
+    - 检测键按 crc32 分配到 num_shards 个子进程，每个子进程持有自己的
+      DetectionEngineManager (检测器、30 周期轨迹、报警抑制状态、检测记录写入器)
+    - API 进程通过管道把数据路由到所属分片；分片按收到顺序处理，同一检测键的先后顺序不变，
+      报警 / 报警抑制逻辑与单进程完全相同
+    - 批量数据按分片拆分后同时发给各分片，各进程并行检测，再按输入顺序合并结果
+    - 对外提供与 DetectionEngineManager 相同的接口 (供 API 层直接替换)
+    """
+
+    def __init__(self, global_config: Dict[str, Any], num_shards: int = 2, writer_options: Optional[Dict] = None,
+                 wal_options: Optional[Dict] = None):
+        self.global_config = global_config
+        self.engine_mode = "sharded"
+        self.num_shards = max(1, int(num_shards))
+        self.writer_options = writer_options
+        self.wal_options = wal_options
+        self._conns: List[Any] = []
+        self._processes: List[multiprocessing.Process] = []
+        # 每个分片一把锁: 一次请求-响应在管道上必须成对完成
+        self._locks = [threading.Lock() for _ in range(self.num_shards)]
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._processes:
+            return
+        # spawn: API 进程中已有线程 (写入器 / 线程池)，fork 不安全
+        ctx = multiprocessing.get_context("spawn")
+        for index in range(self.num_shards):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_shard_main,
+                args=(child_conn, index, self.num_shards, self.global_config, self.writer_options, self.wal_options),
+                name=f"detection-shard-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+        # 等待各分片完成初始化 (导入依赖、创建管理器)，启动失败时在此处暴露
+        for index, conn in enumerate(self._conns):
+            try:
+                conn.recv()
+            except EOFError:
+                raise RuntimeError(f"Shard {index} failed to start")
+
+    def stop(self, timeout: float = 30.0):
+        """通知各分片写完剩余检测记录后退出"""
+        for index, conn in enumerate(self._conns):
+            try:
+                self._call(index, "stop")
+            except Exception as e:
+                print(f"[ERROR] Failed to stop shard {index}: {e}")
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._conns = []
+        self._processes = []
+
+    # ------------------------------------------------------------------
+    # 通信
+    # ------------------------------------------------------------------
+    def _call(self, index: int, method: str, *args, **kwargs) -> Any:
+        return self._call_many({index: (method, args, kwargs)})[index]
+
+    def _call_many(self, calls: Dict[int, tuple]) -> Dict[int, Any]:
+        """向多个分片同时发送请求 {index: (method, args, kwargs)}，各分片并行执行后收集结果"""
+        if not self._conns:
+            raise RuntimeError("Sharded engine is not started")
+        indices = sorted(calls)  # 固定加锁顺序，避免死锁
+        for index in indices:
+            self._locks[index].acquire()
+        try:
+            for index in indices:
+                self._conns[index].send(calls[index])
+            replies = {index: self._conns[index].recv() for index in indices}
+        finally:
+            for index in indices:
+                self._locks[index].release()
+
+        results = {}
+        for index, (ok, result) in replies.items():
+            if not ok:
+                raise RuntimeError(f"Shard {index}: {result}")
+            results[index] = result
+        return results
+
+    def _broadcast(self, method: str, *args, **kwargs) -> List[Any]:
+        results = self._call_many({index: (method, args, kwargs) for index in range(self.num_shards)})
+        return [results[index] for index in range(self.num_shards)]
+
+    def shard_of(self, unique_key: str) -> int:
+        return shard_of(unique_key, self.num_shards)
+
+    def _shard_of_reading(self, item_name: str, metadata: Dict, item_config) -> int:
+        # 接口层已解析生效配置时直接使用其中的检测键
+        if isinstance(item_config, EffectiveConfig):
+            return self.shard_of(item_config.unique_key)
+        return self.shard_of(generate_detector_key(item_name, metadata))
+
+    # ------------------------------------------------------------------
+    # 检测
+    # ------------------------------------------------------------------
+    def _generate_detector_key(self, item_name: str, metadata: Dict) -> str:
+        return generate_detector_key(item_name, metadata)
+
+    def process_data(self, item_name: str, item_type: str, value: float, uph: int, timestamp: Any, metadata: Dict, item_config: Dict = None):
+        index = self._shard_of_reading(item_name, metadata, item_config)
+        return self._call(index, "process_data", item_name, item_type, value, uph, timestamp, metadata, item_config)
+
+    def process_batch(self, readings: List[Dict]) -> List[Dict]:
+        """按分片拆分批量数据，各分片并行处理后按输入顺序返回结果"""
+        groups: Dict[int, List[int]] = {}
+        for idx, reading in enumerate(readings):
+            index = self._shard_of_reading(reading["item_name"], reading.get("metadata") or {}, reading.get("item_config"))
+            groups.setdefault(index, []).append(idx)
+
+        replies = self._call_many({
+            index: ("process_batch", ([readings[i] for i in indices],), {})
+            for index, indices in groups.items()
+        })
+        results: List[Optional[Dict]] = [None] * len(readings)
+        for index, indices in groups.items():
+            for idx, result in zip(indices, replies[index]):
+                results[idx] = result
+        return results
+
+    # ------------------------------------------------------------------
+    # 检测器管理
+    # ------------------------------------------------------------------
+    def prewarm_detectors(self, configs: Dict[str, Dict]) -> int:
+        groups: Dict[int, Dict[str, Dict]] = {}
+        for key, cfg in configs.items():
+            groups.setdefault(self.shard_of(key), {})[key] = cfg
+        if not groups:
+            return 0
+        replies = self._call_many({index: ("prewarm_detectors", (cfg,), {}) for index, cfg in groups.items()})
+        return sum(replies.values())
+
+    def remove_detector(self, item_name: str):
+        self._call(self.shard_of(item_name), "remove_detector", item_name)
+
+    def update_detector_config(self, item_name: str, update_data: Dict[str, Any]) -> bool:
+        return self._call(self.shard_of(item_name), "update_detector_config", item_name, update_data)
+
+    def update_global_config(self, update_data: Dict[str, Any]):
+        self.global_config.update(update_data)
+        self._broadcast("update_global_config", update_data)
+
+    def load_all_states(self, state_file: Optional[str] = None) -> int:
+        return sum(self._broadcast("load_all_states", state_file=state_file))
+
+    def save_state_file(self, path: str) -> int:
+        return sum(self._broadcast("save_state_file", path))
+
+    def replay_ingest_log(self) -> Dict[str, Any]:
+        shards = self._broadcast("replay_ingest_log")
+        if self.wal_options is None:
+            return {}
+        return {
+            "replayed": sum(stats["replayed"] for stats in shards),
+            "skipped": sum(stats["skipped"] for stats in shards),
+            "keys": sum(stats["keys"] for stats in shards),
+            "duration_ms": max(stats["duration_ms"] for stats in shards),
+        }
+
+    def save_all_states(self) -> int:
+        return sum(self._broadcast("save_all_states"))
+
+    def checkpoint_dirty(self, fraction: float = 1.0) -> int:
+        return sum(self._broadcast("checkpoint_dirty", fraction))
+
+    def dirty_count(self) -> int:
+        return sum(self._broadcast("dirty_count"))
+
+    # ------------------------------------------------------------------
+    # 监控
+    # ------------------------------------------------------------------
+    def detector_count(self) -> int:
+        return sum(self._broadcast("detector_count"))
+
+    def get_status(self) -> Dict[str, Dict]:
+        stats = {}
+        for shard_stats in self._broadcast("get_status"):
+            stats.update(shard_stats)
+        return stats
+
+    def get_memory_usage(self, top: int = 0, offset: int = 0) -> Dict[str, Any]:
+        # 每个分片返回自己占用最多的 offset + top 个检测键，合并后再取第 offset 个之后的 top 个
+        shards = self._broadcast("get_memory_usage", offset + top)
+        components: Dict[str, int] = {}
+        for usage in shards:
+            for part, size in usage["components"].items():
+                components[part] = components.get(part, 0) + size
+        detectors = sorted((d for usage in shards for d in usage["detectors"]),
+                           key=lambda d: (d["total"], d["key"]), reverse=True)[offset:offset + top]
+        return {
+            "engine_mode": self.engine_mode,
+            "num_shards": self.num_shards,
+            "shard_engine_mode": shards[0]["engine_mode"],
+            "history_retention": shards[0]["history_retention"],
+            "update_history_retention": shards[0]["update_history_retention"],
+            "detector_count": sum(usage["detector_count"] for usage in shards),
+            "shared_bytes": sum(usage["shared_bytes"] for usage in shards),
+            "total_bytes": sum(usage["total_bytes"] for usage in shards),
+            "components": components,
+            "detectors": detectors,
+        }
+
+    def get_ingest_log_metrics(self) -> Optional[Dict]:
+        if self.wal_options is None:
+            return None
+        shards = self._broadcast("get_ingest_log_metrics")
+        return {
+            "segments": sum(m["segments"] for m in shards),
+            "bytes": sum(m["bytes"] for m in shards),
+            "total_records": sum(m["total_records"] for m in shards),
+            "shards": shards,
+        }
+
+    def get_writer_metrics(self) -> Optional[Dict]:
+        if self.writer_options is None:
+            return None
+        shards = self._broadcast("get_writer_metrics")
+        return {
+            "backlog": sum(m["backlog"] for m in shards),
+            "total_written": sum(m["total_written"] for m in shards),
+            "total_failed": sum(m["total_failed"] for m in shards),
+            "shards": shards,
+        }
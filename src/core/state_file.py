@@ -0,0 +1,202 @@
+# state_file.py
+"""
+检测器状态文件 (启动镜像)
+
+所有检测器的完整快照按定长布局保存，启动时直接 mmap，检测器在首次访问时才从映射的数组中恢复，
+不需要逐行读取数据库或逐个构造检测器。
+
+布局:
+    [0, 4096)       文件头 (magic + JSON: 版本、窗口参数、条数、写入时间、各段偏移)
+    head            HEAD_DTYPE 定长记录数组 (count 条)
+    lsn             int64[count]   快照已包含的接入日志序号 (重放时跳过 <= 该序号的数据)
+    values          float64[count, window_size]   按时间顺序，只有前 head.count 个有效
+    flags           uint8[count, window_size]
+    alert_coverage  int16[count, window_size]
+    low_uph_coverage int16[count, window_size]
+    keys            JSON 列表 (第 i 个检测键对应第 i 条记录)
+各段按 64 字节对齐。写入临时文件后原子替换。
+"""
+import os
+import json
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+from .detector_snapshot import HEAD_DTYPE, ARRAY_DTYPES, DetectorSnapshot, snapshot_head, snapshot_from_head
+
+
+STATE_FILE_MAGIC = b"DSTATE\x00\x01"
+STATE_FILE_VERSION = 2
+_HEADER_SIZE = 4096
+_ALIGN = 64
+_SECTIONS = ("values", "flags", "alert_coverage", "low_uph_coverage")
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _layout(capacity: int, window_size: int) -> Tuple[Dict[str, int], int]:
+    """各段的偏移与数组区域的结束位置"""
+    offsets = {"head": _HEADER_SIZE}
+    offsets["lsn"] = _align(_HEADER_SIZE + capacity * HEAD_DTYPE.itemsize)
+    end = offsets["lsn"] + capacity * 8
+    for name, dtype in zip(_SECTIONS, ARRAY_DTYPES):
+        offsets[name] = _align(end)
+        end = offsets[name] + capacity * window_size * dtype.itemsize
+    return offsets, end
+
+
+class StateFile:
+    """只读映射的状态文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            prelude = f.read(_HEADER_SIZE)
+            if prelude[:len(STATE_FILE_MAGIC)] != STATE_FILE_MAGIC:
+                raise ValueError(f"Not a detector state file: {path}")
+            header = json.loads(prelude[len(STATE_FILE_MAGIC):].rstrip(b"\x00"))
+            if header["version"] != STATE_FILE_VERSION:
+                raise ValueError(f"Unsupported state file version {header['version']}")
+            f.seek(header["keys_offset"])
+            keys = json.loads(f.read(header["keys_length"]))
+
+        self.window_params = (header["window_size"], header["invalid_points_around_alert"])
+        self.written_at = datetime.fromisoformat(header["written_at"])  # UTC (与 ItemState.updated_at 一致)
+        self.index: Dict[str, int] = {key: i for i, key in enumerate(keys)}
+        count, capacity, window_size = len(keys), header["capacity"], header["window_size"]
+        offsets = header["offsets"]
+        if count == 0:
+            self.head = np.zeros(0, dtype=HEAD_DTYPE)
+            self.lsn = np.zeros(0, dtype=np.int64)
+            self.arrays = tuple(np.zeros((0, window_size), dtype=dtype) for dtype in ARRAY_DTYPES)
+            return
+        # 按普通 ndarray 视图访问 (避免 np.memmap 子类在每次切片时的额外开销)
+        self.head = np.memmap(path, dtype=HEAD_DTYPE, mode="r", offset=offsets["head"], shape=(capacity,)).view(np.ndarray)
+        self.lsn = np.memmap(path, dtype=np.int64, mode="r", offset=offsets["lsn"], shape=(capacity,)).view(np.ndarray)
+        self.arrays = tuple(
+            np.memmap(path, dtype=dtype, mode="r", offset=offsets[name], shape=(capacity, window_size)).view(np.ndarray)
+            for name, dtype in zip(_SECTIONS, ARRAY_DTYPES)
+        )
+
+    @classmethod
+    def open(cls, path: str) -> Optional["StateFile"]:
+        """文件不存在或格式不符时返回 None (回退为从数据库恢复)"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"[WARN] Ignoring state file {path}: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def discard(self, key: str):
+        """检测键被删除后不再从文件恢复"""
+        self.index.pop(key, None)
+
+    def read(self, key: str) -> DetectorSnapshot:
+        """读取一个检测器的快照 (只有访问到的页会从磁盘载入)"""
+        i = self.index[key]
+        head = self.head[i].item()
+        count = head[38]
+        return snapshot_from_head(head, tuple(array[i, :count] for array in self.arrays), self.window_params)
+
+    def lsn_of(self, key: str) -> int:
+        """该检测器的快照已包含的接入日志序号"""
+        return int(self.lsn[self.index[key]])
+
+
+class StateFileWriter:
+    """
+    写入状态文件: 预分配 capacity 条记录，逐条 append 后 commit (写入临时文件，完成后原子替换)
+    """
+
+    def __init__(self, path: str, capacity: int, window_params: Tuple[int, int], written_at: datetime):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.capacity = max(1, capacity)
+        self.window_params = tuple(window_params)
+        self.written_at = written_at
+        self.keys = []
+        window_size = self.window_params[0]
+        self.offsets, end = _layout(self.capacity, window_size)
+        self.keys_offset = _align(end)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(self.tmp_path, "wb") as f:
+            f.truncate(self.keys_offset)
+        self._maps = [np.memmap(self.tmp_path, dtype=HEAD_DTYPE, mode="r+",
+                                offset=self.offsets["head"], shape=(self.capacity,))]
+        self._maps.append(np.memmap(self.tmp_path, dtype=np.int64, mode="r+",
+                                    offset=self.offsets["lsn"], shape=(self.capacity,)))
+        self._maps += [
+            np.memmap(self.tmp_path, dtype=dtype, mode="r+", offset=self.offsets[name],
+                      shape=(self.capacity, window_size))
+            for name, dtype in zip(_SECTIONS, ARRAY_DTYPES)
+        ]
+        self.head = self._maps[0].view(np.ndarray)
+        self.lsn = self._maps[1].view(np.ndarray)
+        self.arrays = tuple(m.view(np.ndarray) for m in self._maps[2:])
+
+    def append(self, key: str, snapshot: DetectorSnapshot, lsn: int = 0):
+        if tuple(snapshot.window_params) != self.window_params:
+            raise ValueError(f"Snapshot window {snapshot.window_params} does not match state file")
+        i = len(self.keys)
+        self.head[i] = snapshot_head(snapshot)
+        self.lsn[i] = lsn
+        for target, source in zip(self.arrays, snapshot.arrays):
+            target[i, :len(source)] = source
+        self.keys.append(key)
+
+    def copy_from(self, key: str, source: StateFile):
+        """从旧文件原样复制一条记录 (未被访问过的检测器不需要解码)"""
+        j = source.index[key]
+        i = len(self.keys)
+        self.head[i] = source.head[j]
+        self.lsn[i] = source.lsn[j]
+        count = int(source.head[j]["count"])
+        for target, array in zip(self.arrays, source.arrays):
+            target[i, :count] = array[j, :count]
+        self.keys.append(key)
+
+    def commit(self) -> int:
+        for mapped in self._maps:
+            mapped.flush()
+        self._maps = self.head = self.lsn = self.arrays = None
+
+        keys_blob = json.dumps(self.keys, ensure_ascii=False).encode("utf-8")
+        header = json.dumps({
+            "version": STATE_FILE_VERSION,
+            "window_size": self.window_params[0],
+            "invalid_points_around_alert": self.window_params[1],
+            "capacity": self.capacity,
+            "written_at": self.written_at.isoformat(),
+            "offsets": self.offsets,
+            "keys_offset": self.keys_offset,
+            "keys_length": len(keys_blob),
+        }).encode("utf-8")
+        if len(STATE_FILE_MAGIC) + len(header) > _HEADER_SIZE:
+            raise ValueError("State file header too large")
+        with open(self.tmp_path, "r+b") as f:
+            f.write(STATE_FILE_MAGIC + header)
+            f.seek(self.keys_offset)
+            f.write(keys_blob)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.tmp_path, self.path)
+        return len(self.keys)
+
+    def abort(self):
+        self._maps = self.head = self.lsn = self.arrays = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
@@ -0,0 +1,185 @@
+# trajectory_store.py
+import sys
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+
+class TrajectoryStore:
+    """
+    最近 N 周期历史轨迹缓存 (按字段存储的二维环形数组)
+
+    每个字段一个 (检测键数, N) 的 NumPy 数组，检测键对应一行 (slot)；
+    每行是一个长度为 N 的环形缓冲，写入一个周期只是对各列做标量赋值，不再为每个周期构造状态字典。
+    时间戳按调用方传入的原值保存 (object 列)，推送 / 看板需要时再按时间顺序取出。
+    """
+
+    FLOAT_FIELDS = ("value", "uph", "baseline", "k_value", "h_value", "S_plus", "S_minus", "std")
+    BOOL_FIELDS = ("alert", "push_executed")
+
+    def __init__(self, periods: int = 30, capacity: int = 1024):
+        self.periods = periods
+        self.capacity = 0
+        self.slots: Dict[str, int] = {}
+        self.head: List[int] = []  # 每行下一个写入位置
+        self.count: List[int] = []  # 每行已写入的周期数
+        self.metadata: List[Optional[Dict]] = []
+        self._free_slots: List[int] = []
+        self._allocate(max(1, capacity))
+
+    # ------------------------------------------------------------------
+    # 存储管理
+    # ------------------------------------------------------------------
+    def _allocate(self, capacity: int):
+        """扩容所有列 (按 2 倍增长)"""
+        def grow(name, dtype):
+            new = np.zeros((capacity, self.periods), dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:len(old)] = old
+            setattr(self, name, new)
+
+        for name in self.FLOAT_FIELDS:
+            grow(name, np.float64)
+        for name in self.BOOL_FIELDS:
+            grow(name, np.bool_)
+        grow("timestamp", object)
+        extra = capacity - self.capacity
+        self.head.extend([0] * extra)
+        self.count.extend([0] * extra)
+        self.metadata.extend([None] * extra)
+        self.capacity = capacity
+
+    def add_key(self, key: str) -> int:
+        """注册检测键并返回其行号 (已存在时直接返回)"""
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self.slots)
+            if slot >= self.capacity:
+                self._allocate(self.capacity * 2)
+        self.head[slot] = 0
+        self.count[slot] = 0
+        self.timestamp[slot] = None
+        self.metadata[slot] = None
+        self.slots[key] = slot
+        return slot
+
+    def remove_key(self, key: str):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.timestamp[slot] = None
+        self.metadata[slot] = None
+        self._free_slots.append(slot)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.slots
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def keys(self):
+        return self.slots.keys()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def append(self, key: str, timestamp: Any, value: float, uph: float, baseline: float,
+               k_value: float, h_value: float, S_plus: float, S_minus: float, std: float,
+               alert: bool, push_executed: bool, metadata: Optional[Dict] = None):
+        """写入一个周期 (超出 N 个周期时覆盖最早的一个)"""
+        slot = self.slots[key]
+        pos = self.head[slot]
+        self.timestamp[slot, pos] = timestamp
+        self.value[slot, pos] = value
+        self.uph[slot, pos] = uph
+        self.baseline[slot, pos] = baseline
+        self.k_value[slot, pos] = k_value
+        self.h_value[slot, pos] = h_value
+        self.S_plus[slot, pos] = S_plus
+        self.S_minus[slot, pos] = S_minus
+        self.std[slot, pos] = std
+        self.alert[slot, pos] = alert
+        self.push_executed[slot, pos] = push_executed
+        self.head[slot] = (pos + 1) % self.periods
+        if self.count[slot] < self.periods:
+            self.count[slot] += 1
+        if metadata is not None:
+            self.metadata[slot] = metadata
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _order(self, slot: int) -> np.ndarray:
+        """按时间顺序 (最早 -> 最新) 的列下标"""
+        count = self.count[slot]
+        head = self.head[slot]
+        return (np.arange(head - count, head)) % self.periods
+
+    def recent_push(self, key: str, periods: int) -> bool:
+        """最近 periods 个周期内是否执行过推送 (报警抑制)"""
+        slot = self.slots.get(key)
+        if slot is None:
+            return False
+        count = min(self.count[slot], periods)
+        if count <= 0:
+            return False
+        head = self.head[slot]
+        row = self.push_executed[slot]
+        for back in range(1, count + 1):
+            if row[(head - back) % self.periods]:
+                return True
+        return False
+
+    def latest(self, key: str) -> Optional[Dict]:
+        """最近一个周期的状态 (字典)"""
+        slot = self.slots.get(key)
+        if slot is None or not self.count[slot]:
+            return None
+        pos = (self.head[slot] - 1) % self.periods
+        status = {name: float(getattr(self, name)[slot, pos]) for name in self.FLOAT_FIELDS}
+        for name in self.BOOL_FIELDS:
+            status[name] = bool(getattr(self, name)[slot, pos])
+        status["timestamp"] = self.timestamp[slot, pos]
+        status["metadata"] = self.metadata[slot]
+        return status
+
+    def trajectory(self, key: str) -> Dict[str, list]:
+        """按时间顺序取出整段轨迹 (报警推送的 history_30_periods 结构)"""
+        slot = self.slots[key]
+        order = self._order(slot)
+        return {
+            "timestamps": self.timestamp[slot, order].tolist(),
+            "values": self.value[slot, order].tolist(),
+            "baselines": self.baseline[slot, order].tolist(),
+            "k_values": self.k_value[slot, order].tolist(),
+            "cusum_plus": self.S_plus[slot, order].tolist(),
+            "cusum_minus": self.S_minus[slot, order].tolist(),
+            "threshold_h": self.h_value[slot, order].tolist()
+        }
+
+    def history(self, key: str) -> List[Dict]:
+        """按时间顺序取出每个周期的状态字典 (调试 / 兼容用)"""
+        slot = self.slots.get(key)
+        if slot is None:
+            return []
+        order = self._order(slot)
+        columns = {name: getattr(self, name)[slot, order].tolist() for name in self.FLOAT_FIELDS + self.BOOL_FIELDS}
+        columns["timestamp"] = self.timestamp[slot, order].tolist()
+        return [{name: col[i] for name, col in columns.items()} for i in range(len(order))]
+
+    def slot_bytes(self) -> int:
+        """每个检测键占用的字节数 (按行分摊)"""
+        per_period = sum(getattr(self, name).itemsize for name in self.FLOAT_FIELDS + self.BOOL_FIELDS)
+        per_period += self.timestamp.itemsize
+        return per_period * self.periods + 3 * 8  # 另加 head / count / metadata 列表中的引用
+
+    def memory_usage(self) -> int:
+        """整个缓存占用的字节数 (含未使用的预留行)"""
+        arrays = sum(getattr(self, name).nbytes for name in self.FLOAT_FIELDS + self.BOOL_FIELDS)
+        arrays += self.timestamp.nbytes
+        lists = sys.getsizeof(self.head) + sys.getsizeof(self.count) + sys.getsizeof(self.metadata)
+        return arrays + lists + sys.getsizeof(self.slots)
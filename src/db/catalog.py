@@ -0,0 +1,248 @@
+"""
+维度组合目录 (筛选菜单 /api/v1/options)
+
+- 内存中保存检测记录出现过的 (产品, 线体, 工站, 检测项) 组合及其最后出现的日期，
+  每个维度建倒排索引 (维度值 -> 组合集合)；联动筛选 = 其余维度的倒排集合取交集，不访问数据库
+- 接入接口每条数据调用 observe() (只改内存)；新的组合或最后日期前进的组合由 flush() 批量写入 dimension_catalog 表
+- 过期清理后 prune() 删除最后出现日期早于截止日期的组合
+- 启动时 rebuild() 从 dimension_catalog 表加载；表为空而检测记录存在时 (升级后首次启动) 先从检测记录回填一次
+"""
+import time
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, func, insert, select
+from .models import DimensionTuple
+from .partitions import RecordPartitions, dimension_value
+
+# 组合中各维度的顺序
+CATALOG_FIELDS = ("product", "line", "station", "item_name")
+# /api/v1/options 返回的键
+_OPTION_KEYS = {"station": "stations", "product": "products", "line": "lines", "item_name": "items"}
+# 查询结果缓存的条数上限 (超过时整体清空)
+_CACHE_SIZE = 256
+
+Combo = Tuple[str, str, str, str]
+
+
+def _upsert(dialect_name: str, table):
+    """已存在的组合只把 last_day 向后推"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(table)
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(CATALOG_FIELDS),
+        set_={"last_day": stmt.excluded.last_day},
+        where=table.c.last_day < stmt.excluded.last_day,
+    )
+
+
+def _day_of(timestamp) -> datetime.date:
+    """接入数据的时间戳 (ISO 字符串或 datetime) -> 日期，无法解析时为当天"""
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.date()
+    if isinstance(timestamp, datetime.date):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            return datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00')).date()
+        except ValueError:
+            pass
+    return datetime.date.today()
+
+
+class DimensionCatalog:
+    """维度组合的内存目录与倒排索引"""
+
+    def __init__(self, partitions: RecordPartitions):
+        self.partitions = partitions
+        self.engine = partitions.engine
+        self.table = DimensionTuple.__table__
+        self._lock = threading.Lock()
+        self._last_day: Dict[Combo, datetime.date] = {}
+        self._index: Dict[str, Dict[str, Set[Combo]]] = {field: {} for field in CATALOG_FIELDS}
+        self._pending: Dict[Combo, datetime.date] = {}
+        # 组合集合变化时清空 (只推进最后日期不影响查询结果)
+        self._cache: Dict[Tuple, Dict[str, List[str]]] = {}
+        self.ready = False
+
+        # 指标
+        self.rebuild_ms = 0.0
+        self.backfilled = 0
+        self.flushed = 0
+        self.pruned = 0
+        self.queries = 0
+        self.cache_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._last_day)
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+    def observe(self, item_name: str, metadata: Optional[Dict], timestamp=None):
+        """记录一条接入数据的维度组合 (只改内存，由 flush() 持久化)；维度值与检测记录一样转为字符串"""
+        metadata = metadata or {}
+        combo = tuple(dimension_value(v) or "" for v in (
+            metadata.get("product"), metadata.get("line"), metadata.get("station"), item_name))
+        day = _day_of(timestamp)
+        with self._lock:
+            last = self._last_day.get(combo)
+            if last is not None and last >= day:
+                return
+            self._add(combo, day)
+            self._pending[combo] = max(day, self._pending.get(combo, day))
+
+    def _add(self, combo: Combo, day: datetime.date):
+        """调用方持有 _lock"""
+        last = self._last_day.get(combo)
+        if last is None:
+            for field, value in zip(CATALOG_FIELDS, combo):
+                self._index[field].setdefault(value, set()).add(combo)
+            self._cache.clear()
+        if last is None or day > last:
+            self._last_day[combo] = day
+
+    def _remove(self, combo: Combo):
+        """调用方持有 _lock"""
+        self._last_day.pop(combo, None)
+        self._pending.pop(combo, None)
+        for field, value in zip(CATALOG_FIELDS, combo):
+            combos = self._index[field].get(value)
+            if combos is not None:
+                combos.discard(combo)
+                if not combos:
+                    del self._index[field][value]
+        self._cache.clear()
+
+    def flush(self) -> int:
+        """把新增 / 最后日期前进的组合写入 dimension_catalog 表，返回写入的组合数 (rebuild 完成之前不写入，避免跳过回填)"""
+        if not self.ready:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [dict(zip(CATALOG_FIELDS, combo), last_day=day) for combo, day in pending.items()]
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(_upsert(conn.dialect.name, self.table), rows)
+        except Exception as e:
+            # 下次 flush 重试
+            with self._lock:
+                for combo, day in pending.items():
+                    if combo in self._last_day:
+                        self._pending[combo] = max(day, self._pending.get(combo, day))
+            print(f"[ERROR] Failed to flush {len(rows)} dimension combinations: {e}")
+            return 0
+        self.flushed += len(rows)
+        return len(rows)
+
+    def prune(self, before: datetime.date) -> int:
+        """删除最后出现日期早于 before 的组合 (内存与表)，返回删除的组合数"""
+        with self._lock:
+            expired = [combo for combo, day in self._last_day.items() if day < before]
+            for combo in expired:
+                self._remove(combo)
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.last_day < before))
+        self.pruned += len(expired)
+        return len(expired)
+
+    def rebuild(self) -> int:
+        """从 dimension_catalog 表加载目录 (表为空时先从检测记录回填)，返回组合数"""
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            last_day = {tuple(row[:-1]): row[-1] for row in conn.execute(select(*self.table.c[CATALOG_FIELDS + ("last_day",)]))}
+        if not last_day:
+            last_day = self._backfill()
+        with self._lock:
+            for combo, day in last_day.items():
+                self._add(combo, day)
+            self.ready = True
+        self.rebuild_ms = round((time.perf_counter() - started) * 1000, 1)
+        return len(self._last_day)
+
+    def _backfill(self) -> Dict[Combo, datetime.date]:
+        """扫描各分区与 legacy 表中出现过的组合 (升级后只执行一次，大库上较慢)"""
+        started = time.perf_counter()
+        last_day: Dict[Combo, datetime.date] = {}
+        with self.engine.connect() as conn:
+            for day, table in self.partitions.tables_between():
+                if day is None:
+                    q = select(*(table.c[f] for f in CATALOG_FIELDS), func.max(table.c.timestamp)).group_by(
+                        *(table.c[f] for f in CATALOG_FIELDS))
+                    for *combo, latest in conn.execute(q):
+                        if latest is not None:
+                            self._merge(last_day, combo, _day_of(latest))
+                    continue
+                columns = [table.c[f"{f}_id"] for f in CATALOG_FIELDS]
+                ids = conn.execute(select(*columns).group_by(*columns)).all()
+                values = self.partitions.dimensions.decode(conn, (i for row in ids for i in row))
+                for row in ids:
+                    self._merge(last_day, [values.get(i) for i in row], day)
+        rows = [dict(zip(CATALOG_FIELDS, combo), last_day=day) for combo, day in last_day.items()]
+        if rows:
+            with self.engine.begin() as conn:
+                conn.execute(_upsert(conn.dialect.name, self.table), rows)
+            print(f"[INFO] Backfilled {len(rows)} dimension combinations from detection records "
+                  f"({time.perf_counter() - started:.1f} s)")
+        self.backfilled = len(rows)
+        return last_day
+
+    @staticmethod
+    def _merge(last_day: Dict[Combo, datetime.date], combo: Iterable[Optional[str]], day: datetime.date):
+        combo = tuple(v or "" for v in combo)
+        if combo not in last_day or day > last_day[combo]:
+            last_day[combo] = day
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def options(self, filters: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+        """
+        联动筛选菜单: 每个维度的可选值按 "其余维度的筛选条件" 过滤 (不按自身过滤，用户仍可切换)
+        返回格式与 /api/v1/options 相同；空值不作为选项
+        """
+        key = tuple(filters.get(field) or None for field in CATALOG_FIELDS)
+        with self._lock:
+            self.queries += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+            result = {}
+            for target in ("station", "product", "line", "item_name"):
+                postings = [
+                    self._index[field].get(value, set())
+                    for field, value in zip(CATALOG_FIELDS, key)
+                    if value is not None and field != target
+                ]
+                if not postings:
+                    values = self._index[target].keys()
+                else:
+                    position = CATALOG_FIELDS.index(target)
+                    postings.sort(key=len)
+                    values = {combo[position] for combo in postings[0].intersection(*postings[1:])}
+                result[_OPTION_KEYS[target]] = sorted(v for v in values if v)
+            if len(self._cache) >= _CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = result
+        return result
+
+    def get_metrics(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "combinations": len(self._last_day),
+            "pending": len(self._pending),
+            "rebuild_ms": self.rebuild_ms,
+            "backfilled": self.backfilled,
+            "flushed": self.flushed,
+            "pruned": self.pruned,
+            "queries": self.queries,
+            "cache_hits": self.cache_hits,
+        }
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
 from .models import Base
+from .migrations import run_migrations
 
 # 数据库文件路径
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -25,8 +26,9 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
-    """初始化数据库表"""
+    """初始化数据库表 (并为旧版数据库补齐新增的列)"""
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 def get_db():
     """Dependency for FastAPI"""
@@ -0,0 +1,89 @@
+"""
+维度字典缓存
+
+检测记录分区中的字符串维度以 DimensionValue.id 保存。写入路径在内存中缓存 字符串 -> ID，
+只有第一次出现的字符串才访问数据库 (在独立的短事务中插入并提交后才进入缓存)；读取路径缓存 ID -> 字符串。
+"""
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import insert, select
+from .models import DimensionValue
+
+# IN (...) 查询的参数个数上限 (SQLite 默认最多 32766 个绑定参数)
+_CHUNK = 500
+
+
+def _insert_ignore(dialect_name: str, table):
+    """已存在的值跳过 (多个进程同时插入同一个值不冲突)"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=["value"])
+
+
+class DimensionDictionary:
+    """字符串 <-> 整数 ID (进程内缓存)"""
+
+    def __init__(self):
+        self.table = DimensionValue.__table__
+        self._ids: Dict[str, int] = {}
+        self._values: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.inserted = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _cache(self, rows):
+        with self._lock:
+            for id_, value in rows:
+                self._ids[value] = id_
+                self._values[id_] = value
+
+    def has_missing(self, values: Iterable[Optional[str]]) -> bool:
+        return any(v is not None and v not in self._ids for v in values)
+
+    def encode(self, conn, values: Iterable[Optional[str]]) -> List[str]:
+        """
+        保证 values 都有 ID (之后用 id_of 取)，返回本次新缓存的字符串
+        conn 的事务提交失败时调用方应 forget 这些字符串 (对应的行没有写入)
+        """
+        missing = sorted({v for v in values if v is not None and v not in self._ids})
+        if not missing:
+            return []
+        self.inserted += len(missing)
+        stmt = _insert_ignore(conn.dialect.name, self.table)
+        for i in range(0, len(missing), _CHUNK):
+            chunk = missing[i:i + _CHUNK]
+            conn.execute(stmt, [{"value": v} for v in chunk])
+            self._cache(conn.execute(select(self.table.c.id, self.table.c.value).where(self.table.c.value.in_(chunk))))
+        return missing
+
+    def id_of(self, value: Optional[str]) -> Optional[int]:
+        return None if value is None else self._ids[value]
+
+    def forget(self, values: Iterable[str]):
+        with self._lock:
+            for value in values:
+                id_ = self._ids.pop(value, None)
+                self._values.pop(id_, None)
+
+    def lookup(self, conn, value: str) -> Optional[int]:
+        """字符串 -> ID (从未写入过的字符串返回 None)"""
+        if value not in self._ids:
+            self._cache(conn.execute(select(self.table.c.id, self.table.c.value).where(self.table.c.value == value)))
+        return self._ids.get(value)
+
+    def decode(self, conn, ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """ID -> 字符串 (缺失的 ID 一次性从数据库补齐)"""
+        missing = sorted({i for i in ids if i is not None and i not in self._values})
+        for i in range(0, len(missing), _CHUNK):
+            chunk = missing[i:i + _CHUNK]
+            self._cache(conn.execute(select(self.table.c.id, self.table.c.value).where(self.table.c.id.in_(chunk))))
+        return self._values
+
+    def get_metrics(self) -> Dict:
+        return {"cached_values": len(self._ids), "inserted": self.inserted}
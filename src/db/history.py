@@ -0,0 +1,209 @@
+"""
+历史检测记录查询 (/api/v1/history)
+
+- 键集分页: 记录按 (timestamp, id) 全序排列，游标编码一条记录的 (timestamp, 全局 id)；before / after 取游标之前 / 之后的 limit 条，
+  不用 OFFSET，翻到任何位置代价都相同。不带游标时返回时间窗口内最新的 limit 条
+- fields 投影: 只查询需要的列 (Core select)，不构造 ORM 对象
+- max_points 降采样: 第一遍只读时间窗口内记录的 (id, timestamp, 检测项, value, is_alert)，每个检测项用 LTTB 降到 max_points 个点
+  (报警点总是保留)；第二遍按 id 只读取保留下来的记录的 fields 列
+- 各分区分别查询后按 (timestamp, id) 归并；legacy 表 (升级前的 detection_records) 同样参与
+"""
+import base64
+import heapq
+import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import or_, select
+from .partitions import RecordPartitions, id_base, partition_column
+from ..utils.downsample import downsample
+
+# 接口返回的字段 (与 DetectionRecord.to_dict 一致)
+HISTORY_FIELDS = (
+    "id", "item_name", "station", "product", "line", "timestamp", "value", "uph",
+    "baseline", "std", "k_value", "h_value", "s_plus", "s_minus", "is_alert", "alert_side",
+)
+# 降采样需要的字段
+_PLOT_FIELDS = ("item_name", "value", "is_alert")
+# 按 id 读取保留记录时每条 IN (...) 的 id 数
+_ID_CHUNK = 500
+
+Key = Tuple[datetime.datetime, int]
+
+
+def encode_cursor(key: Key) -> str:
+    timestamp, record_id = key
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{record_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Key:
+    """游标格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """逗号分隔的字段列表 (空表示全部字段)；有未知字段时抛出 ValueError"""
+    if not fields:
+        return HISTORY_FIELDS
+    names = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in names if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (available: {', '.join(HISTORY_FIELDS)})")
+    return names
+
+
+class RecordHistory:
+    """历史记录的分页 / 降采样查询"""
+
+    def __init__(self, partitions: RecordPartitions):
+        self.partitions = partitions
+
+    def page(
+        self,
+        filters: Dict[str, Optional[str]],
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        limit: int = 200,
+        fields: Sequence[str] = HISTORY_FIELDS,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """
+        一页记录 (按时间升序) 与前后两个方向的游标 (prev_cursor, next_cursor)
+        - after: 游标之后最早的 limit 条；before / 不带游标: 游标之前 (或窗口内) 最新的 limit 条
+        - 前进方向上窗口内没有更多记录时对应的游标为 None；反方向的游标总是返回 (可用于轮询新写入的记录)
+        """
+        if before and after:
+            raise ValueError("before and after are mutually exclusive")
+        cursor = decode_cursor(before or after) if (before or after) else None
+        descending = after is None
+        names = _with_keys(fields)
+
+        with self.partitions.engine.connect() as conn:
+            tables = self.partitions.tables_between(start, end)
+            legacy = [t for t in tables if t[0] is None]
+            partitioned = [t for t in tables if t[0] is not None]
+            if descending:
+                partitioned.reverse()
+
+            # 多取一条判断前进方向上是否还有记录
+            want = limit + 1
+            legacy_rows, rows = [], []
+            for day, table in legacy:
+                legacy_rows = self._fetch(conn, day, table, names, filters, start, end, cursor, descending, want)
+            for day, table in partitioned:
+                if len(rows) >= want:
+                    break
+                rows.extend(self._fetch(conn, day, table, names, filters, start, end, cursor, descending, want - len(rows)))
+            entries = list(heapq.merge(legacy_rows, rows, key=lambda e: e[0], reverse=descending))[:want]
+
+            more = len(entries) > limit
+            entries = entries[:limit]
+            if descending:
+                entries.reverse()
+            records = self._records(conn, entries, fields)
+
+        if not entries:
+            return records, None, None
+        prev_cursor = encode_cursor(entries[0][0]) if (more or not descending) else None
+        next_cursor = encode_cursor(entries[-1][0]) if (more or descending) else None
+        return records, prev_cursor, next_cursor
+
+    def downsampled(
+        self,
+        filters: Dict[str, Optional[str]],
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        max_points: int = 2000,
+        fields: Sequence[str] = HISTORY_FIELDS,
+    ) -> Tuple[List[Dict], int]:
+        """窗口内每个检测项降采样到约 max_points 个点 (报警点总是保留)，返回 (记录, 降采样前的记录数)"""
+        names = _with_keys(_PLOT_FIELDS)
+        with self.partitions.engine.connect() as conn:
+            tables = dict(self.partitions.tables_between(start, end))
+            per_table = [
+                self._fetch(conn, day, table, names, filters, start, end, None, False, None)
+                for day, table in tables.items()
+            ]
+            entries = list(heapq.merge(*per_table, key=lambda e: e[0]))
+
+            # 按检测项分组 (分区中是字典 ID，legacy 表中是字符串)
+            item_ids = [e[2].item_name_id for e in entries if e[1] is not None]
+            values = self.partitions.dimensions.decode(conn, item_ids) if item_ids else {}
+            series: Dict[Optional[str], List[int]] = {}
+            for i, (_, day, row) in enumerate(entries):
+                item = row.item_name if day is None else values.get(row.item_name_id)
+                series.setdefault(item, []).append(i)
+
+            kept = []
+            for indexes in series.values():
+                xs = [entries[i][0][0].timestamp() for i in indexes]
+                ys = [entries[i][2].value if entries[i][2].value is not None else 0.0 for i in indexes]
+                alerts = [j for j, i in enumerate(indexes) if entries[i][2].is_alert]
+                kept.extend(indexes[j] for j in downsample(xs, ys, max_points, alerts))
+            kept.sort()
+            kept = [entries[i] for i in kept]
+
+            # 第二遍: 只读取保留记录的 fields 列
+            wanted: Dict[Optional[datetime.date], List[int]] = {}
+            for _, day, row in kept:
+                wanted.setdefault(day, []).append(row.id)
+            rows = {
+                (day, row.id): row
+                for day, ids in wanted.items()
+                for row in self._fetch_ids(conn, day, tables[day], _with_keys(fields), ids)
+            }
+            records = self._records(conn, [(key, day, rows[(day, row.id)]) for key, day, row in kept], fields)
+        return records, len(entries)
+
+    def _fetch(self, conn, day, table, names, filters, start, end, cursor: Optional[Key], descending: bool, limit: Optional[int]):
+        """单个表的查询，返回 [((timestamp, 全局 id), day, row)]，按 (timestamp, id) 排序"""
+        conds = self.partitions.conditions(conn, day, table, filters, by_time=True)
+        if conds is None:
+            return []  # 分区中没有出现过该维度值
+        columns = [table.c[name if day is None else partition_column(name)] for name in names]
+        ts, pk = table.c.timestamp, table.c.id
+        q = select(*columns).where(*conds)
+        if start is not None:
+            q = q.where(ts >= start)
+        if end is not None:
+            q = q.where(ts <= end)
+        if cursor is not None:
+            cursor_ts, local_id = cursor[0], cursor[1] - id_base(day)
+            if descending:
+                q = q.where(ts <= cursor_ts, or_(ts < cursor_ts, pk < local_id))
+            else:
+                q = q.where(ts >= cursor_ts, or_(ts > cursor_ts, pk > local_id))
+        q = q.order_by(ts.desc(), pk.desc()) if descending else q.order_by(ts.asc(), pk.asc())
+        if limit is not None:
+            q = q.limit(limit)
+        base = id_base(day)
+        return [((row.timestamp or datetime.datetime.min, base + row.id), day, row) for row in conn.execute(q)]
+
+    def _fetch_ids(self, conn, day, table, names, ids: List[int]) -> List:
+        """单个表中按 (表内) id 读取指定的列"""
+        columns = [table.c[name if day is None else partition_column(name)] for name in names]
+        rows = []
+        for i in range(0, len(ids), _ID_CHUNK):
+            rows.extend(conn.execute(select(*columns).where(table.c.id.in_(ids[i:i + _ID_CHUNK]))))
+        return rows
+
+    def _records(self, conn, entries, fields: Sequence[str]) -> List[Dict]:
+        """[(key, day, row)] -> 接口返回的字典 (保持顺序，只保留 fields)"""
+        by_day: Dict[Optional[datetime.date], List] = {}
+        for _, day, row in entries:
+            by_day.setdefault(day, []).append(row)
+        decoded = {day: iter(self.partitions.to_dicts(conn, rows, day)) for day, rows in by_day.items()}
+        records = []
+        for _, day, _ in entries:
+            record = next(decoded[day])
+            records.append({name: record.get(name) for name in fields})
+        return records
+
+
+def _with_keys(fields: Iterable[str]) -> Tuple[str, ...]:
+    """查询的列: 请求的字段加上排序 / 游标需要的 id 与 timestamp"""
+    return tuple(dict.fromkeys(("id", "timestamp") + tuple(fields)))
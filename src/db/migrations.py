@@ -0,0 +1,66 @@
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from .models import RECORD_INDEXES
+from .partitions import partition_column, partition_day
+
+# 已有表上新增的列 (表名, 列名, 列类型 DDL)
+# create_all 只创建缺失的表，不会给已有表加列；按顺序追加，已存在的列跳过
+COLUMN_MIGRATIONS = (
+    ("item_states", "snapshot", {"postgresql": "BYTEA", "default": "BLOB"}),
+    ("item_states", "lsn", {"default": "BIGINT"}),
+)
+
+
+def _record_index_ddl(inspector, tables, concurrently: bool):
+    """
+    检测记录表 (legacy 表与各天分区) 缺少的组合索引 (RECORD_INDEXES)，生成 (描述, CREATE INDEX 语句)
+    create_all 只创建缺失的表 / 新表上的索引，不会给已有表加索引
+    """
+    for table in sorted(tables):
+        if table != "detection_records" and partition_day(table) is None:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table)}
+        columns = {c["name"] for c in inspector.get_columns(table)}
+        for suffix, fields in RECORD_INDEXES:
+            name = f"ix_{table}_{suffix}"
+            if name in existing:
+                continue
+            # 分区中的维度列为 <字段>_id
+            cols = [partition_column(f) if partition_column(f) in columns else f for f in fields]
+            option = "CONCURRENTLY " if concurrently else ""
+            yield f"{table}: added index {name}", f"CREATE INDEX {option}IF NOT EXISTS {name} ON {table} ({', '.join(cols)})"
+
+
+def run_migrations(engine: Engine) -> int:
+    """给旧版数据库补齐新增的列与索引，返回执行的迁移个数"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    applied = 0
+    with engine.begin() as conn:
+        for table, column, types in COLUMN_MIGRATIONS:
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column in existing:
+                continue
+            ddl_type = types.get(engine.dialect.name, types["default"])
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+            print(f"[INFO] Migrated {table}: added column {column}")
+            applied += 1
+
+    # 索引: PostgreSQL 使用 CREATE INDEX CONCURRENTLY (不阻塞写入，须在事务外执行)；
+    # SQLite 建索引期间持有写锁，大表首次升级需要较长时间
+    concurrently = engine.dialect.name == "postgresql"
+    statements = list(_record_index_ddl(inspector, tables, concurrently))
+    if statements:
+        options = {"isolation_level": "AUTOCOMMIT"} if concurrently else {}
+        with engine.connect().execution_options(**options) as conn:
+            for description, ddl in statements:
+                started = time.perf_counter()
+                conn.execute(text(ddl))
+                if not concurrently:
+                    conn.commit()
+                print(f"[INFO] Migrated {description} ({time.perf_counter() - started:.1f} s)")
+                applied += 1
+    return applied
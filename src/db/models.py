@@ -1,11 +1,23 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, create_engine
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Boolean, Date, DateTime, Index, LargeBinary, MetaData, Table, create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime
 
 Base = declarative_base()
 
+# 检测记录的组合索引 (索引名后缀, 维度列)，与历史查询的形态对应: 维度等值筛选 + timestamp 范围 + 按 timestamp 排序
+# - item_time: 单个检测项的曲线 / 详情 (带 item_name 的查询，检测项只属于一个工站，其余维度条件不再过滤掉行)
+# - dims_time: 看板按 产品 -> 线体 -> 工站 逐级筛选 (等值条件为其前缀时可用；三者齐全时结果已按 timestamp 有序)
+#   item_name 不放在 timestamp 之前，否则工站级查询需要额外排序
+# 索引名为 ix_<表名>_<后缀>；已有数据库中的索引由 migrations.run_migrations 补建
+RECORD_INDEXES = (
+    ("item_time", ("item_name", "timestamp")),
+    ("dims_time", ("product", "line", "station", "timestamp")),
+)
+
+
 class DetectionRecord(Base):
     __tablename__ = "detection_records"
+    __table_args__ = tuple(Index(f"ix_detection_records_{suffix}", *columns) for suffix, columns in RECORD_INDEXES)
 
     id = Column(Integer, primary_key=True, index=True)
     item_name = Column(String, index=True)
@@ -55,6 +67,63 @@ class DetectionRecord(Base):
             "alert_side": self.alert_side
         }
 
+# 检测记录中以字典 ID 保存的字符串维度 (分区表中的列名为 <维度>_id)
+DIMENSION_FIELDS = ("item_name", "item_type", "station", "product", "line", "alert_side")
+
+
+class DimensionValue(Base):
+    """
+    维度字典: 检测记录分区中重复出现的字符串 (检测项名、工站、产品、线体、报警方向) 只保存一次
+    所有维度共用一个 ID 空间
+    """
+    __tablename__ = "dimension_values"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(String, unique=True, nullable=False)
+
+
+class DimensionTuple(Base):
+    """
+    维度组合目录: 检测记录中出现过的 (产品, 线体, 工站, 检测项) 组合及其最后出现的日期
+    启动时整表加载到内存 (catalog.DimensionCatalog)，筛选菜单 (/api/v1/options) 不再扫描检测记录；维度为空时保存为空字符串
+    """
+    __tablename__ = "dimension_catalog"
+
+    product = Column(String, primary_key=True)
+    line = Column(String, primary_key=True)
+    station = Column(String, primary_key=True)
+    item_name = Column(String, primary_key=True)
+    last_day = Column(Date, nullable=False, index=True)
+
+
+def record_partition_table(float32: bool = False) -> Table:
+    """
+    按天分区的检测记录表模板 (partitions.py 按日期复制为 detection_records_YYYYMMDD)
+    - 维度列保存 DimensionValue.id；组合索引 (RECORD_INDEXES) 由 partitions.py 按分区表名命名后添加
+    - float32=True 时算法列使用单精度 (PostgreSQL 中为 4 字节 REAL；SQLite 的 REAL 固定 8 字节，无变化)
+    """
+    algo = Float(precision=24) if float32 else Float
+    return Table(
+        "detection_records_partition", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("timestamp", DateTime, index=True),
+        Column("item_name_id", Integer),
+        Column("item_type_id", Integer),
+        Column("station_id", Integer, nullable=True),
+        Column("product_id", Integer, nullable=True),
+        Column("line_id", Integer, nullable=True),
+        Column("value", Float),
+        Column("uph", Integer),
+        Column("baseline", algo),
+        Column("std", algo),
+        Column("k_value", algo),
+        Column("h_value", algo),
+        Column("s_plus", algo),
+        Column("s_minus", algo),
+        Column("is_alert", Boolean),
+        Column("alert_side_id", Integer, nullable=True),
+    )
+
 class ItemState(Base):
     """
     存储算法中间状态 (Checkpoint)
@@ -75,6 +144,12 @@ class ItemState(Base):
     # 辅助信息 (如最后一次更新时间戳，用于判断新鲜度)
     last_data_timestamp = Column(DateTime, nullable=True)
 
+    # 完整快照 (观测窗口、更新器、FIR 计数器，见 core.detector_snapshot)；旧数据为空时只按上面的参数恢复
+    snapshot = Column(LargeBinary, nullable=True)
+
+    # 状态已包含的接入日志序号 (core.ingest_log)，重启时只重放该序号之后的数据
+    lsn = Column(BigInteger, nullable=True)
+
     def to_dict(self):
         return {
             "item_name": self.item_name,
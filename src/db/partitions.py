@@ -0,0 +1,300 @@
+"""
+检测记录按天分区
+
+- 每天一张表 detection_records_YYYYMMDD (models.record_partition_table)，写入时按记录的 timestamp 路由
+- 分区中的字符串维度以维度字典 ID 保存 (dimensions.py)，读取时还原为字符串
+- 过期清理直接 DROP 整张表，不再逐行删除
+- 历史查询只访问与时间窗口重叠的分区
+- 升级前写入的 detection_records (legacy 表) 仍参与查询，其中的数据由分批清理逐步删除
+- 各分区的自增主键独立；对外返回的 id = 分区日期序号 * ID_SPAN + 分区内主键 (全局唯一，按天递增)
+"""
+import threading
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Index, MetaData, Table, inspect, insert, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
+from sqlalchemy.engine import Engine
+from .models import DIMENSION_FIELDS, RECORD_INDEXES, DetectionRecord, record_partition_table
+from .dimensions import DimensionDictionary
+
+PARTITION_PREFIX = "detection_records_"
+# 单个分区的主键上限 (每天最多 100 亿条)，对外 id 按此拼接分区日期
+ID_SPAN = 10 ** 10
+_EPOCH = datetime.date(1970, 1, 1)
+# 分区中原样保存的列 (其余为维度 ID 列)
+_VALUE_COLUMNS = ("timestamp", "value", "uph", "baseline", "std", "k_value", "h_value", "s_plus", "s_minus", "is_alert")
+_DIMENSION_COLUMNS = {f"{field}_id": field for field in DIMENSION_FIELDS}
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(table_name: str) -> Optional[datetime.date]:
+    """分区表名 -> 日期 (不是分区表时返回 None)"""
+    suffix = table_name[len(PARTITION_PREFIX):]
+    if not table_name.startswith(PARTITION_PREFIX) or len(suffix) != 8 or not suffix.isdigit():
+        return None
+    try:
+        return datetime.datetime.strptime(suffix, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def partition_column(field: str) -> str:
+    """记录字段 -> 分区表中的列名 (维度字段保存为 <字段>_id)"""
+    return f"{field}_id" if field in DIMENSION_FIELDS else field
+
+
+def id_base(day: Optional[datetime.date]) -> int:
+    """分区内主键 -> 对外 id 的偏移 (legacy 表为 0)"""
+    return 0 if day is None else (day - _EPOCH).days * ID_SPAN
+
+
+def split_id(record_id: int) -> Tuple[Optional[datetime.date], int]:
+    """对外 id -> (分区日期, 分区内主键)"""
+    if record_id < ID_SPAN:
+        return None, record_id
+    return _EPOCH + datetime.timedelta(days=record_id // ID_SPAN), record_id % ID_SPAN
+
+
+def _indexed_fields(fields: Iterable[str]) -> List[str]:
+    """
+    按 timestamp 排序的查询中允许走索引的维度
+    只有等值条件覆盖了某个组合索引 timestamp 之前的全部列时，该索引才能按时间顺序直接取行；
+    只覆盖一部分时 (如只按产品筛选) 要把匹配的行全部取出再排序，不如顺着 timestamp 索引扫描过滤，
+    这时所有维度条件都不走索引。SQLite 没有统计信息时会选中前者，所以在这里直接决定。
+    """
+    fields = set(fields)
+    for _, columns in RECORD_INDEXES:
+        prefix = set(columns[:-1])
+        if prefix <= fields:
+            return sorted(prefix)
+    return []
+
+
+def _no_index(column):
+    """一元 + : 结果不变，SQLite 不再用该列上的索引"""
+    return UnaryExpression(column, operator=custom_op("+"), type_=column.type)
+
+
+def dimension_value(value) -> Optional[str]:
+    """
+    维度值统一为字符串 (接入的 meta_data 可能是数字，如 "station": 3)
+    字典表与分区只保存字符串，与升级前 String 列的取值一致
+    """
+    return None if value is None else str(value)
+
+
+def _day_of(timestamp) -> datetime.date:
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.date()
+    if isinstance(timestamp, datetime.date):
+        return timestamp
+    return datetime.date.today()
+
+
+class RecordPartitions:
+    """
+    按天分区的检测记录表
+
+    - write(records) / insert(conn, records): 按天分组写入 (缺少的分区与维度字符串先在独立事务中创建)
+    - tables_between(start, end): 与时间窗口重叠的 (日期, 表)，legacy 表 (日期为 None) 在最前
+    - drop_before(day): 删除 day 之前的整天分区
+    - conditions / distinct / to_dicts: 按维度字符串筛选与还原 (legacy 表直接使用字符串列)
+    float32=True 时之后新建的分区算法列使用单精度 (已有分区不变)
+    分区列表缓存在内存中；读取 / 删除前从数据库刷新 (其他进程可能创建了新分区)
+    """
+
+    _instances: Dict[int, "RecordPartitions"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.legacy = DetectionRecord.__table__
+        self.metadata = MetaData()
+        self.dimensions = DimensionDictionary()
+        self.float32 = False
+        self._tables: Dict[datetime.date, Table] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @classmethod
+    def for_engine(cls, engine: Engine) -> "RecordPartitions":
+        """同一个数据库共用一个实例 (写入器、查询、过期清理共享分区缓存)"""
+        with cls._instances_lock:
+            instance = cls._instances.get(id(engine))
+            if instance is None or instance.engine is not engine:
+                instance = cls._instances[id(engine)] = cls(engine)
+            return instance
+
+    def table(self, day: datetime.date) -> Table:
+        name = partition_name(day)
+        table = self.metadata.tables.get(name)
+        if table is None:
+            table = record_partition_table(self.float32).to_metadata(self.metadata, name=name)
+            for suffix, columns in RECORD_INDEXES:
+                Index(f"ix_{name}_{suffix}", *(table.c[partition_column(c)] for c in columns))
+        return table
+
+    def refresh(self):
+        days = [day for day in map(partition_day, inspect(self.engine).get_table_names()) if day is not None]
+        with self._lock:
+            self._tables = {day: self.table(day) for day in days}
+        self._has_legacy = inspect(self.engine).has_table(self.legacy.name)
+
+    def days(self) -> List[datetime.date]:
+        return sorted(self._tables)
+
+    def ensure(self, conn, days: Iterable[datetime.date]) -> List[datetime.date]:
+        """创建缺少的分区 (CREATE ... IF NOT EXISTS，多个进程同时创建同一分区不冲突)，返回新建的日期"""
+        created = []
+        with self._lock:
+            for day in days:
+                if day in self._tables:
+                    continue
+                table = self.table(day)
+                conn.execute(CreateTable(table, if_not_exists=True))
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                self._tables[day] = table
+                created.append(day)
+        return created
+
+    def forget(self, days: Iterable[datetime.date]):
+        with self._lock:
+            for day in days:
+                self._tables.pop(day, None)
+
+    def prepare(self, records: List[Dict]) -> Dict[datetime.date, List[Dict]]:
+        """
+        按日期分组；缺少的分区与新出现的维度字符串在独立的短事务中创建并提交
+        (提交后才进入缓存，写入事务回滚不会留下指向未提交字典行的 ID)
+        """
+        groups: Dict[datetime.date, List[Dict]] = {}
+        for record in records:
+            groups.setdefault(_day_of(record.get("timestamp")), []).append(record)
+        values = {dimension_value(r.get(f)) for r in records for f in DIMENSION_FIELDS}
+        if any(day not in self._tables for day in groups) or self.dimensions.has_missing(values):
+            created, encoded = [], []
+            try:
+                with self.engine.begin() as conn:
+                    created = self.ensure(conn, groups)
+                    encoded = self.dimensions.encode(conn, values)
+            except Exception:
+                self.forget(created)
+                self.dimensions.forget(encoded)
+                raise
+        return groups
+
+    def insert(self, conn, records: List[Dict]) -> int:
+        """
+        写入调用方的事务 (conn)，需在该事务写入任何数据之前调用:
+        prepare() 使用另一个连接，SQLite 中调用方事务已持有写锁时会等待超时
+        """
+        for day, rows in self.prepare(records).items():
+            conn.execute(insert(self.table(day)), [self._encode(r) for r in rows])
+        return len(records)
+
+    def write(self, records: List[Dict]) -> int:
+        """在一个事务中写入 (按天分组，每个分区一条 executemany)"""
+        groups = self.prepare(records)
+        with self.engine.begin() as conn:
+            for day, rows in groups.items():
+                conn.execute(insert(self.table(day)), [self._encode(r) for r in rows])
+        return len(records)
+
+    def _encode(self, record: Dict) -> Dict:
+        row = {name: record.get(name) for name in _VALUE_COLUMNS}
+        for column, field in _DIMENSION_COLUMNS.items():
+            row[column] = self.dimensions.id_of(dimension_value(record.get(field)))
+        return row
+
+    def tables_between(
+        self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None
+    ) -> List[Tuple[Optional[datetime.date], Table]]:
+        """与 [start, end] 重叠的分区 (按日期升序)；legacy 表存在时以日期 None 排在最前"""
+        self.refresh()
+        first = _day_of(start) if start is not None else None
+        last = _day_of(end) if end is not None else None
+        tables: List[Tuple[Optional[datetime.date], Table]] = [(None, self.legacy)] if self._has_legacy else []
+        for day in self.days():
+            if (first is None or day >= first) and (last is None or day <= last):
+                tables.append((day, self._tables[day]))
+        return tables
+
+    def drop_before(self, day: datetime.date) -> List[str]:
+        """删除 day 之前的整天分区，返回删除的表名"""
+        self.refresh()
+        dropped = []
+        for partition in [d for d in self.days() if d < day]:
+            table = self._tables[partition]
+            table.drop(self.engine, checkfirst=True)
+            with self._lock:
+                self._tables.pop(partition, None)
+            dropped.append(table.name)
+        return dropped
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def conditions(
+        self, conn, day: Optional[datetime.date], table: Table, filters: Dict[str, Optional[str]], by_time: bool = False
+    ) -> Optional[List]:
+        """
+        维度筛选条件 (值为空的维度不筛选)；分区中不可能有匹配的记录时返回 None
+        by_time: 查询按 timestamp 排序时为 True，见 _indexed_fields
+        """
+        active = [field for field, value in filters.items() if value]
+        indexed = _indexed_fields(active) if by_time and conn.dialect.name == "sqlite" else active
+        conds = []
+        for field in active:
+            value = filters[field]
+            if day is None:
+                column = table.c[field]
+            else:
+                column = table.c[f"{field}_id"]
+                value = self.dimensions.lookup(conn, value)
+                if value is None:
+                    return None
+            conds.append((column if field in indexed else _no_index(column)) == value)
+        return conds
+
+    def distinct(self, conn, day: Optional[datetime.date], table: Table, field: str, filters: Dict[str, Optional[str]]) -> List[str]:
+        """table 中满足筛选条件的 field 取值"""
+        conds = self.conditions(conn, day, table, filters)
+        if conds is None:
+            return []
+        column = table.c[field] if day is None else table.c[f"{field}_id"]
+        ids = [r[0] for r in conn.execute(select(column).distinct().where(*conds)) if r[0] is not None]
+        if day is None:
+            return ids
+        values = self.dimensions.decode(conn, ids)
+        return [values[i] for i in ids]
+
+    def to_dicts(self, conn, rows, day: Optional[datetime.date]) -> List[Dict]:
+        """查询结果 -> 与 DetectionRecord.to_dict 相同的字典 (id 换算为全局 id，维度 ID 还原为字符串)"""
+        rows = [dict(row._mapping) for row in rows]
+        values = {}
+        if day is not None and rows:
+            columns = [c for c in rows[0] if c in _DIMENSION_COLUMNS]
+            values = self.dimensions.decode(conn, (row[c] for row in rows for c in columns))
+        base = id_base(day)
+        records = []
+        for row in rows:
+            data = {}
+            for column, value in row.items():
+                if column in ("item_type", "item_type_id"):
+                    continue
+                if column in _DIMENSION_COLUMNS and day is not None:
+                    data[_DIMENSION_COLUMNS[column]] = values.get(value)
+                elif column == "id":
+                    data["id"] = base + value
+                elif column == "timestamp" and isinstance(value, datetime.datetime):
+                    data["timestamp"] = value.isoformat()
+                else:
+                    data[column] = value
+            records.append(data)
+        return records
@@ -0,0 +1,245 @@
+import time
+import queue
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+from sqlalchemy.exc import OperationalError
+from .database import engine as default_engine
+from .partitions import RecordPartitions
+
+
+class _FlushMarker:
+    """flush() 放入队列的标记，写线程处理到它时说明之前的记录均已落库"""
+    __slots__ = ("event",)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+_STOP = object()
+
+
+class RecordWriter:
+    """
+    DetectionRecord 的延迟批量写入器 (Write-Behind)
+
+    - 检测线程调用 submit() 把记录放入有界队列后立即返回
+    - 后台写线程攒够 batch_size 条或距上次写入超过 flush_interval 秒时，
+      按记录日期分组、每个分区一条 Core insert (executemany)，在同一个事务中批量写入
+    - 队列已满时 submit() 最多阻塞 put_timeout 秒，仍无空间则由调用方同步写入 (不丢数据)
+    - stop() 会写完队列中剩余的记录 (服务关闭时调用)
+    - 写入失败时不整批丢弃: 数据库暂时不可用 (OperationalError) 时退避重试；其他错误把批次对半拆开重写，
+      最终只有出错的记录进入死信 (dead_letters)
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+        put_timeout: float = 5.0,
+        max_retries: int = 5,
+        retry_backoff: float = 0.1,
+        max_backoff: float = 5.0,
+        dead_letter_size: int = 1000,
+    ):
+        self.engine = engine if engine is not None else default_engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.partitions = RecordPartitions.for_engine(self.engine)
+        # 无法写入的记录与错误 (保留最近 dead_letter_size 条)
+        self.dead_letters: "deque" = deque(maxlen=dead_letter_size)
+
+        # 指标
+        self.total_submitted = 0
+        self.total_written = 0
+        self.total_failed = 0
+        self.total_retries = 0
+        self.total_flushes = 0
+        self.sync_fallbacks = 0
+        self.last_flush_size = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._flush_latency_sum = 0.0
+        self.last_flush_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="record-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout: Optional[float] = None):
+        """写完队列中剩余的记录后停止写线程"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def submit(self, records: List[Dict]):
+        """提交待写入的记录 (写线程未运行时直接同步写入)"""
+        if not records:
+            return
+        if not self.running:
+            self._write(list(records))
+            return
+        for i, record in enumerate(records):
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                # 背压: 写线程跟不上时由调用方同步写入剩余记录
+                with self._lock:
+                    self.sync_fallbacks += 1
+                self._write(list(records[i:]))
+                break
+        with self._lock:
+            self.total_submitted += len(records)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的记录全部写入 (返回是否在超时前完成)"""
+        if not self.running:
+            return True
+        marker = _FlushMarker()
+        self._queue.put(marker)
+        return marker.event.wait(timeout)
+
+    def _run(self):
+        batch: List[Dict] = []
+        markers: List[_FlushMarker] = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, _FlushMarker):
+                markers.append(item)
+            elif item is not None:
+                batch.append(item)
+                # 尽量一次取出队列中已有的记录
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item, _FlushMarker):
+                        markers.append(item)
+                        break
+                    batch.append(item)
+
+            if batch and (stopping or markers or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+            if time.monotonic() >= deadline or not batch:
+                deadline = time.monotonic() + self.flush_interval
+            for marker in markers:
+                marker.event.set()
+            markers = []
+
+    def _write(self, records: List[Dict]):
+        """在同一个事务中批量写入 (按天分区的 Core insert + executemany)，失败时见 _write_batch"""
+        started = time.perf_counter()
+        written = self._write_batch(records)
+        if not written:
+            return
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.total_written += written
+            self.total_flushes += 1
+            self.last_flush_size = written
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self._flush_latency_sum += latency
+            self.last_flush_at = time.time()
+
+    def _write_batch(self, records: List[Dict]) -> int:
+        """
+        写入一批记录，返回写入的条数 (partitions.write 是单个事务，失败时这批记录都没有写入)
+        - OperationalError (SQLite 写锁超时、连接断开等): 按 retry_backoff 指数退避后整批重试，最多 max_retries 次
+        - 其他错误 (某条记录的数据无法写入): 对半拆开分别写入，单条仍失败时进入死信，同批的其他记录不受影响
+        """
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.partitions.write(records)
+                return len(records)
+            except OperationalError as e:
+                error = e
+                if attempt == self.max_retries:
+                    break
+                with self._lock:
+                    self.total_retries += 1
+                    self.last_error = str(e)
+                print(f"[WARN] Failed to write {len(records)} records, retrying in {delay:.2f} s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+            except Exception as e:
+                if len(records) > 1:
+                    mid = len(records) // 2
+                    return self._write_batch(records[:mid]) + self._write_batch(records[mid:])
+                error = e
+                break
+        self._dead_letter(records, error)
+        return 0
+
+    def _dead_letter(self, records: List[Dict], error: Exception):
+        with self._lock:
+            self.total_failed += len(records)
+            self.last_error = str(error)
+            for record in records:
+                self.dead_letters.append({"record": record, "error": str(error)})
+        print(f"[ERROR] Failed to write {len(records)} records: {error}")
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "backlog": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "batch_size": self.batch_size,
+                "flush_interval_s": self.flush_interval,
+                "total_submitted": self.total_submitted,
+                "total_written": self.total_written,
+                "total_failed": self.total_failed,
+                "total_retries": self.total_retries,
+                "dead_letters": len(self.dead_letters),
+                "total_flushes": self.total_flushes,
+                "sync_fallbacks": self.sync_fallbacks,
+                "last_flush_size": self.last_flush_size,
+                "last_flush_latency_ms": round(self.last_flush_latency * 1000, 3),
+                "avg_flush_latency_ms": round(self._flush_latency_sum / self.total_flushes * 1000, 3) if self.total_flushes else 0.0,
+                "max_flush_latency_ms": round(self.max_flush_latency * 1000, 3),
+                "last_flush_at": self.last_flush_at,
+                "last_error": self.last_error,
+                "dimensions": self.partitions.dimensions.get_metrics(),
+            }
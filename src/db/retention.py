@@ -0,0 +1,163 @@
+import time
+import datetime
+import threading
+from typing import Dict, Optional
+from sqlalchemy import and_, delete, func, select
+from .database import engine as default_engine
+from .partitions import RecordPartitions
+
+
+class RecordRetention:
+    """
+    检测记录的过期清理 (分批、可中断)
+
+    - 早于截止日期的整天分区直接 DROP (见 partitions.py)
+    - legacy 表与截止时刻所在当天的分区按主键区间分批删除: 每批 DELETE ... WHERE id 在 [lo, hi) 且 timestamp < cutoff，一批一个短事务，
+      不会长时间锁住数据库阻塞检测记录的写入
+    - 每批的主键跨度按耗时自适应: 超过 time_budget 时减半，远低于预算时加倍 (在 [min_batch, max_batch] 之间)
+    - 两批之间暂停 pause 秒，让接入写入插队
+    - run() 是同步方法，由调用方放到线程池中执行 (不占用事件循环)；stop() 让正在进行的清理在当前批次后退出
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        retention_days: float = 30,
+        batch_size: int = 20000,
+        time_budget: float = 0.2,
+        pause: float = 0.05,
+        min_batch: int = 1000,
+        max_batch: int = 1000000,
+    ):
+        self.engine = engine if engine is not None else default_engine
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.pause = pause
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.partitions = RecordPartitions.for_engine(self.engine)
+
+        # 指标
+        self.running = False
+        self.total_deleted = 0
+        self.total_batches = 0
+        self.dropped_partitions = 0
+        self.runs = 0
+        self.last_run: Dict = {}
+        self.last_error: Optional[str] = None
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, now: Optional[datetime.datetime] = None) -> int:
+        """删除 retention_days 天之前的检测记录，返回删除的条数"""
+        if not self._lock.acquire(blocking=False):
+            return 0  # 上一次清理仍在进行
+        try:
+            self._stop.clear()
+            return self._run(now or datetime.datetime.now())
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def _run(self, now: datetime.datetime) -> int:
+        cutoff = now - datetime.timedelta(days=self.retention_days)
+        started = time.perf_counter()
+        self.running = True
+        self.runs += 1
+        progress = self.last_run = {
+            "cutoff": cutoff.isoformat(),
+            "started_at": datetime.datetime.now().isoformat(),
+            "finished_at": None,
+            "dropped_partitions": [],
+            "deleted": 0,
+            "batches": 0,
+            "batch_size": self.batch_size,
+            "table": None,
+            "next_id": None,
+            "max_id": None,
+            "last_batch_ms": 0.0,
+            "max_batch_ms": 0.0,
+            "completed": False,
+        }
+
+        try:
+            # 整天过期的分区直接删除
+            dropped = self.partitions.drop_before(cutoff.date())
+            progress["dropped_partitions"] = dropped
+            self.dropped_partitions += len(dropped)
+
+            # legacy 表与截止时刻所在当天的分区逐批删除
+            completed = True
+            for day, table in self.partitions.tables_between(cutoff, cutoff):
+                if self._stop.is_set():
+                    completed = False
+                    break
+                progress["table"] = table.name
+                completed = self._delete_expired(table, cutoff, progress) and completed
+            progress["completed"] = completed
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[ERROR] Retention cleanup failed: {e}")
+        finally:
+            progress["finished_at"] = datetime.datetime.now().isoformat()
+            progress["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return progress["deleted"]
+
+    def _delete_expired(self, table, cutoff: datetime.datetime, progress: Dict) -> bool:
+        """按主键区间分批删除 table 中 timestamp < cutoff 的记录，全部删除完返回 True"""
+        # 过期记录的主键范围 (走 timestamp 索引，只读)
+        with self.engine.connect() as conn:
+            low, high = conn.execute(
+                select(func.min(table.c.id), func.max(table.c.id)).where(table.c.timestamp < cutoff)
+            ).one()
+        if low is None:
+            return True
+        progress["next_id"], progress["max_id"] = low, high
+
+        batch = progress["batch_size"]
+        lo = low
+        while lo <= high and not self._stop.is_set():
+            hi = min(lo + batch, high + 1)
+            stmt = delete(table).where(and_(table.c.id >= lo, table.c.id < hi, table.c.timestamp < cutoff))
+            batch_started = time.perf_counter()
+            with self.engine.begin() as conn:
+                deleted = conn.execute(stmt).rowcount or 0
+            elapsed = time.perf_counter() - batch_started
+
+            self.total_deleted += deleted
+            self.total_batches += 1
+            progress["deleted"] += deleted
+            progress["batches"] += 1
+            progress["next_id"] = hi
+            progress["last_batch_ms"] = round(elapsed * 1000, 3)
+            progress["max_batch_ms"] = max(progress["max_batch_ms"], progress["last_batch_ms"])
+
+            # 按耗时调整下一批的主键跨度
+            if elapsed > self.time_budget:
+                batch = max(self.min_batch, batch // 2)
+            elif elapsed < self.time_budget / 4:
+                batch = min(self.max_batch, batch * 2)
+            progress["batch_size"] = batch
+
+            lo = hi
+            if self.pause > 0 and lo <= high:
+                self._stop.wait(self.pause)
+        return lo > high
+
+    def get_metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "retention_days": self.retention_days,
+            "time_budget_ms": self.time_budget * 1000,
+            "runs": self.runs,
+            "total_deleted": self.total_deleted,
+            "total_batches": self.total_batches,
+            "dropped_partitions": self.dropped_partitions,
+            "partitions": len(self.partitions.days()),
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
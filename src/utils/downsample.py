@@ -0,0 +1,50 @@
+"""
+时间序列降采样 (看板绘图用)
+
+LTTB (Largest-Triangle-Three-Buckets, Steinarsson 2013): 保留首尾两点，中间的点按顺序均分为 threshold-2 个桶，
+每个桶选出与 "上一个选中的点"、"下一个桶的平均点" 构成三角形面积最大的点。峰值与突变点会被选中，曲线形状基本不变。
+"""
+import numpy as np
+from typing import Iterable, List, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """返回选中点的下标 (升序)；xs 需按升序排列"""
+    n = len(xs)
+    if threshold >= n or n <= 2:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1]
+
+    x = np.asarray(xs, dtype=np.float64)
+    y = np.asarray(ys, dtype=np.float64)
+    # 桶边界: 第 i 个桶为 [edges[i], edges[i + 1])，覆盖下标 1 .. n-2；最后加上末尾点作为 "下一个桶"
+    edges = np.floor(np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    edges = edges.tolist() + [n]
+
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def downsample(xs: Sequence[float], ys: Sequence[float], max_points: int, keep: Iterable[int] = ()) -> List[int]:
+    """
+    降采样到约 max_points 个点，返回保留点的下标 (升序)
+    keep 中的点 (如报警点) 总是保留，LTTB 只分配剩余的名额；keep 本身超过 max_points 时结果多于 max_points
+    """
+    n = len(xs)
+    if n <= max_points:
+        return list(range(n))
+    keep = set(keep)
+    selected = set(lttb(xs, ys, max(max_points - len(keep), 2)))
+    return sorted(selected | keep)
@@ -1,108 +1,235 @@
 import json
 import os
-from typing import Dict, Any
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Iterable, Optional
+
+GLOBAL_CONFIG_KEY = "__GLOBAL_CONFIG__"
+
 
 class ConfigStore:
     """
-    极简的配置持久化层 (MVP版使用 JSON)
+    检测项配置持久化层 (SQLite)
+
+    - 每个配置键一行 (主键索引)，修改只写入变动的行，不再整文件重写
+    - set_item_configs / delete_item_configs 在同一个事务中批量写入 / 删除
+    - 首次打开时自动导入旧版 item_configs.json (一次性迁移，之后以数据库为准)
     """
-    def __init__(self, file_path: str):
-        self.file_path = file_path
-        self.configs: Dict[str, Any] = self._load()
-
-    def _load(self) -> Dict[str, Any]:
-        if os.path.exists(self.file_path):
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        if db_path.endswith(".json"):
+            # 兼容旧用法: 传入 JSON 路径时使用同目录同名的 .db，并从该 JSON 迁移
+            legacy_json_path, db_path = db_path, db_path[:-len(".json")] + ".db"
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
 
-    def save(self):
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.configs, f, indent=2, ensure_ascii=False)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS item_configs ("
+                "key TEXT PRIMARY KEY, config TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+
+    def _migrate_json(self, json_path: str):
+        """一次性导入旧版 JSON 配置文件 (已导入过则跳过)"""
+        marker = "migrated:" + os.path.abspath(json_path)
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (marker,)).fetchone()
+        if done or not os.path.exists(json_path):
+            return
+        with open(json_path, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+        with self._lock, self._conn:
+            self._upsert(configs.items(), merge=False)
+            self._conn.execute("INSERT INTO store_meta (key, value) VALUES (?, ?)", (marker, str(time.time())))
+        print(f"[INFO] Migrated {len(configs)} configs from {json_path} to {self.db_path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def _upsert(self, items: Iterable, merge: bool = True):
+        """写入 (key, config) 列表 (调用方持有锁并开启事务)；merge=True 时与已有配置合并"""
+        now = time.time()
+        rows = []
+        for key, config in items:
+            if merge:
+                row = self._conn.execute("SELECT config FROM item_configs WHERE key = ?", (key,)).fetchone()
+                if row:
+                    merged = json.loads(row[0])
+                    merged.update(config)
+                    config = merged
+            rows.append((key, json.dumps(config, ensure_ascii=False), now))
+        self._conn.executemany(
+            "INSERT INTO item_configs (key, config, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+            rows
+        )
 
     def set_item_config(self, item_name: str, config: Dict[str, Any]):
-        if item_name not in self.configs:
-            self.configs[item_name] = {}
-        self.configs[item_name].update(config)
-        self.save()
+        self.set_item_configs({item_name: config})
 
-    def get_item_config(self, item_name: str) -> Dict[str, Any]:
-        return self.configs.get(item_name, {})
+    def set_item_configs(self, configs: Dict[str, Dict[str, Any]]):
+        """批量写入配置 (与已有配置合并)，在同一个事务中完成"""
+        if not configs:
+            return
+        with self._lock, self._conn:
+            self._upsert(configs.items())
 
     def delete_item_config(self, item_name: str):
-        if item_name in self.configs:
-            del self.configs[item_name]
-            self.save()
+        self.delete_item_configs([item_name])
 
-    def get_all_items(self) -> Dict[str, Any]:
-        # Filter out special keys
-        return {k: v for k, v in self.configs.items() if not k.startswith("__")}
+    def delete_item_configs(self, item_names: Iterable[str]):
+        """批量删除配置，在同一个事务中完成"""
+        keys = [(name,) for name in item_names]
+        if not keys:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM item_configs WHERE key = ?", keys)
 
     def set_global_config(self, config: Dict[str, Any]):
-        self.configs["__GLOBAL_CONFIG__"] = config
-        self.save()
+        with self._lock, self._conn:
+            self._upsert([(GLOBAL_CONFIG_KEY, config)], merge=False)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def get_item_config(self, item_name: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT config FROM item_configs WHERE key = ?", (item_name,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def get_all_items(self) -> Dict[str, Any]:
+        # Filter out special keys
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, config FROM item_configs WHERE key NOT LIKE '\\_\\_%' ESCAPE '\\'"
+            ).fetchall()
+        return {key: json.loads(config) for key, config in rows}
 
     def get_global_config(self) -> Dict[str, Any]:
-        return self.configs.get("__GLOBAL_CONFIG__", {})
+        return self.get_item_config(GLOBAL_CONFIG_KEY)
 
 # --- State Persistence (SQLite) ---
-from ..db.database import SessionLocal
+from datetime import datetime
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from ..db.database import SessionLocal, engine
 from ..db.models import ItemState
 from typing import List
 
-def load_all_item_states() -> Dict[str, Dict]:
-    """从数据库加载所有检测器的状态"""
-    db = SessionLocal()
+# 每个事务写入的状态条数
+STATE_UPSERT_CHUNK = 10000
+# Checkpoint 写入的列 (item_name 为主键)
+STATE_COLUMNS = ("baseline", "std", "k_value", "s_plus", "s_minus", "last_data_timestamp", "snapshot", "lsn", "updated_at")
+
+
+def _state_upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT(item_name) DO UPDATE (SQLite / PostgreSQL)，其他数据库返回 None"""
+    dialects = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+    if dialect_name not in dialects:
+        return None
+    table = ItemState.__table__
+    stmt = dialects[dialect_name](table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.item_name],
+        set_={name: stmt.excluded[name] for name in STATE_COLUMNS}
+    )
+
+
+def load_all_item_states(updated_after: Optional[datetime] = None) -> Dict[str, Dict]:
+    """
+    从数据库加载检测器的状态
+    - updated_after: 只加载该时间 (UTC) 之后保存的状态，以及没有完整快照的状态
+      (其余检测器从状态文件恢复，不需要读取快照列)
+    """
+    table = ItemState.__table__
+    query = select(table.c.item_name, *(table.c[name] for name in STATE_COLUMNS if name != "updated_at"))
+    if updated_after is not None:
+        query = query.where(or_(table.c.updated_at > updated_after, table.c.snapshot.is_(None)))
     try:
-        states = db.query(ItemState).all()
+        with engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
         return {
-            s.item_name: {
-                "baseline": s.baseline,
-                "std": s.std,
-                "k_value": s.k_value,
-                "s_plus": s.s_plus,
-                "s_minus": s.s_minus,
-                "last_data_timestamp": s.last_data_timestamp
+            row["item_name"]: {
+                "baseline": row["baseline"],
+                "std": row["std"],
+                "k_value": row["k_value"],
+                "s_plus": row["s_plus"],
+                "s_minus": row["s_minus"],
+                "last_data_timestamp": row["last_data_timestamp"],
+                "snapshot": row["snapshot"],
+                "lsn": row["lsn"]
             }
-            for s in states
+            for row in rows
         }
     except Exception as e:
         print(f"Load states failed: {e}")
         return {}
-    finally:
-        db.close()
 
-def save_item_states(states_data: List[Dict]):
-    """批量保存检测器状态到数据库 (Upsert)"""
+
+def save_item_states(states_data: List[Dict], chunk_size: int = STATE_UPSERT_CHUNK) -> int:
+    """
+    批量保存检测器状态到数据库 (Upsert)
+    - SQLite / PostgreSQL: 每 chunk_size 条一个事务，INSERT ... ON CONFLICT DO UPDATE (executemany)
+    - 其他数据库: 回退为逐条 merge
+    返回成功写入的条数 (某个分块失败时记录错误并继续写入后续分块)
+    """
     if not states_data:
-        return
+        return 0
+
+    now = datetime.utcnow()
+    rows = [{
+        "item_name": data["item_name"],
+        "baseline": data["baseline"],
+        "std": data["std"],
+        "k_value": data["k_value"],
+        "s_plus": data["s_plus"],
+        "s_minus": data["s_minus"],
+        "last_data_timestamp": data.get("last_data_timestamp"),
+        "snapshot": data.get("snapshot"),
+        "lsn": data.get("lsn"),
+        "updated_at": now
+    } for data in states_data]
+
+    stmt = _state_upsert_statement(engine.dialect.name)
+    if stmt is None:
+        return _merge_item_states(rows)
 
+    saved = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, chunk)
+            saved += len(chunk)
+        except Exception as e:
+            print(f"Save states failed ({len(chunk)} states from #{start}): {e}")
+    return saved
+
+
+def _merge_item_states(rows: List[Dict]) -> int:
+    """逐条 merge (不支持 ON CONFLICT 的数据库)"""
     db = SessionLocal()
     try:
-        # SQLite Upsert via Merge
-        # SQLAlchemy merge is slow for batch, but efficient enough for 100k items if batched?
-        # For 1M items, raw SQL bulk insert/update is better. 
-        # But let's stick to merge for simplicity first.
-        # Optimized: Delete then Insert? No, that loses history updated_at if not careful.
-        # Let's use merge for now.
-        
-        for data in states_data:
-            state_obj = ItemState(
-                item_name=data["item_name"],
-                baseline=data["baseline"],
-                std=data["std"],
-                k_value=data["k_value"],
-                s_plus=data["s_plus"],
-                s_minus=data["s_minus"],
-                last_data_timestamp=data.get("last_data_timestamp")
-            )
-            db.merge(state_obj)
-            
+        for row in rows:
+            db.merge(ItemState(**row))
         db.commit()
+        return len(rows)
     except Exception as e:
         db.rollback()
         print(f"Save states failed: {e}")
+        return 0
     finally:
         db.close()
 
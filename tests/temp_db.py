@@ -0,0 +1,36 @@
+"""
+测试用临时 SQLite 数据库
+
+检测器状态 (persistence) 与检测记录 (DetectionEngineManager) 默认写入 data/storage/defect_warning.db；
+use_temp_database(self) 在 setUp 中调用，把两者指向临时文件，测试结束时自动恢复并删除。
+同时设置 DATABASE_URL，spawn 启动的分片进程也写入同一个临时数据库。
+"""
+import os
+import shutil
+import tempfile
+from unittest import mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.db.migrations import run_migrations
+from src.db.models import Base
+
+
+def use_temp_database(test):
+    """test: unittest.TestCase；返回临时数据库的 engine"""
+    tmp = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, tmp, True)
+    url = f"sqlite:///{os.path.join(tmp, 'defect_warning.db')}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    test.addCleanup(engine.dispose)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+
+    for patcher in (
+        mock.patch("src.core.manager.engine", engine),
+        mock.patch("src.utils.persistence.engine", engine),
+        mock.patch("src.utils.persistence.SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine)),
+        mock.patch.dict(os.environ, {"DATABASE_URL": url}),
+    ):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return engine
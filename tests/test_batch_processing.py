@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime, timedelta
+from src.core.manager import DetectionEngineManager
+from tests.temp_db import use_temp_database
+
+class TestBatchProcessing(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.config = {"enable_cooldown": True}
+        self.start = datetime(2026, 1, 1)
+
+    def _readings(self):
+        readings = []
+        for i in range(120):
+            for station in ("S1", "S2"):
+                value = 1.0 + (0.5 if 60 <= i < 70 and station == "S1" else 0.0) + 0.01 * (i % 5)
+                readings.append({
+                    "item_name": "GapTest",
+                    "item_type": "parameter",
+                    "value": value,
+                    "uph": 500,
+                    "timestamp": self.start + timedelta(hours=i),
+                    "metadata": {"product": "ProdA", "line": "L1", "station": station},
+                    "item_config": {"mu0": 1.0, "base_uph": 500}
+                })
+        return readings
+
+    def test_batch_matches_sequential(self):
+        """Batch processing must produce the same alerts/pushes as one-by-one processing"""
+        sequential = DetectionEngineManager(dict(self.config))
+        expected = [
+            sequential.process_data(r["item_name"], r["item_type"], r["value"], r["uph"],
+                                    r["timestamp"], r["metadata"], r["item_config"])
+            for r in self._readings()
+        ]
+
+        batched = DetectionEngineManager(dict(self.config))
+        results = batched.process_batch(self._readings())
+
+        self.assertEqual(len(results), len(expected))
+        for got, want in zip(results, expected):
+            self.assertEqual(got["unique_key"], want["unique_key"])
+            self.assertEqual(got["alert"], want["alert"])
+            self.assertEqual(got["should_push"], want["should_push"])
+        self.assertTrue(any(r["alert"] for r in results))
+
+    def test_bad_reading_does_not_abort_batch(self):
+        manager = DetectionEngineManager(dict(self.config))
+        readings = self._readings()[:4]
+        readings[1] = dict(readings[1], uph=None)
+        results = manager.process_batch(readings)
+        self.assertEqual(len(results), 4)
+        self.assertIn("error", results[1])
+        self.assertNotIn("error", results[0])
+
+    def test_memory_usage_summary(self):
+        manager = DetectionEngineManager(dict(self.config))
+        manager.process_batch(self._readings())
+        usage = manager.get_memory_usage()
+        self.assertEqual((usage["detector_count"], usage["detectors"]), (2, []))
+        self.assertEqual(set(usage["components"]), {"detector", "window", "baseline_updater", "k_updater", "trajectory"})
+        detectors = manager.get_memory_usage(top=5)["detectors"]
+        self.assertEqual(len(detectors), 2)
+        self.assertEqual(sum(d["total"] for d in detectors), sum(usage["components"].values()))
+        self.assertEqual(manager.get_memory_usage(top=1, offset=1)["detectors"], detectors[1:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from src.utils.persistence import ConfigStore
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.dir, "item_configs.db")
+        self.json_path = os.path.join(self.dir, "item_configs.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_migrate_from_json_once(self):
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            json.dump({"__GLOBAL_CONFIG__": {"target_arl0": 1000.0}, "Gap": {"mu0": 1.0}}, f)
+        store = ConfigStore(self.db_path, legacy_json_path=self.json_path)
+        self.assertEqual(store.get_global_config(), {"target_arl0": 1000.0})
+        self.assertEqual(store.get_all_items(), {"Gap": {"mu0": 1.0}})
+        store.delete_item_config("Gap")
+        store.close()
+
+        # 再次打开时不重复导入 (已删除的配置不会回来)
+        store = ConfigStore(self.db_path, legacy_json_path=self.json_path)
+        self.assertEqual(store.get_all_items(), {})
+        store.close()
+
+    def test_upsert_merge_and_batch(self):
+        store = ConfigStore(self.db_path)
+        store.set_item_config("Gap", {"mu0": 1.0, "base_uph": 500})
+        store.set_item_config("Gap", {"mu0": 2.0})
+        self.assertEqual(store.get_item_config("Gap"), {"mu0": 2.0, "base_uph": 500})
+
+        store.set_item_configs({f"item_{i}": {"mu0": i} for i in range(100)})
+        store.set_global_config({"target_arl0": 250.0})
+        self.assertEqual(len(store.get_all_items()), 101)
+        store.delete_item_configs([f"item_{i}" for i in range(50)])
+        self.assertEqual(len(store.get_all_items()), 51)
+        self.assertEqual(store.get_item_config("item_60"), {"mu0": 60})
+        self.assertEqual(store.get_item_config("missing"), {})
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
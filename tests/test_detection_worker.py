@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import unittest
+from src.api.detection_worker import DetectionWorker, WorkerBusyError
+
+class TestDetectionWorker(unittest.TestCase):
+    def test_per_key_order(self):
+        async def scenario():
+            worker = DetectionWorker(concurrency=3, queue_size=100)
+            worker.start()
+            seen = {}
+
+            def job(key, i):
+                seen.setdefault(key, []).append(i)
+                return (key, i)
+
+            keys = [f"k{i % 5}" for i in range(50)]
+            results = await asyncio.gather(*[
+                worker.submit(key, lambda key=key, i=i: job(key, i)) for i, key in enumerate(keys)
+            ])
+            grouped = await worker.submit_grouped(keys, lambda indices: [keys[i] for i in indices])
+            await worker.stop()
+            return keys, seen, results, grouped
+
+        keys, seen, results, grouped = asyncio.run(scenario())
+        self.assertEqual(results, [(key, i) for i, key in enumerate(keys)])
+        self.assertEqual(grouped, keys)
+        for key, order in seen.items():
+            self.assertEqual(order, sorted(order))
+
+    def test_backpressure(self):
+        async def scenario():
+            worker = DetectionWorker(concurrency=1, queue_size=2)
+            worker.start()
+            release = threading.Event()
+            pending = [asyncio.create_task(worker.submit("a", release.wait))]
+            await asyncio.sleep(0.05)  # 第一个任务已开始执行
+            pending += [asyncio.create_task(worker.submit("a", release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)  # 其余两个占满队列
+            try:
+                with self.assertRaises(WorkerBusyError):
+                    await worker.submit("a", lambda: None)
+            finally:
+                release.set()
+            await asyncio.gather(*pending)
+            metrics = worker.get_metrics()
+            await worker.stop()
+            return metrics
+
+        metrics = asyncio.run(scenario())
+        self.assertEqual(metrics["total_rejected"], 1)
+        self.assertEqual(metrics["total_completed"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+from src.core.adaptive_cusum import AdaptiveCUSUMDetector
+from src.core.detector_bank import DetectorBank, BankDetector
+from src.core.manager import DetectionEngineManager
+from tests.temp_db import use_temp_database
+
+class TestDetectorBank(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+
+    def _stream(self, item_type, seed):
+        rng = random.Random(seed)
+        start = datetime(2026, 1, 1)
+        for i in range(1500):
+            if item_type == "yield":
+                value = max(0.0, rng.gauss(0.002, 0.001)) + (0.004 if 900 <= i < 920 else 0.0)
+            else:
+                value = rng.gauss(3.3, 0.02) + (0.1 if 1000 <= i < 1010 else 0.0)
+            uph = rng.choice([500, 480, 200, 60, 30, 900])
+            yield start + timedelta(hours=i), value, uph
+
+    def test_single_slot_matches_scalar(self):
+        """Each item type / side combination must alert exactly like AdaptiveCUSUMDetector"""
+        alerts = 0
+        for item_type, mu0 in (("yield", 0.002), ("parameter", 3.3)):
+            for side in ("upper", "lower", "both"):
+                scalar = AdaptiveCUSUMDetector(mu0=mu0, base_uph=500, item_type=item_type,
+                                               monitoring_side=side, penalty_strength=0.6)
+                bank = DetectorBank()
+                view = BankDetector(bank, bank.add_detector(mu0=mu0, base_uph=500, item_type=item_type,
+                                                             monitoring_side=side, penalty_strength=0.6))
+                for ts, value, uph in self._stream(item_type, seed=len(side)):
+                    expected = scalar.update(value, current_uph=uph, timestamp=ts)
+                    got = view.update(value, current_uph=uph, timestamp=ts)
+                    self.assertEqual(got, expected, f"{item_type}/{side} at {ts}")
+                    alerts += expected
+                    self.assertAlmostEqual(view.S_plus, scalar.S_plus, places=9)
+                    self.assertAlmostEqual(view.S_minus, scalar.S_minus, places=9)
+                self.assertEqual(view.total_samples, scalar.total_samples)
+                status, expected_status = view.get_current_status(), scalar.get_current_status()
+                for key in ("baseline", "S_plus", "S_minus", "h_value", "k_value"):
+                    self.assertAlmostEqual(status[key], expected_status[key], places=9)
+        self.assertGreater(alerts, 0)
+
+    def test_vectorized_manager_matches_scalar(self):
+        readings = []
+        start = datetime(2026, 1, 1)
+        rng = random.Random(7)
+        for i in range(300):
+            for station in ("S1", "S2", "S3"):
+                readings.append({
+                    "item_name": "Voltage",
+                    "item_type": "parameter",
+                    "value": rng.gauss(3.3, 0.05) + (0.3 if station == "S2" and i > 200 else 0.0),
+                    "uph": rng.choice([500, 100, 40]),
+                    "timestamp": start + timedelta(hours=i),
+                    "metadata": {"product": "P", "line": "L1", "station": station},
+                    "item_config": {"mu0": 3.3, "base_uph": 500}
+                })
+        # 同一 key 在一个批次内出现多次
+        scalar = DetectionEngineManager({"enable_cooldown": True})
+        vectorized = DetectionEngineManager({"enable_cooldown": True, "engine_mode": "vectorized"})
+        expected = scalar.process_batch(readings)
+        got = vectorized.process_batch(readings)
+        self.assertEqual([r["alert"] for r in got], [r["alert"] for r in expected])
+        self.assertEqual([r["should_push"] for r in got], [r["should_push"] for r in expected])
+        self.assertIsInstance(vectorized.detectors["p::l1::s2::Voltage"], BankDetector)
+
+    def test_slot_reuse(self):
+        bank = DetectorBank(capacity=2)
+        slots = [bank.add_detector(mu0=0.001, base_uph=500) for _ in range(5)]
+        self.assertEqual(slots, [0, 1, 2, 3, 4])
+        bank.remove_detector(2)
+        self.assertEqual(bank.add_detector(mu0=0.001, base_uph=500), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, inspect, text
+from src.core.manager import DetectionEngineManager
+from src.db.migrations import run_migrations
+from tests.temp_db import use_temp_database
+
+class TestDetectorSnapshot(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+
+    def _readings(self, count):
+        rnd = random.Random(7)
+        start = datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=8)))
+        readings = []
+        for i in range(count):
+            for k in range(2):
+                value = 1.0 + rnd.gauss(0, 0.05) + (0.3 if 900 < i < 920 else 0.0)
+                readings.append({
+                    "item_name": f"Snap{k}",
+                    "item_type": "parameter" if k else "yield",
+                    "value": value if k else value / 100,
+                    "uph": 20 if i % 97 == 0 else 500,  # 穿插极低UPH点
+                    "timestamp": start + timedelta(hours=i),
+                    "metadata": {},
+                    "item_config": {"mu0": 1.0 if k else 0.01, "monitoring_side": "both"}
+                })
+        return readings
+
+    def _run(self, manager, readings):
+        if manager.bank is not None:
+            results, records = manager._detect_batch_vectorized(readings)
+        else:
+            results, records = manager._detect_batch(readings)
+        return [(r["alert"], rec["s_plus"], rec["s_minus"], rec["baseline"], rec["k_value"], rec["std"])
+                for r, rec in zip(results, records)]
+
+    def test_restore_is_bit_identical(self):
+        readings = self._readings(1600)
+        head, tail = readings[:2400], readings[2400:]
+        for mode in ("scalar", "vectorized"):
+            original = DetectionEngineManager({"engine_mode": mode})
+            self._run(original, head)
+            states = {key: detector.get_state() for key, detector in original.detectors.items()}
+            expected = self._run(original, tail)
+
+            # 快照在两种引擎模式之间通用
+            for target_mode in ("scalar", "vectorized"):
+                restored = DetectionEngineManager({"engine_mode": target_mode})
+                restored.initial_states = dict(states)
+                self.assertEqual(self._run(restored, tail), expected, f"{mode} -> {target_mode}")
+
+            # 只有摘要参数时无法恢复学习状态
+            summary = DetectionEngineManager({"engine_mode": mode})
+            summary.initial_states = {key: dict(state, snapshot=None) for key, state in states.items()}
+            self.assertNotEqual(self._run(summary, tail), expected)
+
+    def test_mismatched_window_falls_back(self):
+        manager = DetectionEngineManager({})
+        self._run(manager, self._readings(50))
+        state = manager.detectors["Snap1"].get_state()
+
+        other = DetectionEngineManager({"history_retention": 10})
+        detector = other.get_or_create_detector("Snap1", "parameter", mu0=1.0, base_uph=500)
+        detector.window.window_size = 100  # 窗口参数不一致
+        detector.set_state(state)
+        self.assertEqual(detector.total_samples, 0)
+        self.assertEqual(detector.S_plus, state["s_plus"])
+
+class TestStateFile(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "states.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_lazy_restore_and_newer_db_states(self):
+        helper = TestDetectorSnapshot()
+        readings = helper._readings(1200)
+        head, tail = readings[:1600], readings[1600:]
+        original = DetectionEngineManager({"engine_mode": "vectorized"})
+        helper._run(original, head)
+        self.assertEqual(original.save_state_file(self.path), 2)
+        expected = helper._run(original, tail)
+
+        for mode in ("scalar", "vectorized"):
+            restored = DetectionEngineManager({"engine_mode": mode})
+            self.assertEqual(restored.load_all_states(state_file=self.path), 2)
+            self.assertNotIn("Snap1", restored.initial_states)
+            # 预热只登记检测键，首次访问时才从文件恢复
+            restored.prewarm_detectors({"Snap1": {"item_type": "parameter", "mu0": 1.0}})
+            self.assertEqual((len(restored.detectors), restored.detector_count()), (0, 1))
+            self.assertEqual(helper._run(restored, tail), expected, mode)
+
+        # 状态文件写入之后保存到数据库的状态优先
+        original = DetectionEngineManager({"engine_mode": "scalar"})
+        helper._run(original, head)
+        original.save_state_file(self.path)
+        helper._run(original, tail[:10])
+        self.assertEqual(original.checkpoint_dirty(1.0), 2)
+        expected = helper._run(original, tail[10:])
+
+        restored = DetectionEngineManager({"engine_mode": "vectorized"})
+        restored.load_all_states(state_file=self.path)
+        self.assertIn("Snap1", restored.initial_states)
+        # 未访问的检测键: 数据库中的快照写入新文件
+        self.assertEqual(restored.save_state_file(self.path), 2)
+
+        restored = DetectionEngineManager({"engine_mode": "scalar"})
+        restored.load_all_states(state_file=self.path)
+        self.assertNotIn("Snap1", restored.initial_states)
+        self.assertEqual(helper._run(restored, tail[10:]), expected)
+
+class TestMigrations(unittest.TestCase):
+    def test_adds_snapshot_column(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'old.db')}")
+            with engine.begin() as conn:
+                conn.execute(text("CREATE TABLE item_states (item_name VARCHAR PRIMARY KEY, baseline FLOAT)"))
+            self.assertEqual(run_migrations(engine), 2)
+            self.assertLessEqual({"snapshot", "lsn"}, {c["name"] for c in inspect(engine).get_columns("item_states")})
+            self.assertEqual(run_migrations(engine), 0)
+            engine.dispose()
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_adds_record_indexes(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'old.db')}")
+            with engine.begin() as conn:
+                conn.execute(text("CREATE TABLE detection_records (id INTEGER PRIMARY KEY, item_name VARCHAR, "
+                                  "station VARCHAR, product VARCHAR, line VARCHAR, timestamp DATETIME)"))
+                conn.execute(text("CREATE TABLE detection_records_20260301 (id INTEGER PRIMARY KEY, item_name_id INTEGER, "
+                                  "station_id INTEGER, product_id INTEGER, line_id INTEGER, timestamp DATETIME)"))
+            self.assertEqual(run_migrations(engine), 4)
+            indexes = {ix["name"]: ix["column_names"] for ix in inspect(engine).get_indexes("detection_records_20260301")}
+            self.assertEqual(indexes["ix_detection_records_20260301_dims_time"],
+                             ["product_id", "line_id", "station_id", "timestamp"])
+            self.assertIn("ix_detection_records_item_time", {ix["name"] for ix in inspect(engine).get_indexes("detection_records")})
+            self.assertEqual(run_migrations(engine), 0)
+            engine.dispose()
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    unittest.main()
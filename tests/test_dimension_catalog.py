@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+from sqlalchemy import create_engine, func, insert, select
+from src.db.catalog import DimensionCatalog
+from src.db.models import Base, DetectionRecord, DimensionTuple
+from src.db.partitions import RecordPartitions
+
+class TestDimensionCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp, 'records.db')}")
+        Base.metadata.create_all(self.engine)
+        self.partitions = RecordPartitions(self.engine)
+        rows = [
+            {"item_name": "V1", "product": "A", "line": "L1", "station": "S1", "timestamp": datetime(2026, 3, 1, 8)},
+            {"item_name": "V2", "product": "A", "line": "L1", "station": "S2", "timestamp": datetime(2026, 3, 2, 8)},
+            {"item_name": "V1", "product": "B", "line": "L2", "station": "S1", "timestamp": datetime(2026, 3, 3, 8)},
+        ]
+        with self.engine.begin() as conn:
+            self.partitions.insert(conn, rows)
+            # 升级前写入的记录 (没有线体)
+            conn.execute(insert(DetectionRecord.__table__),
+                         [{"item_name": "OLD", "product": "A", "station": "S9", "timestamp": datetime(2026, 2, 27)}])
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp)
+
+    def _table_rows(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(DimensionTuple.__table__)).scalar()
+
+    def test_backfill_and_cross_filter(self):
+        catalog = DimensionCatalog(self.partitions)
+        self.assertEqual(catalog.rebuild(), 4)
+        self.assertEqual(catalog.backfilled, 4)
+        self.assertEqual(self._table_rows(), 4)
+        self.assertEqual(catalog.options({}), {
+            "stations": ["S1", "S2", "S9"], "products": ["A", "B"], "lines": ["L1", "L2"], "items": ["OLD", "V1", "V2"]})
+        # 每个维度按其余维度过滤，不按自身过滤
+        self.assertEqual(catalog.options({"product": "A", "station": "S1"}), {
+            "stations": ["S1", "S2", "S9"], "products": ["A", "B"], "lines": ["L1"], "items": ["V1"]})
+        self.assertEqual(catalog.options({"item_name": "V1", "line": "L2"})["products"], ["B"])
+        self.assertEqual(catalog.options({"product": "unknown"})["items"], [])
+
+    def test_observe_flush_prune(self):
+        catalog = DimensionCatalog(self.partitions)
+        catalog.rebuild()
+        meta = {"product": "C", "line": "L3", "station": "S3"}
+        catalog.observe("V3", meta, "2026-03-04T10:00:00")
+        catalog.observe("V3", meta, "2026-03-04T11:00:00")  # 已知组合、同一天: 不需要再写入
+        self.assertEqual(catalog.options({"product": "C"})["items"], ["V3"])
+        self.assertEqual(catalog.flush(), 1)
+        self.assertEqual(catalog.flush(), 0)
+
+        # 数字维度按字符串保存 (与检测记录一致)，与字符串维度混在一起也能排序
+        catalog.observe("V4", {"product": "C", "line": 4, "station": 0}, "2026-03-04T12:00:00")
+        self.assertEqual(catalog.options({"product": "C"})["lines"], ["4", "L3"])
+        self.assertEqual(catalog.options({"line": "4"})["stations"], ["0"])
+        self.assertEqual(catalog.flush(), 1)
+
+        # 新进程从表中加载 (不再回填)
+        reloaded = DimensionCatalog(self.partitions)
+        self.assertEqual(reloaded.rebuild(), 6)
+        self.assertEqual(reloaded.backfilled, 0)
+
+        self.assertEqual(reloaded.prune(date(2026, 3, 2)), 2)  # OLD (2/27) 与 (A, L1, S1, V1) (3/1)
+        self.assertEqual(self._table_rows(), 4)
+        self.assertEqual(reloaded.options({})["items"], ["V1", "V2", "V3", "V4"])
+        self.assertEqual(reloaded.options({"product": "C"})["lines"], ["4", "L3"])
+        self.assertEqual(reloaded.options({"item_name": "V1"})["products"], ["B"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from src.core.effective_config import ConfigResolver, effective_config, generate_detector_key
+from src.core.manager import DetectionEngineManager
+
+class TestConfigResolver(unittest.TestCase):
+    def setUp(self):
+        self.store = {"Gap": {"mu0": 1.0, "base_uph": 800}}
+        self.lookups = []
+        self.global_config = {"cooldown_periods_Gap": 3}
+
+        def lookup(key):
+            self.lookups.append(key)
+            return self.store.get(key, {})
+
+        self.resolver = ConfigResolver(lookup, self.global_config)
+        self.meta = {"product": "P", "line": "L1", "station": "S1"}
+
+    def test_cached_and_negative_cached(self):
+        config = self.resolver.resolve("Gap", self.meta)
+        self.assertEqual(config.unique_key, "p::l1::s1::Gap")
+        self.assertEqual((config.mu0, config.base_uph, config.cooldown_periods), (1.0, 800, 3))
+        self.assertIs(self.resolver.resolve("Gap", self.meta), config)
+
+        missing = self.resolver.resolve("Width", self.meta)
+        self.assertEqual(missing.mu0, 0.0005)
+        self.resolver.resolve("Width", self.meta)
+        # 每个检测键只查询一次 (复合键 + 检测项名)
+        self.assertEqual(self.lookups, ["p::l1::s1::Gap", "Gap", "p::l1::s1::Width", "Width"])
+
+    def test_invalidation(self):
+        self.resolver.resolve("Gap", self.meta)
+        self.store["p::l1::s1::Gap"] = {"mu0": 2.0}
+        self.resolver.invalidate("p::l1::s1::Gap")
+        self.assertEqual(self.resolver.resolve("Gap", self.meta).mu0, 2.0)
+
+        del self.store["p::l1::s1::Gap"]
+        self.resolver.invalidate("Gap")
+        self.assertEqual(self.resolver.resolve("Gap", self.meta).mu0, 1.0)
+
+        self.global_config["cooldown_periods_Gap"] = 9
+        self.resolver.invalidate_all()
+        self.assertEqual(self.resolver.resolve("Gap", self.meta).cooldown_periods, 9)
+
+    def test_cache_follows_detector_key(self):
+        # 元数据按 generate_detector_key 归一化后不同的输入不能共用缓存
+        cases = [
+            ({"line": 1, "station": "S"}, "unknownproduct::1::s::X"),
+            ({"line": 1.0, "station": "S"}, "unknownproduct::1.0::s::X"),
+            ({"line": True, "station": "S"}, "unknownproduct::true::s::X"),
+            ({"product": None, "line": 1, "station": "S"}, "none::1::s::X"),
+        ]
+        for meta, expected in cases:
+            self.assertEqual(self.resolver.resolve("X", meta).unique_key, expected)
+            self.assertEqual(generate_detector_key("X", meta), expected)
+        # 归一化后相同的输入共用缓存
+        self.assertEqual(self.resolver.resolve("X", {"line": "1", "station": "s"}).unique_key, "unknownproduct::1::s::X")
+        self.assertEqual(self.resolver.hits, 1)
+
+    def test_matches_manager_fallback(self):
+        manager = DetectionEngineManager({"mu0_Gap": 2.5, "cooldown_periods_Gap": 4})
+        config = effective_config("Gap", "Gap", {}, manager.global_config)
+        self.assertEqual((config.mu0, config.cooldown_periods), (2.5, 4))
+        result, _ = manager._detect("Gap", "parameter", 2.5, 500, "2026-01-01T00:00:00", {}, config)
+        self.assertEqual(result["unique_key"], "Gap")
+        self.assertEqual(manager.detectors["Gap"].mu0, 2.5)
+
+if __name__ == '__main__':
+    unittest.main()
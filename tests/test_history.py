@@ -0,0 +1,107 @@
+import os
+import math
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from src.db.history import RecordHistory, decode_cursor, parse_fields
+from src.db.models import Base, DetectionRecord
+from src.db.partitions import RecordPartitions
+from src.utils.downsample import downsample, lttb
+
+class TestRecordHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp, 'records.db')}")
+        Base.metadata.create_all(self.engine)
+        self.partitions = RecordPartitions.for_engine(self.engine)
+        self.history = RecordHistory(self.partitions)
+        self.start = datetime(2026, 3, 1)
+        # 3 天 x 每小时 2 个检测项；同一时刻的两条记录只能靠 id 区分先后
+        rows = [{"item_name": f"P{i % 2}", "station": "S", "value": float(i), "is_alert": i == 101,
+                 "timestamp": self.start + timedelta(hours=i // 2)} for i in range(144)]
+        with self.engine.begin() as conn:
+            self.partitions.insert(conn, rows)
+            # 升级前写入的记录
+            conn.execute(insert(DetectionRecord.__table__),
+                         [{"item_name": "P0", "station": "S", "value": -1.0, "timestamp": self.start - timedelta(hours=1)}])
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp)
+
+    def test_default_page_is_latest(self):
+        records, prev_cursor, next_cursor = self.history.page({"item_name": "P1"}, limit=5)
+        self.assertEqual([r["value"] for r in records], [135.0, 137.0, 139.0, 141.0, 143.0])
+        self.assertIsNotNone(prev_cursor)
+        self.assertEqual(decode_cursor(next_cursor)[1], records[-1]["id"])
+
+    def test_paginate_both_directions(self):
+        seen, cursor = [], None
+        while True:
+            records, cursor, _ = self.history.page({}, limit=7, before=cursor)
+            seen = records + seen
+            if cursor is None:
+                break
+        self.assertEqual([r["value"] for r in seen], [-1.0] + [float(i) for i in range(144)])
+
+        forward, cursor = [], None
+        first, _, cursor = self.history.page({}, end=self.start - timedelta(hours=1), limit=1)
+        while cursor:
+            records, _, cursor = self.history.page({}, limit=10, after=cursor)
+            forward.extend(records)
+        self.assertEqual(first + forward, seen)
+        with self.assertRaises(ValueError):
+            self.history.page({}, before="x", after="y")
+
+    def test_numeric_dimensions(self):
+        # meta_data 中的数字维度与字符串维度混在同一批写入，按字符串保存与查询
+        day = self.start + timedelta(days=5)
+        self.partitions.write([
+            {"item_name": "N", "station": 3, "product": "A", "line": 7, "value": 1.0, "timestamp": day},
+            {"item_name": "N", "station": "S", "product": "A", "line": 7, "value": 2.0, "timestamp": day + timedelta(hours=1)},
+        ])
+        self.partitions.write([{"item_name": "N", "station": 3, "line": 8, "value": 3.0, "timestamp": day + timedelta(hours=2)}])
+        records, _, _ = self.history.page({"item_name": "N", "station": "3"})
+        self.assertEqual([(r["value"], r["station"], r["line"]) for r in records], [(1.0, "3", "7"), (3.0, "3", "8")])
+
+    def test_fields_projection(self):
+        records, _, _ = self.history.page({"item_name": "P0"}, limit=2, fields=parse_fields("timestamp,value"))
+        self.assertEqual(records[-1], {"timestamp": (self.start + timedelta(hours=71)).isoformat(), "value": 142.0})
+        with self.assertRaises(ValueError):
+            parse_fields("value,password")
+
+    def test_downsampled_keeps_alerts(self):
+        records, total = self.history.downsampled({}, max_points=10, fields=("item_name", "value", "is_alert"))
+        self.assertEqual(total, 145)
+        per_item = {item: [r for r in records if r["item_name"] == item] for item in ("P0", "P1")}
+        self.assertEqual(len(per_item["P0"]), 10)
+        self.assertEqual(len(per_item["P1"]), 10)
+        self.assertIn(101.0, [r["value"] for r in per_item["P1"] if r["is_alert"]])
+        self.assertEqual(per_item["P0"][0]["value"], -1.0)  # legacy 表的首点保留
+
+    def test_downsampled_projects_kept_rows(self):
+        # 第二遍只读取保留记录的 fields 列 (与绘图列无关)
+        records, total = self.history.downsampled({"item_name": "P1"}, max_points=5, fields=("timestamp", "baseline"))
+        self.assertEqual(total, 72)
+        self.assertEqual(len(records), 5)
+        self.assertIn((self.start + timedelta(hours=50)).isoformat(), [r["timestamp"] for r in records])  # 报警点
+        self.assertTrue(all(set(r) == {"timestamp", "baseline"} for r in records))
+        self.assertEqual(records, sorted(records, key=lambda r: r["timestamp"]))
+        self.assertEqual(records[0]["timestamp"], self.start.isoformat())
+
+class TestDownsample(unittest.TestCase):
+    def test_lttb_keeps_shape(self):
+        xs = list(range(1000))
+        ys = [math.sin(x / 50) for x in xs]
+        ys[500] = 10.0
+        selected = lttb(xs, ys, 50)
+        self.assertEqual(len(selected), 50)
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertIn(500, selected)
+        self.assertEqual(downsample(xs, ys, 2000), xs)
+        self.assertTrue({3, 7} <= set(downsample(xs, ys, 10, keep=[3, 7])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+import numpy as np
+from src.core.observation_window import ObservationWindow
+from src.core.baseline_updater import AdaptiveBaseline
+from src.core.k_updater import AdaptiveKUpdater
+from src.core.adaptive_cusum import AdaptiveCUSUMDetector
+
+class ListWindow:
+    """原 AdaptiveBaseline / AdaptiveKUpdater 的列表实现 (作为对照)"""
+    def __init__(self, window_size, radius, low_radius=0):
+        self.window_size = window_size
+        self.radius = radius
+        self.low_radius = low_radius
+        self.sliding_buffer = []
+        self.sliding_alerts = set()
+
+    def push(self, rate, is_alert, is_low):
+        self.sliding_buffer.append((rate, is_low))
+        if is_alert:
+            self.sliding_alerts.add(len(self.sliding_buffer) - 1)
+        if len(self.sliding_buffer) > self.window_size:
+            self.sliding_buffer.pop(0)
+            self.sliding_alerts = {i - 1 for i in self.sliding_alerts if i > 0}
+
+    def invalid_indices(self):
+        invalid = set()
+        for i, (_, low) in enumerate(self.sliding_buffer):
+            if low:
+                invalid.update(range(max(0, i - self.low_radius),
+                                     min(len(self.sliding_buffer), i + self.low_radius + 1)))
+        for alert_idx in self.sliding_alerts:
+            invalid.update(range(max(0, alert_idx - self.radius),
+                                 min(len(self.sliding_buffer), alert_idx + self.radius + 1)))
+        return invalid
+
+    def valid_rates(self):
+        invalid = self.invalid_indices()
+        return [rate for i, (rate, _) in enumerate(self.sliding_buffer) if i not in invalid]
+
+def invalid_indices(mask):
+    return set(np.flatnonzero(~mask).tolist())
+
+class TestObservationWindow(unittest.TestCase):
+    def test_matches_list_implementation(self):
+        """基准口径 (极低UPH只剔除自身) 与 K 值口径 (剔除邻域) 都与原列表实现一致"""
+        rng = random.Random(3)
+        window = ObservationWindow(window_size=50, invalid_points_around_alert=4)
+        baseline_ref = ListWindow(50, 4, low_radius=0)
+        k_ref = ListWindow(50, 4, low_radius=4)
+        for i in range(3000):
+            # 中途出现电平跳变，检验平移累计和的数值稳定性
+            rate = 3.3 + (0.5 if i > 1500 else 0.0) + rng.gauss(0, 0.01)
+            is_alert = rng.random() < 0.03
+            is_low = rng.random() < 0.05
+            window.push(rate, is_alert=is_alert, is_low_uph=is_low)
+            baseline_ref.push(rate, is_alert, is_low)
+            k_ref.push(rate, is_alert, is_low)
+
+            np.testing.assert_array_equal(window.ordered_values(), [r for r, _ in baseline_ref.sliding_buffer])
+            self.assertEqual(invalid_indices(window.baseline_valid_mask()), baseline_ref.invalid_indices())
+            self.assertEqual(invalid_indices(window.k_valid_mask()), k_ref.invalid_indices())
+
+            valid = baseline_ref.valid_rates()
+            self.assertEqual(window.baseline_stats.count, len(valid))
+            if valid:
+                self.assertAlmostEqual(window.baseline_stats.mean(), np.mean(valid), delta=1e-12)
+            else:
+                self.assertIsNone(window.baseline_stats.mean())
+
+            valid = k_ref.valid_rates()
+            self.assertEqual(window.k_stats.count, len(valid))
+            if valid:
+                self.assertAlmostEqual(window.k_stats.std(), np.std(valid), delta=1e-9)
+
+    def test_updaters_share_window(self):
+        detector = AdaptiveCUSUMDetector(mu0=3.3, base_uph=500, item_type="parameter", monitoring_side="both")
+        start = datetime(2026, 1, 1)
+        for i in range(30):
+            detector.update(3.3, current_uph=500, timestamp=start + timedelta(hours=i))
+        self.assertIs(detector.baseline_updater.window, detector.k_updater.window)
+        self.assertEqual(len(detector.window), 30)
+        self.assertEqual(len(detector.baseline_updater.data_buffer), 30)
+
+    def test_k_update(self):
+        updater = AdaptiveKUpdater(window_size=100, update_interval=24, base_uph=500, min_detection_ratio=0.1)
+        start = datetime(2026, 1, 1)
+        rng = random.Random(11)
+        rates = []
+        for i in range(100):
+            rate = rng.gauss(3.3, 0.05)
+            uph = 20 if i in (30, 31, 95) else 500
+            updater.add_data_point(start + timedelta(hours=i), rate, False, uph, 3.3)
+            rates.append(rate)
+        # 低UPH点及其前后 10 个点被剔除
+        invalid = set(range(20, 42)) | set(range(85, 100))
+        expected_std = np.std([r for i, r in enumerate(rates) if i not in invalid])
+        self.assertEqual(updater.update_history[-1].valid_points, 100 - len(invalid))
+        self.assertAlmostEqual(updater.get_current_std(), expected_std, delta=1e-12)
+        # 首次更新也受最大步长 (10%) 限制
+        self.assertTrue(updater.update_history[-1].is_limited)
+        self.assertAlmostEqual(updater.get_current_k(), min(0.005 * 1.1, expected_std / 2.0))
+
+    def test_baseline_update(self):
+        updater = AdaptiveBaseline(window_size=100, update_interval=24, base_uph=500, min_detection_ratio=0.1)
+        start = datetime(2026, 1, 1)
+        rates = []
+        for i in range(160):
+            rate = 0.001 + 0.0001 * (i % 7)
+            uph = 20 if i % 13 == 0 else 500
+            updater.add_data_point(start + timedelta(hours=i), rate, False, uph, 0.001)
+            rates.append((rate, uph))
+            if i == 99:
+                window = rates[-100:]
+                expected = np.mean([r for r, u in window if u >= 50])
+                self.assertAlmostEqual(updater.get_current_baseline(), expected, delta=1e-15)
+        self.assertEqual(len(updater.update_history), 3)
+        self.assertEqual(updater.update_history[-1].window_points, 100)
+
+    def test_bounded_retention(self):
+        detector = AdaptiveCUSUMDetector(
+            mu0=3.3, base_uph=500, item_type="parameter", monitoring_side="both",
+            history_retention=50, update_history_retention=2
+        )
+        start = datetime(2026, 1, 1)
+        rng = random.Random(5)
+        for i in range(3000):
+            uph = 20 if i % 97 == 0 else 500
+            detector.update(rng.gauss(3.3, 0.05), current_uph=uph, timestamp=start + timedelta(hours=i))
+            if i == 1000:
+                usage_early = detector.memory_usage()["total"]
+        window = detector.window
+        self.assertEqual(len(detector.h_history), 50)
+        self.assertEqual(len(window.data_buffer), 50)
+        self.assertEqual(window.data_buffer[-1][0], start + timedelta(hours=2999))
+        # 标记只保留仍在 data_buffer 中的写入序号
+        self.assertTrue(all(idx >= window.data_seq - 50 for idx in window.low_uph_points))
+        self.assertEqual(window.low_uph_points, {i for i in range(2950, 3000) if i % 97 == 0})
+        self.assertEqual(len(detector.baseline_updater.update_history), 2)
+        self.assertEqual(len(detector.k_updater.update_history), 2)
+        # 内存占用不随运行时间增长
+        self.assertLessEqual(detector.memory_usage()["total"], usage_early * 1.05)
+
+    def test_shared_profile(self):
+        a = AdaptiveCUSUMDetector(mu0=0.001, base_uph=500)
+        b = AdaptiveCUSUMDetector(mu0=0.002, base_uph=800)
+        self.assertIs(a.profile, b.profile)
+        self.assertIs(a.baseline_updater.profile, a.profile)
+        self.assertFalse(hasattr(a, "__dict__"))
+        # 单个检测器修改共享常量时不影响其他检测器
+        a.use_fir = True
+        self.assertTrue(a.use_fir)
+        self.assertFalse(b.use_fir)
+        self.assertIsNot(a.profile, b.profile)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, insert, inspect, select
+from src.db.models import Base, DetectionRecord, DimensionValue
+from src.db.partitions import RecordPartitions, partition_name, split_id
+from src.db.retention import RecordRetention
+
+class TestRecordPartitions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp, 'records.db')}")
+        Base.metadata.create_all(self.engine)
+        self.partitions = RecordPartitions.for_engine(self.engine)
+        self.start = datetime(2026, 3, 1)
+        rows = [{"item_name": "P", "station": f"S{i % 2}", "value": float(i), "is_alert": False,
+                 "timestamp": self.start + timedelta(hours=6 * i)} for i in range(20)]
+        with self.engine.begin() as conn:
+            self.partitions.insert(conn, rows)
+            # 升级前写入的记录
+            conn.execute(insert(DetectionRecord.__table__),
+                         [{"item_name": "P", "station": "S0", "value": -1.0, "timestamp": self.start - timedelta(days=1)}])
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp)
+
+    def test_routing_and_ids(self):
+        self.assertEqual(self.partitions.days(), [date(2026, 3, d) for d in range(1, 6)])
+        self.assertIn(f"ix_{partition_name(date(2026, 3, 1))}_timestamp",
+                      {ix["name"] for ix in inspect(self.engine).get_indexes(partition_name(date(2026, 3, 1)))})
+        tables = self.partitions.tables_between(datetime(2026, 3, 2, 12), datetime(2026, 3, 3, 1))
+        self.assertEqual([day for day, _ in tables], [None, date(2026, 3, 2), date(2026, 3, 3)])
+
+        ids = []
+        with self.engine.connect() as conn:
+            for day, table in self.partitions.tables_between():
+                rows = list(conn.execute(select(table)))
+                for row, record in zip(rows, self.partitions.to_dicts(conn, rows, day)):
+                    self.assertEqual(split_id(record["id"]), (day, row.id))
+                    self.assertEqual((record["item_name"], record["station"]), ("P", f"S{int(record['value']) % 2}" if day else "S0"))
+                    ids.append(record["id"])
+            self.assertEqual(sorted(self.partitions.distinct(conn, date(2026, 3, 1), self.partitions.table(date(2026, 3, 1)),
+                                                             "station", {"item_name": "P"})), ["S0", "S1"])
+            self.assertIsNone(self.partitions.conditions(conn, date(2026, 3, 1), self.partitions.table(date(2026, 3, 1)),
+                                                         {"station": "unknown"}))
+        self.assertEqual(len(set(ids)), 21)
+
+    def test_index_choice(self):
+        # 按时间排序的查询: 等值条件覆盖组合索引 timestamp 之前的全部列时才走组合索引，否则顺着 timestamp 索引扫描
+        day = date(2026, 3, 1)
+        table = self.partitions.table(day)
+        with self.engine.begin() as conn:
+            self.partitions.insert(conn, [{"item_name": "P", "product": "A", "line": "L", "station": "S0", "timestamp": self.start}])
+            for filters, index in (({"item_name": "P", "station": "S0"}, "item_time"),
+                                   ({"product": "A", "line": "L", "station": "S0"}, "dims_time"),
+                                   ({"product": "A"}, "timestamp")):
+                q = select(table).where(*self.partitions.conditions(conn, day, table, filters, by_time=True))
+                sql = str(q.order_by(table.c.timestamp).compile(conn.engine, compile_kwargs={"literal_binds": True}))
+                plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+                self.assertIn(f"ix_{table.name}_{index}", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_dimension_dictionary(self):
+        # 维度字符串只保存一次，新的写入器 (另一个进程) 从数据库取得相同的 ID
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(select(DimensionValue.value)).scalars().all().count("P"), 1)
+        other = RecordPartitions(self.engine)
+        with self.engine.begin() as conn:
+            other.insert(conn, [{"item_name": "P", "station": "S2", "timestamp": self.start}])
+            self.assertEqual(other.dimensions.id_of("P"), self.partitions.dimensions.lookup(conn, "P"))
+        # 写入事务回滚时字典行已提交，缓存中的 ID 仍然有效
+        with self.assertRaises(RuntimeError):
+            with self.engine.begin() as conn:
+                other.insert(conn, [{"item_name": "Q", "timestamp": self.start}])
+                raise RuntimeError
+        with self.engine.connect() as conn:
+            self.assertEqual(RecordPartitions(self.engine).dimensions.lookup(conn, "Q"), other.dimensions.id_of("Q"))
+
+    def test_retention_drops_whole_days(self):
+        retention = RecordRetention(self.engine, retention_days=2, pause=0)
+        deleted = retention.run(datetime(2026, 3, 5, 7))
+        last = retention.last_run
+        self.assertEqual(last["dropped_partitions"], [partition_name(date(2026, 3, d)) for d in (1, 2)])
+        # 截止时刻所在当天的分区与 legacy 表逐行删除
+        self.assertEqual(deleted, 1 + 2)
+        self.assertTrue(last["completed"])
+        self.assertEqual(self.partitions.days(), [date(2026, 3, d) for d in (3, 4, 5)])
+        self.assertNotIn(partition_name(date(2026, 3, 1)), inspect(self.engine).get_table_names())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, select
+from src.db.models import Base
+from src.db.partitions import RecordPartitions
+from src.db.record_writer import RecordWriter
+
+class TestRecordWriter(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.path)
+
+    def _records(self, n):
+        start = datetime(2026, 1, 1)
+        return [{"item_name": "Gap", "item_type": "parameter", "timestamp": start + timedelta(minutes=i),
+                 "value": 1.0, "uph": 500, "is_alert": False} for i in range(n)]
+
+    def _count(self):
+        with self.engine.connect() as conn:
+            return sum(conn.execute(select(func.count()).select_from(table)).scalar()
+                       for _, table in RecordPartitions.for_engine(self.engine).tables_between())
+
+    def test_flush_and_stop(self):
+        writer = RecordWriter(engine=self.engine, batch_size=50, flush_interval=60, max_queue=1000)
+        writer.start()
+        writer.submit(self._records(120))
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self._count(), 120)
+        # 未达到批量也未到时间的记录在 stop() 时写入
+        writer.submit(self._records(7))
+        writer.stop(timeout=5)
+        self.assertEqual(self._count(), 127)
+        metrics = writer.get_metrics()
+        self.assertEqual(metrics["total_written"], 127)
+        self.assertEqual(metrics["backlog"], 0)
+        self.assertFalse(metrics["running"])
+
+    def test_not_started_writes_synchronously(self):
+        writer = RecordWriter(engine=self.engine)
+        writer.submit(self._records(3))
+        self.assertEqual(self._count(), 3)
+
+    def test_bad_record_does_not_lose_batch(self):
+        writer = RecordWriter(engine=self.engine, batch_size=200, flush_interval=60)
+        writer.start()
+        records = self._records(201)
+        records[137]["timestamp"] = "not a timestamp"  # 无法写入 DateTime 列
+        writer.submit(records)
+        self.assertTrue(writer.flush(timeout=10))
+        writer.stop(timeout=5)
+        self.assertEqual(self._count(), 200)
+        metrics = writer.get_metrics()
+        self.assertEqual((metrics["total_written"], metrics["total_failed"], metrics["dead_letters"]), (200, 1, 1))
+        self.assertEqual(writer.dead_letters[0]["record"]["timestamp"], "not a timestamp")
+
+    def test_retries_while_database_locked(self):
+        engine = create_engine(f"sqlite:///{self.path}", connect_args={"timeout": 0.05})
+        writer = RecordWriter(engine=engine, retry_backoff=0.05)
+        # 另一个连接持有写锁 0.3 秒
+        locker = sqlite3.connect(self.path, check_same_thread=False)
+        locker.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.3, locker.rollback).start()
+        writer.submit(self._records(5))
+        locker.close()
+        engine.dispose()
+        self.assertEqual(self._count(), 5)
+        self.assertGreater(writer.get_metrics()["total_retries"], 0)
+        self.assertEqual(writer.get_metrics()["total_failed"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
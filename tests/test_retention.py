@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, insert, select
+from src.db.models import Base, DetectionRecord
+from src.db.retention import RecordRetention
+
+class TestRecordRetention(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp, 'records.db')}")
+        Base.metadata.create_all(self.engine)
+        self.now = datetime(2026, 3, 1)
+        # 旧记录与新记录交错写入 (补传的历史数据主键更大)
+        rows = [{"item_name": f"R{i % 7}", "value": float(i), "is_alert": False,
+                 "timestamp": self.now - timedelta(days=40 if i % 3 else 5, minutes=i)}
+                for i in range(5000)]
+        with self.engine.begin() as conn:
+            conn.execute(insert(DetectionRecord.__table__), rows)
+        self.expired = sum(1 for r in rows if r["timestamp"] < self.now - timedelta(days=30))
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp)
+
+    def _count(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(DetectionRecord.__table__)).scalar()
+
+    def test_batched_delete(self):
+        retention = RecordRetention(self.engine, batch_size=300, pause=0, min_batch=100)
+        self.assertEqual(retention.run(self.now), self.expired)
+        self.assertEqual(self._count(), 5000 - self.expired)
+        metrics = retention.get_metrics()
+        self.assertTrue(metrics["last_run"]["completed"])
+        self.assertGreater(metrics["last_run"]["batches"], 1)
+        self.assertEqual(retention.run(self.now), 0)
+
+    def test_budget_shrinks_batches_and_stop(self):
+        retention = RecordRetention(self.engine, batch_size=2000, time_budget=0, pause=0, min_batch=100)
+        retention.run(self.now)
+        self.assertEqual(retention.last_run["batch_size"], 100)
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(DetectionRecord.__table__),
+                         [{"item_name": "R", "timestamp": self.now - timedelta(days=60)} for _ in range(500)])
+        # stop() 之后当前批次结束即退出，下次运行继续清理
+        retention = RecordRetention(self.engine, batch_size=100, pause=0.5, min_batch=100)
+        thread = threading.Thread(target=retention.run, args=(self.now,))
+        thread.start()
+        while not retention.last_run.get("batches"):
+            time.sleep(0.01)
+        retention.stop()
+        thread.join()
+        self.assertFalse(retention.last_run["completed"])
+        retention.run(self.now)
+        self.assertEqual(self._count(), 5000 - self.expired)
+
+if __name__ == '__main__':
+    unittest.main()
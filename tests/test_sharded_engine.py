@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta
+from src.core.manager import DetectionEngineManager
+from src.core.sharded_engine import ShardedDetectionEngine
+from tests.temp_db import use_temp_database
+
+class TestShardedEngine(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+
+    def _readings(self):
+        start = datetime(2026, 1, 1)
+        readings = []
+        for i in range(100):
+            for station in ("S1", "S2", "S3", "S4"):
+                value = 1.0 + (0.5 if 60 <= i < 70 and station in ("S1", "S3") else 0.0) + 0.01 * (i % 5)
+                readings.append({
+                    "item_name": "GapTest",
+                    "item_type": "parameter",
+                    "value": value,
+                    "uph": 500,
+                    "timestamp": start + timedelta(hours=i),
+                    "metadata": {"product": "ProdA", "line": "L1", "station": station},
+                    "item_config": {"mu0": 1.0, "base_uph": 500}
+                })
+        return readings
+
+    def test_matches_single_process(self):
+        config = {"enable_cooldown": True}
+        readings = self._readings()
+        expected = DetectionEngineManager(dict(config)).process_batch(readings)
+
+        engine = ShardedDetectionEngine(dict(config), num_shards=2)
+        engine.start()
+        try:
+            # 批量与单条混合提交，同一检测键的顺序保持不变
+            results = engine.process_batch(readings[:200])
+            for r in readings[200:]:
+                results.append(engine.process_data(r["item_name"], r["item_type"], r["value"], r["uph"],
+                                                   r["timestamp"], r["metadata"], r["item_config"]))
+            self.assertEqual(engine.detector_count(), 4)
+            self.assertEqual(len(engine.get_status()), 4)
+            # 内存占用默认只返回合计，明细按占用降序跨分片翻页
+            usage = engine.get_memory_usage()
+            self.assertEqual((usage["detector_count"], usage["detectors"]), (4, []))
+            first = engine.get_memory_usage(top=3)["detectors"]
+            rest = engine.get_memory_usage(top=3, offset=3)["detectors"]
+            self.assertEqual((len(first), len(rest)), (3, 1))
+            self.assertEqual(len({d["key"] for d in first + rest}), 4)
+            self.assertEqual(sum(d["total"] for d in first + rest), sum(usage["components"].values()))
+            self.assertEqual([d["total"] for d in first + rest], sorted((d["total"] for d in first + rest), reverse=True))
+            key = engine._generate_detector_key("GapTest", readings[0]["metadata"])
+            self.assertTrue(engine.update_detector_config(key, {"penalty_strength": 2.0}))
+            engine.remove_detector(key)
+            self.assertEqual(engine.detector_count(), 3)
+        finally:
+            engine.stop()
+
+        self.assertTrue(any(r["should_push"] for r in expected))
+        for got, want in zip(results, expected):
+            self.assertEqual(got["unique_key"], want["unique_key"])
+            self.assertEqual(got["alert"], want["alert"])
+            self.assertEqual(got["should_push"], want["should_push"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from datetime import datetime
+from src.core.manager import DetectionEngineManager
+from src.utils.persistence import save_item_states, load_all_item_states
+from tests.temp_db import use_temp_database
+
+class TestStatePersistence(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.names = [f"__test_state__::{i}" for i in range(25)]
+
+    def _states(self, baseline):
+        return [{"item_name": name, "baseline": baseline, "std": 0.1, "k_value": 0.05,
+                 "s_plus": 0.0, "s_minus": 0.0, "last_data_timestamp": datetime(2026, 1, 1)}
+                for name in self.names]
+
+    def test_chunked_upsert(self):
+        self.assertEqual(save_item_states(self._states(1.0), chunk_size=10), 25)
+        self.assertEqual(save_item_states(self._states(2.0), chunk_size=10), 25)
+        states = load_all_item_states()
+        for name in self.names:
+            self.assertEqual(states[name]["baseline"], 2.0)
+    def test_checkpoint_dirty_only(self):
+        for mode in ("scalar", "vectorized"):
+            manager = DetectionEngineManager({"engine_mode": mode})
+            readings = [{"item_name": name, "item_type": "parameter", "value": 1.0 + 0.01 * i, "uph": 500,
+                         "timestamp": datetime(2026, 1, 1, i), "metadata": {}, "item_config": {"mu0": 1.0}}
+                        for i in range(3) for name in self.names]
+            manager.process_batch(readings)
+            self.assertEqual(manager.dirty_count(), 25)
+            # 分片写入: 每次写入剩余的一部分，最终全部写完
+            self.assertEqual(manager.checkpoint_dirty(0.5), 13)
+            self.assertEqual(manager.checkpoint_dirty(1.0), 12)
+            self.assertEqual(manager.checkpoint_dirty(1.0), 0)
+
+            manager.process_data(self.names[0], "parameter", 5.0, 500, datetime(2026, 1, 1, 5), {}, {"mu0": 1.0})
+            self.assertEqual(manager.checkpoint_dirty(1.0), 1)
+            saved = load_all_item_states()[self.names[0]]
+            self.assertEqual(saved["s_plus"], manager.detectors[self.names[0]].S_plus)
+
+if __name__ == '__main__':
+    unittest.main()
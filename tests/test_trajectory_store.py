@@ -0,0 +1,65 @@
+import unittest
+from datetime import datetime, timedelta
+from src.core.trajectory_store import TrajectoryStore
+from src.core.manager import DetectionEngineManager
+
+class TestTrajectoryStore(unittest.TestCase):
+    def _append(self, store, key, i, push=False):
+        store.append(key, f"t{i}", float(i), 500, 0.1 * i, 0.01, 5.0, float(i), 0.0, 0.2,
+                     alert=push, push_executed=push)
+
+    def test_ring_order(self):
+        store = TrajectoryStore(periods=5, capacity=1)
+        store.add_key("a")
+        store.add_key("b")  # 触发扩容
+        for i in range(8):
+            self._append(store, "a", i)
+        self._append(store, "b", 100)
+        trajectory = store.trajectory("a")
+        self.assertEqual(trajectory["values"], [3.0, 4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(trajectory["timestamps"], ["t3", "t4", "t5", "t6", "t7"])
+        self.assertEqual(store.latest("a")["value"], 7.0)
+        self.assertEqual(store.trajectory("b")["values"], [100.0])
+        self.assertEqual(len(store.history("a")), 5)
+
+    def test_recent_push(self):
+        store = TrajectoryStore(periods=30)
+        store.add_key("a")
+        self.assertFalse(store.recent_push("a", 6))
+        self._append(store, "a", 0, push=True)
+        for i in range(1, 6):
+            self._append(store, "a", i)
+        self.assertTrue(store.recent_push("a", 6))
+        self._append(store, "a", 6)
+        self.assertFalse(store.recent_push("a", 6))
+
+    def test_slot_reuse(self):
+        store = TrajectoryStore(periods=5)
+        store.add_key("a")
+        self._append(store, "a", 1)
+        store.remove_key("a")
+        store.add_key("b")
+        self.assertIsNone(store.latest("b"))
+        self.assertEqual(store.trajectory("b")["values"], [])
+
+    def test_trajectory_only_when_pushed(self):
+        manager = DetectionEngineManager({"enable_cooldown": True})
+        start = datetime(2026, 1, 1)
+        metadata = {"product": "P", "line": "L1", "station": "S1"}
+        pushed = []
+        for i in range(80):
+            value = 1.0 + (0.8 if i >= 60 else 0.01 * (i % 5))
+            result, _ = manager._detect("Gap", "parameter", value, 500, start + timedelta(hours=i), metadata,
+                                        {"mu0": 1.0, "base_uph": 500})
+            if result["should_push"]:
+                pushed.append(result)
+            else:
+                self.assertIsNone(result["history_30_periods"])
+        self.assertTrue(pushed)
+        trajectory = pushed[0]["history_30_periods"]
+        self.assertEqual(len(trajectory["values"]), 30)
+        self.assertEqual(trajectory["timestamps"][-1], start + timedelta(hours=60))
+        self.assertEqual(pushed[0]["current_status"]["h_value"], trajectory["threshold_h"][-1])
+
+if __name__ == '__main__':
+    unittest.main()